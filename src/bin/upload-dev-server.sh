@@ -19,7 +19,7 @@ fi
 
 # Create zip files
 echo "Creating zip files..."
-zip -r9 "$ZIP_FILE_SERVER" index.py
+zip -r9 "$ZIP_FILE_SERVER" *.py -x "test_*.py" -x "benchmark_*.py"
 zip -r9 "$ZIP_FILE_LAYER" python
 
 # Function to check if an object exists in S3
@@ -49,8 +49,9 @@ function SignUp() {
     setSubmitError('');
 
     try {
+      // Sign-up, confirmation, login and the verification code all happen in one request.
       const response = await fetch(
-        `${SERVER}/signup`,
+        `${SERVER}/register`,
         {
           method: 'POST',
           headers: {
@@ -72,113 +73,11 @@ function SignUp() {
         };
       }
   
-      await response.json();
-  
-      const userName = `${values.firstName} ${values.lastName}`;
-  
-      confirmUser(values.email);
-      const accessToken = await loginUser(values.email, values.password, userName);
-      sendCode(accessToken)
-      
-      navigate('/auth/verify')
-    } catch (error: any) {
-        const message = error.message || 'An unexpected error occurred. Please try again later.';
-        setSubmitError(message);
-    } finally {
-      setSent(false);
-    }
-  };
-
-  const confirmUser = async (email: string) => {
-    try {
-      const response = await fetch(
-          `${SERVER}/confirm`,
-          {
-              method: 'POST',
-              headers: {
-                'Content-Type': 'application/json',
-              },
-              body: JSON.stringify({
-                email: email
-            })
-            }
-        )
-    
-        if (!response.ok) {
-          const errorData = await response.json();
-          throw { 
-            message: errorData.message
-          };
-        }
-
-        await response.json();
-      } catch (error: any) {
-    } finally {
-      setSent(false);
-    }
-  };
-
-  const sendCode = async (userAccessToken: string | null) => {
-    if (!userAccessToken) {
-      setSubmitError('Unable to send verification code. User is not logged in.');
-      return;
-    }
-
-    try {
-      const response = await fetch(
-        `${SERVER}/confirm-email-resend`,
-        {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-          },
-          body: JSON.stringify({
-            access_token: userAccessToken,
-          }),
-        }
-      );
-
-      if (!response.ok) {
-        const errorData = await response.json();
-        throw {
-          message: errorData.message
-        };
-      }
-
-      await response.json();
-    } catch (error: any) {
-      const message = error.message || 'An unexpected error occurred. Please try again later.';
-      setSubmitError(message);
-  } finally {
-    setSent(false);
-  }
-  };
-
-  const loginUser = async (email: string, password: string, user_name: string) => {
-    try {
-      const response = await fetch(`${SERVER}/login`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          email,
-          password,
-        }),
-      });
-
-      if (!response.ok) {
-        const errorData = await response.json();
-        throw {
-          message: errorData.message
-        };
-      }
-
       const data = await response.json();
 
       const userData = {
-        user_name: user_name,
-        email: email,
+        user_name: `${values.firstName} ${values.lastName}`,
+        email: values.email,
       };
 
       const tokenData = {
@@ -196,11 +95,11 @@ function SignUp() {
           token: tokenData,
         })
       );
-
-      return data.access_token;
+      
+      navigate('/auth/verify')
     } catch (error: any) {
-      const message = error.message || 'An unexpected error occurred. Please try again later.';
-      setSubmitError(message);
+        const message = error.message || 'An unexpected error occurred. Please try again later.';
+        setSubmitError(message);
     } finally {
       setSent(false);
     }
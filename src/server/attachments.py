@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import re
+import time
+import uuid
+from urllib.parse import urlencode
+
+
+ATTACHMENT_PREFIX = "contact-attachments/"
+
+# Uploads accepted for the contact form, by content type.
+ALLOWED_CONTENT_TYPES = {
+    "application/pdf",
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "image/jpeg",
+    "image/png",
+    "text/plain",
+}
+
+MAX_ATTACHMENTS = 5
+
+DOWNLOAD_PATH = "/contact-us/attachments/download"
+
+# Keys look like contact-attachments/2024/05/01/<32 hex chars>/<safe filename>.
+_KEY_PATTERN = re.compile(r"^" + re.escape(ATTACHMENT_PREFIX) + r"\d{4}/\d{2}/\d{2}/[0-9a-f]{32}/[A-Za-z0-9._-]{1,100}$")
+
+
+def safe_filename(filename):
+    """Reduce a client-supplied file name to characters that are safe in an S3 key."""
+    name = re.sub(r"[^A-Za-z0-9._-]+", "-", (filename or "").rsplit("/", 1)[-1].rsplit("\\", 1)[-1]).strip(".-")
+    return name[-100:] or "attachment"
+
+
+def attachment_key(filename):
+    """Return a new, unguessable object key for an uploaded attachment."""
+    return f"{ATTACHMENT_PREFIX}{time.strftime('%Y/%m/%d', time.gmtime())}/{uuid.uuid4().hex}/{safe_filename(filename)}"
+
+
+def presigned_upload(s3, bucket, filename, content_type, max_bytes, expires_in=900):
+    """
+    Create a presigned S3 POST the browser uses to upload one attachment directly.
+
+    The policy pins the key and content type and caps the size, so S3 itself rejects
+    anything else. Signing happens locally; no request is made to S3.
+
+    :param s3: The S3 client.
+    :param bucket: The attachment bucket.
+    :param filename: The client's file name, used (made safe) as the last key segment.
+    :param content_type: The file's content type; must be in ALLOWED_CONTENT_TYPES.
+    :param max_bytes: The largest upload S3 will accept.
+    :param expires_in: Seconds the upload form stays valid.
+    :return: A dict with the object key, the form url and the form fields.
+    """
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise ValueError(f"Unsupported attachment type: {content_type}")
+
+    key = attachment_key(filename)
+    post = s3.generate_presigned_post(
+        Bucket=bucket,
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_bytes]],
+        ExpiresIn=expires_in
+    )
+    return {"key": key, "url": post['url'], "fields": post['fields']}
+
+
+def validate_attachment_keys(keys):
+    """
+    Check attachment keys sent with a contact message.
+
+    :param keys: A list of keys returned by presigned_upload, or None.
+    :return: The keys as a list (empty if there are none).
+    :raises ValueError: If there are too many keys or one was not issued by presigned_upload.
+    """
+    if not keys:
+        return []
+    if not isinstance(keys, list) or len(keys) > MAX_ATTACHMENTS:
+        raise ValueError(f"Attachments must be a list of at most {MAX_ATTACHMENTS} keys.")
+    for key in keys:
+        if not isinstance(key, str) or not _KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid attachment key: {key}")
+    return keys
+
+
+def sign_download(secret, key, expires_at):
+    """HMAC-SHA256 signature of a download link for key that is valid until expires_at."""
+    return hmac.new(secret.encode('utf-8'), f"{key}\n{int(expires_at)}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def download_link(base_url, secret, key, expires_at):
+    """
+    Return a signed link to the download route for one attachment.
+
+    The link names the route rather than S3, so it stays valid until expires_at whatever
+    credentials the function runs with; the route re-signs a short-lived S3 URL on each use.
+
+    :param base_url: The API's public base URL, e.g. "https://api.example.org".
+    :param secret: The link signing secret.
+    :param key: The attachment's object key.
+    :param expires_at: When the link stops working, in epoch seconds.
+    """
+    query = urlencode({"key": key, "expires": int(expires_at), "signature": sign_download(secret, key, expires_at)})
+    return f"{base_url.rstrip('/')}{DOWNLOAD_PATH}?{query}"
+
+
+def verify_download(secret, key, expires, signature, now=None):
+    """
+    Check a download link's parameters.
+
+    :raises ValueError: If the key is not an attachment key, the link has expired or the
+        signature does not match.
+    """
+    if not isinstance(key, str) or not _KEY_PATTERN.match(key):
+        raise ValueError("Invalid attachment key.")
+    try:
+        expires_at = int(expires)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid download link.")
+    if not hmac.compare_digest(sign_download(secret, key, expires_at), signature or ""):
+        raise ValueError("Invalid download link.")
+    if expires_at < (time.time() if now is None else now):
+        raise ValueError("This download link has expired.")
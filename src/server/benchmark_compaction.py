@@ -0,0 +1,139 @@
+"""
+Benchmark of ledger compaction on a synthetic month of donations.
+
+Writes a month of webhook events the way the webhook worker does (one small object per
+queue batch, with some redelivered events), then answers a one-day and a whole-month
+donation total before and after compaction, counting the objects and bytes each query
+scans, as Athena would.
+
+    python benchmark_compaction.py --days 30 --batches-per-day 200 --events-per-batch 5
+"""
+import io
+import json
+import random
+import tempfile
+import time
+from decimal import Decimal
+
+import compaction
+import ledger
+from object_store import LocalObjectStore
+
+START = 1714521600.0  # 2024-05-01T00:00:00Z
+
+
+def synthetic_events(days, batches_per_day, events_per_batch, duplicate_rate, seed=7):
+    """Yield (day, batch of webhook events) in write order; a duplicate_rate share of events are sent twice."""
+    generator = random.Random(seed)
+    number = 0
+    for day in range(days):
+        date = time.strftime("%Y-%m-%d", time.gmtime(START + day * 86400))
+        redelivered = []
+        for _ in range(batches_per_day):
+            batch = []
+            for _ in range(events_per_batch):
+                number += 1
+                event = {
+                    "id": f"WH-{number:08d}", "event_type": "PAYMENT.SALE.COMPLETED",
+                    "resource": {"id": f"SALE-{number:08d}", "create_time": f"{date}T{generator.randrange(24):02d}:00:00Z",
+                                 "amount": {"total": f"{generator.randrange(5, 500)}.00", "currency": "USD"},
+                                 "custom": generator.choice(["", "tithe", "missions", "building fund"])}
+                }
+                batch.append(event)
+                if generator.random() < duplicate_rate:
+                    redelivered.append(event)
+            if redelivered and generator.random() < 0.5:
+                batch.append(redelivered.pop())
+            yield day, batch
+
+
+def scan(store, partitions):
+    """Read every live object of the partitions; return (objects, bytes, rows, distinct events, total amount)."""
+    objects = size = rows = 0
+    totals = {}
+    for partition in partitions:
+        for key in compaction.live_objects(store, partition):
+            data = store.get(key)
+            objects += 1
+            size += len(data)
+            for batch in compaction.format_for_key(key).read_batches(io.BytesIO(data)):
+                rows += len(batch)
+                for row in batch:
+                    totals[row[0]] = Decimal(row[ledger.LEDGER_COLUMNS.index("amount")])
+    return objects, size, rows, len(totals), sum(totals.values(), Decimal(0))
+
+
+def run_benchmark(root, days=30, batches_per_day=200, events_per_batch=5, duplicate_rate=0.02, fmt=None):
+    """
+    Run the benchmark with its store in root.
+
+    :return: {"before": {query: stats}, "after": {query: stats}, "compaction": {...}}.
+    """
+    store = LocalObjectStore(root)
+    fmt = fmt or ledger.default_format()
+    writers = {}
+    for day, batch in synthetic_events(days, batches_per_day, events_per_batch, duplicate_rate):
+        if day not in writers:
+            writers[day] = ledger.LedgerWriter(store, fmt=fmt, clock=lambda day=day: START + day * 86400 + 3600)
+        writers[day].write(batch)
+
+    dates = [time.strftime("%Y-%m-%d", time.gmtime(START + day * 86400)) for day in range(days)]
+    queries = {
+        "one day": [compaction.partition_for(ledger.LEDGER_PREFIX, dates[-1])],
+        "whole month": [compaction.partition_for(ledger.LEDGER_PREFIX, date) for date in dates],
+    }
+
+    def run_queries():
+        results = {}
+        for name, partitions in queries.items():
+            start_time = time.perf_counter()
+            objects, size, rows, events, total = scan(store, partitions)
+            results[name] = {"objects": objects, "bytes": size, "rows": rows, "events": events, "total": str(total),
+                             "seconds": round(time.perf_counter() - start_time, 3)}
+        return results
+
+    before = run_queries()
+    compactor = compaction.Compactor(store, fmt, key_of=compaction.ledger_event_id)
+    start_time = time.perf_counter()
+    stats = [compactor.compact(partition) for partition in queries["whole month"]]
+    compaction_seconds = time.perf_counter() - start_time
+    after = run_queries()
+
+    return {
+        "format": fmt.name,
+        "before": before,
+        "after": after,
+        "compaction": {
+            "seconds": round(compaction_seconds, 3),
+            "objects_in": sum(item['sources'] for item in stats),
+            "objects_out": sum(item['outputs'] for item in stats),
+            "duplicates_dropped": sum(item['rows_in'] - item['rows_out'] for item in stats),
+        },
+    }
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark ledger compaction on synthetic data.")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batches-per-day", type=int, default=200)
+    parser.add_argument("--events-per-batch", type=int, default=5)
+    parser.add_argument("--duplicate-rate", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as root:
+        result = run_benchmark(root, args.days, args.batches_per_day, args.events_per_batch, args.duplicate_rate)
+
+    print(json.dumps(result["compaction"]))
+    print(f"{'query':<12} {'objects':>16} {'bytes scanned':>24} {'rows scanned':>16}")
+    for name in result["before"]:
+        before, after = result["before"][name], result["after"][name]
+        print(f"{name:<12} {before['objects']:>7} -> {after['objects']:<6} {before['bytes']:>11} -> {after['bytes']:<10} "
+              f"{before['rows']:>7} -> {after['rows']:<6}"
+              f"  ({1 - after['bytes'] / before['bytes']:.0%} fewer bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+import json
+import time
+
+from email_templates import MAX_BULK_DESTINATIONS, send_bulk_templated
+from rate_limiter import is_throttle_error
+from user_export import flatten_user
+
+
+CONFIRMED_USERS_FILTER = 'cognito:user_status = "CONFIRMED"'
+
+
+class CampaignCheckpoint:
+    """
+    Progress of a bulk mailing, persisted as JSON in an object store.
+
+    The position is the ListUsers pagination token of the current page plus the number of
+    users of that page already handled, so a later invocation resumes at the next recipient.
+    """
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+        self.state = {"pagination_token": None, "offset": 0, "sent": 0, "failed": 0, "skipped": 0, "done": False}
+        if store.exists(key):
+            self.state.update(json.loads(store.get(key)))
+
+    def save(self):
+        self.store.put(self.key, json.dumps(self.state).encode('utf-8'), content_type="application/json")
+
+
+def recipient_for(user):
+    """Return (email, template data) for a ListUsers user, or None if they should not be mailed."""
+    record = flatten_user(user)
+    if not record['email'] or not record['email_verified'] or record['enabled'] is False:
+        return None
+    return record['email'], {"first_name": record['first_name'] or ""}
+
+
+def send_campaign(ses, template, source, pages, checkpoint, limiter, default_data=None, prefix="",
+                  deadline=None, exclude=None, max_retries=5):
+    """
+    Send a templated email to every recipient in pages, resuming from and updating checkpoint.
+
+    Recipients go out in SendBulkTemplatedEmail calls of at most MAX_BULK_DESTINATIONS, and
+    never more than the limiter's rate per call, so one call fits in a second of SES quota.
+    Each call first takes one token per recipient from the limiter, which pins throughput
+    to the send rate. SES throttling is retried with backoff. The checkpoint is saved
+    after every call.
+
+    :param ses: The SES client.
+    :param template: The EmailTemplate to send (already synced to SES).
+    :param source: The sender address.
+    :param pages: An iterable of (pagination token, ListUsers users) pairs starting at the
+        checkpoint's page, e.g. from user_export.iter_user_pages.
+    :param checkpoint: The CampaignCheckpoint.
+    :param limiter: A TokenBucket paced to the SES send rate.
+    :param default_data: Template data shared by every recipient.
+    :param prefix: The SES template name prefix.
+    :param deadline: An optional time.monotonic() value after which no more calls are started.
+    :param exclude: An optional callable (email) -> True for addresses that must not be mailed.
+    :return: True if the campaign finished, False if it stopped at the deadline.
+    """
+    state = checkpoint.state
+    if state['done']:
+        return True
+    chunk_size = max(1, min(MAX_BULK_DESTINATIONS, int(limiter.rate)))
+
+    def send(chunk):
+        limiter.acquire(tokens=len(chunk), max_wait=float('inf'))
+        for attempt in range(max_retries + 1):
+            try:
+                return list(send_bulk_templated(ses, template, source, chunk, default_data, prefix))
+            except Exception as e:
+                if attempt == max_retries or not is_throttle_error(e):
+                    raise
+                time.sleep(min(0.5 * 2 ** attempt, 10.0))
+
+    for pagination_token, users in pages:
+        if pagination_token != state['pagination_token']:
+            state.update(pagination_token=pagination_token, offset=0)
+
+        while state['offset'] < len(users):
+            if deadline is not None and time.monotonic() >= deadline:
+                checkpoint.save()
+                return False
+
+            chunk, taken = [], 0
+            for user in users[state['offset']:]:
+                if len(chunk) == chunk_size:
+                    break
+                taken += 1
+                recipient = recipient_for(user)
+                if recipient is None or (exclude and exclude(recipient[0])):
+                    state['skipped'] += 1
+                else:
+                    chunk.append(recipient)
+
+            if chunk:
+                for _, status in send(chunk):
+                    state['sent' if status.get('Status') == "Success" else 'failed'] += 1
+            state['offset'] += taken
+            checkpoint.save()
+
+    state['done'] = True
+    checkpoint.save()
+    return True
@@ -0,0 +1,281 @@
+import csv
+import functools
+import io
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from rate_limiter import RateLimitExceeded, is_throttle_error
+
+
+# Row columns that map onto Cognito attributes; any "custom:" column is passed through as-is.
+ATTRIBUTE_COLUMNS = {
+    "first_name": "custom:firstName",
+    "last_name": "custom:lastName",
+    "email_verified": "email_verified",
+    "phone_number": "phone_number",
+}
+
+BULK_ACTIONS = ("create", "update", "upsert")
+
+
+def read_rows(stream, input_format):
+    """
+    Yield (row number, row dict) pairs from a CSV or JSON Lines text stream.
+
+    Row numbers start at 1 and count data rows only, so they are stable across runs and
+    can be used as checkpoint positions.
+
+    :param stream: A text stream (file, TextIOWrapper around an S3 body, ...).
+    :param input_format: "csv" or "jsonl".
+    """
+    if input_format == "csv":
+        rows = csv.DictReader(stream)
+    elif input_format == "jsonl":
+        rows = (json.loads(line) for line in stream if line.strip())
+    else:
+        raise ValueError(f"Unsupported input format: {input_format}")
+
+    for row_number, row in enumerate(rows, start=1):
+        yield row_number, row
+
+
+def row_to_attributes(row):
+    """Build the Cognito UserAttributes list for a row, skipping empty values."""
+    attributes = []
+    for column, value in row.items():
+        if value in (None, "") or column in ("email", "action"):
+            continue
+        name = ATTRIBUTE_COLUMNS.get(column, column if column.startswith("custom:") else None)
+        if name:
+            attributes.append({'Name': name, 'Value': str(value)})
+    return attributes
+
+
+class Checkpoint:
+    """
+    Progress of a bulk job, persisted as JSON in an object store.
+
+    Rows finish out of order, so the checkpoint keeps a watermark (every row up to it is
+    done) plus the finished rows above the watermark.
+    """
+
+    def __init__(self, store, key, on_save=None):
+        self.store = store
+        self.key = key
+        self.on_save = on_save
+        self.watermark = 0
+        self.done_above = set()
+        self._lock = threading.Lock()
+        if store.exists(key):
+            state = json.loads(store.get(key))
+            self.watermark = state.get('watermark', 0)
+            self.done_above = set(state.get('done_above', []))
+
+    def is_done(self, row_number):
+        return row_number <= self.watermark or row_number in self.done_above
+
+    def mark_done(self, row_number):
+        with self._lock:
+            self.done_above.add(row_number)
+            while self.watermark + 1 in self.done_above:
+                self.watermark += 1
+                self.done_above.remove(self.watermark)
+
+    def save(self):
+        # Anything that must be durable before rows count as done (e.g. audit records) goes first.
+        if self.on_save:
+            self.on_save()
+        with self._lock:
+            state = {"watermark": self.watermark, "done_above": sorted(self.done_above)}
+        self.store.put(self.key, json.dumps(state).encode('utf-8'), content_type="application/json")
+
+
+def call_with_backoff(call, operation, max_retries, **kwargs):
+    """Call a rate-limited Cognito operation, waiting out local shedding and AWS throttling."""
+    for attempt in range(max_retries + 1):
+        try:
+            return call(operation, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not (isinstance(e, RateLimitExceeded) or is_throttle_error(e)):
+                raise
+            delay = e.retry_after if isinstance(e, RateLimitExceeded) else min(0.1 * 2 ** attempt, 5.0)
+            time.sleep(delay)
+
+
+def apply_row(call, user_pool_id, row, suppress_invitation=True, max_retries=5):
+    """
+    Create or update the user described by one row.
+
+    :param call: A callable (operation, **kwargs) that performs a rate-limited Cognito call.
+    :return: "created" or "updated".
+    """
+    email = (row.get('email') or "").strip()
+    action = (row.get('action') or "upsert").strip().lower()
+    if not email:
+        raise ValueError("Row has no email.")
+    if action not in BULK_ACTIONS:
+        raise ValueError(f"Unknown action '{action}'.")
+
+    attributes = row_to_attributes(row)
+
+    if action in ("create", "upsert"):
+        create_kwargs = {
+            "UserPoolId": user_pool_id,
+            "Username": email,
+            "UserAttributes": [{'Name': 'email', 'Value': email}] + attributes,
+        }
+        if suppress_invitation:
+            create_kwargs["MessageAction"] = "SUPPRESS"
+        try:
+            call_with_backoff(call, 'admin_create_user', max_retries, **create_kwargs)
+            return "created"
+        except Exception as e:
+            if action == "create" or type(e).__name__ != "UsernameExistsException":
+                raise
+
+    if not attributes:
+        return "updated"
+    call_with_backoff(
+        call, 'admin_update_user_attributes', max_retries,
+        UserPoolId=user_pool_id, Username=email, UserAttributes=attributes
+    )
+    return "updated"
+
+
+def process_rows(rows, call, user_pool_id, checkpoint=None, max_workers=8, on_success=None,
+                 deadline=None, save_every=100, suppress_invitation=True, apply=None):
+    """
+    Apply rows concurrently on a bounded worker pool and yield one result per row as it finishes.
+
+    At most max_workers * 2 rows are read ahead of the workers, so memory stays bounded for
+    any input size. Rows already recorded in the checkpoint are skipped, which makes the job
+    resumable; the checkpoint is saved every save_every rows and when the generator finishes.
+    Throughput is bounded by the Cognito rate limiter behind call.
+
+    A row that fails is recorded as done and reported as "failed". A row still throttled
+    after its retries is reported as "throttled" and left pending, so a resumed run tries
+    it again.
+
+    :param rows: An iterable of (row number, row dict) pairs, e.g. from read_rows.
+    :param call: A callable (operation, **kwargs) that performs a rate-limited Cognito call.
+    :param user_pool_id: The Cognito User Pool ID.
+    :param checkpoint: An optional Checkpoint to resume from and record progress in.
+    :param max_workers: The number of concurrent Cognito calls.
+    :param on_success: An optional callback (row, outcome) run after each successful row.
+    :param deadline: An optional time.monotonic() value after which no new rows are started.
+    :param apply: The per-row operation (call, user_pool_id, row) -> outcome; defaults to apply_row.
+    :return: A generator of {"row", "email", "status", "error"?} dicts; status is the
+        outcome, "failed" or "throttled".
+    """
+    apply = apply or functools.partial(apply_row, suppress_invitation=suppress_invitation)
+    max_in_flight = max_workers * 2
+    completed_since_save = 0
+
+    def run(row):
+        outcome = apply(call, user_pool_id, row)
+        if on_success:
+            on_success(row, outcome)
+        return outcome
+
+    def result_for(row_number, row, future):
+        try:
+            return {"row": row_number, "email": row.get('email'), "status": future.result()}
+        except Exception as e:
+            throttled = isinstance(e, RateLimitExceeded) or is_throttle_error(e)
+            return {"row": row_number, "email": row.get('email'), "status": "throttled" if throttled else "failed",
+                    "error": type(e).__name__, "message": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = {}
+        row_iter = iter(rows)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(in_flight) < max_in_flight:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        exhausted = True
+                        break
+                    try:
+                        row_number, row = next(row_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if checkpoint and checkpoint.is_done(row_number):
+                        continue
+                    in_flight[pool.submit(run, row)] = (row_number, row)
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    row_number, row = in_flight.pop(future)
+                    result = result_for(row_number, row, future)
+                    # Failed rows are final too: they are reported, not retried on resume.
+                    # Throttled rows are not, so they stay pending for the next run.
+                    if checkpoint and result['status'] != "throttled":
+                        checkpoint.mark_done(row_number)
+                        completed_since_save += 1
+                        if completed_since_save >= save_every:
+                            checkpoint.save()
+                            completed_since_save = 0
+                    yield result
+        finally:
+            if checkpoint:
+                checkpoint.save()
+
+
+def write_results(results, out):
+    """Write results to a binary writer as JSON Lines and return a per-status summary."""
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+        out.write((json.dumps(result) + "\n").encode('utf-8'))
+    return summary
+
+
+def open_text(binary_stream):
+    """Wrap a binary stream (local file or S3 body) for read_rows."""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
+
+
+def main(argv=None):
+    """Run a bulk import from the command line against the configured user pool."""
+    import argparse
+    import os
+    import sys
+    from object_store import LocalObjectStore
+
+    parser = argparse.ArgumentParser(description="Create or update Cognito users from a CSV or JSON Lines file.")
+    parser.add_argument("input", help="CSV or JSON Lines file of users.")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (defaults to the file extension).")
+    parser.add_argument("--checkpoint", help="Checkpoint file (defaults to <input>.checkpoint.json).")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent Cognito calls.")
+    parser.add_argument("--send-invitations", action="store_true", help="Let Cognito email new users an invitation.")
+    args = parser.parse_args(argv)
+
+    # index reads its configuration at import time, so only load it once arguments are valid.
+    import index
+
+    input_format = args.format or ("jsonl" if args.input.endswith((".jsonl", ".ndjson")) else "csv")
+    checkpoint_path = os.path.abspath(args.checkpoint or f"{args.input}.checkpoint.json")
+    checkpoint = Checkpoint(LocalObjectStore(os.path.dirname(checkpoint_path)), os.path.basename(checkpoint_path))
+
+    with open(args.input, encoding='utf-8', newline='') as f:
+        results = process_rows(
+            read_rows(f, input_format), index.cognito_call, index.get_user_pool_id(),
+            checkpoint=checkpoint,
+            max_workers=args.workers,
+            on_success=index.record_bulk_user,
+            suppress_invitation=not args.send_invitations
+        )
+        summary = write_results(results, sys.stdout.buffer)
+
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary.get("failed") else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,289 @@
+import gzip
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import ledger
+
+
+MANIFEST_NAME = "_manifest.json"
+COMPACTED_PREFIX = "compacted-"
+
+
+class JsonLinesFormat:
+    """
+    JSON Lines log objects, such as the erasure audit log; compacted output is gzipped.
+
+    Rows are the raw lines, so records are copied without being parsed.
+    """
+
+    name = "ndjson.gz"
+    extension = ".ndjson.gz"
+    content_type = "application/gzip"
+
+    def __init__(self, compressed=True):
+        self.compressed = compressed
+
+    def open_writer(self, out):
+        return _JsonLinesWriter(gzip.GzipFile(fileobj=out, mode='wb') if self.compressed else out)
+
+    def read_batches(self, reader, batch_size=10000):
+        stream = gzip.GzipFile(fileobj=reader, mode='rb') if self.compressed else reader
+        batch = []
+        for line in _read_lines(stream):
+            if line.strip():
+                batch.append(line)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _read_lines(stream, chunk_size=64 * 1024):
+    # S3 bodies iterate in fixed-size chunks rather than lines, so split them here.
+    remainder = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        *lines, remainder = (remainder + chunk).split(b"\n")
+        for line in lines:
+            yield line + b"\n"
+    if remainder:
+        yield remainder + b"\n"
+
+
+class _JsonLinesWriter:
+    def __init__(self, out):
+        self._out = out
+
+    def write_rows(self, rows):
+        self._out.write(b"".join(rows))
+
+    def close(self):
+        if isinstance(self._out, gzip.GzipFile):
+            self._out.close()
+
+
+def format_for_key(key):
+    """The format of a ledger or log object, from its extension."""
+    if key.endswith(".ndjson") or key.endswith(".jsonl"):
+        return JsonLinesFormat(compressed=False)
+    if key.endswith(JsonLinesFormat.extension):
+        return JsonLinesFormat()
+    return ledger.format_for_key(key)
+
+
+def _name(key):
+    return key.rsplit("/", 1)[-1]
+
+
+def is_compacted(key):
+    return _name(key).startswith(COMPACTED_PREFIX)
+
+
+def read_manifest(store, partition):
+    """Return the partition's manifest: {"objects": compacted keys, "replaced": keys they replaced}."""
+    key = partition + MANIFEST_NAME
+    if not store.exists(key):
+        return {"objects": [], "replaced": []}
+    return json.loads(store.get(key))
+
+
+def list_data_objects(store, partition):
+    """Every data object in a partition; names starting with "_" or "." are skipped, as Athena skips them."""
+    return [key for key in store.list(partition)
+            if "/" not in key[len(partition):] and not _name(key).startswith(("_", "."))]
+
+
+def live_objects(store, partition):
+    """
+    The objects a reader should read from a partition, so it never sees a row twice.
+
+    Compacted objects count once the manifest lists them, and the objects they replaced
+    stop counting at the same moment, even before they are deleted. Objects written since
+    the last compaction count as they are.
+    """
+    manifest = read_manifest(store, partition)
+    objects, replaced = set(manifest['objects']), set(manifest['replaced'])
+    return [key for key in list_data_objects(store, partition)
+            if (key in objects if is_compacted(key) else key not in replaced)]
+
+
+def ledger_event_id(row):
+    """Deduplication key of a ledger row: webhook events are delivered at least once."""
+    return row[0]
+
+
+class Compactor:
+    """
+    Merges the many small objects of a partition into a few large ones.
+
+    Objects are read one at a time, batch_size rows at a time, and written through
+    streaming writers, so memory stays bounded whatever the partition's size; only the
+    keys of rows already seen are kept, when key_of is set, to drop duplicate rows.
+
+    A compaction writes its outputs, then replaces the partition's manifest (a single
+    atomic put) to list them and the objects they replace, then deletes those objects.
+    live_objects() readers therefore see either the old objects or the new ones, never
+    both. A compaction interrupted part way is finished by the next one: outputs the
+    manifest does not list are deleted, and so are replaced objects that remain. Run
+    one compaction per partition at a time.
+
+    :param store: An object store (S3ObjectStore or LocalObjectStore).
+    :param fmt: The output format, e.g. ledger.default_format() or JsonLinesFormat().
+    :param key_of: An optional callable (row) -> key; rows whose key was already written are dropped.
+    :param max_rows_per_file: The most rows in one output object.
+    :param min_objects: Partitions with fewer new objects than this are left alone.
+    """
+
+    def __init__(self, store, fmt, key_of=None, max_rows_per_file=1000000, min_objects=2, batch_size=10000,
+                 clock=time.time):
+        self.store = store
+        self.format = fmt
+        self.key_of = key_of
+        self.max_rows_per_file = max_rows_per_file
+        self.min_objects = min_objects
+        self.batch_size = batch_size
+        self._clock = clock
+
+    def _output_key(self, partition):
+        stamp = datetime.fromtimestamp(self._clock(), timezone.utc).strftime("%Y%m%dT%H%M%S")
+        return f"{partition}{COMPACTED_PREFIX}{stamp}-{uuid.uuid4().hex[:12]}{self.format.extension}"
+
+    def _clean_up(self, partition, manifest):
+        objects, replaced = set(manifest['objects']), set(manifest['replaced'])
+        for key in list_data_objects(self.store, partition):
+            if (key not in objects) if is_compacted(key) else (key in replaced):
+                self.store.delete(key)
+
+    def compact(self, partition):
+        """
+        Compact one partition, e.g. "ledger/donations/dt=2024-05-01/".
+
+        :return: {"partition", "sources", "outputs", "rows_in", "rows_out"}; sources is 0
+            when the partition did not need compacting.
+        """
+        manifest = read_manifest(self.store, partition)
+        self._clean_up(partition, manifest)
+        sources = live_objects(self.store, partition)
+        stats = {"partition": partition, "sources": 0, "outputs": 0, "rows_in": 0, "rows_out": 0}
+        if sum(1 for key in sources if not is_compacted(key)) < self.min_objects:
+            return stats
+
+        outputs = self._merge(partition, sources, stats)
+        self.store.put(partition + MANIFEST_NAME, json.dumps({
+            "objects": outputs,
+            "replaced": sources,
+            "compacted_at": datetime.fromtimestamp(self._clock(), timezone.utc).isoformat(),
+        }).encode('utf-8'), content_type="application/json")
+        for key in sources:
+            self.store.delete(key)
+
+        stats.update(sources=len(sources), outputs=len(outputs))
+        return stats
+
+    def _merge(self, partition, sources, stats):
+        outputs = []
+        seen = set()
+        out = writer = None
+        rows_in_file = 0
+        pending = []
+
+        def write_pending():
+            nonlocal pending
+            if pending:
+                writer.write_rows(pending)
+                pending = []
+
+        try:
+            for source in sources:
+                with self.store.open_reader(source) as reader:
+                    for batch in format_for_key(source).read_batches(reader, self.batch_size):
+                        stats['rows_in'] += len(batch)
+                        for row in batch:
+                            if self.key_of is not None:
+                                key = self.key_of(row)
+                                if key in seen:
+                                    continue
+                                seen.add(key)
+                            if writer is None:
+                                outputs.append(self._output_key(partition))
+                                out = self.store.open_writer(outputs[-1], content_type=self.format.content_type)
+                                writer = self.format.open_writer(out)
+                            pending.append(row)
+                            rows_in_file += 1
+                            stats['rows_out'] += 1
+                            if len(pending) >= self.batch_size:
+                                write_pending()
+                            if rows_in_file >= self.max_rows_per_file:
+                                write_pending()
+                                writer.close()
+                                out.close()
+                                out = writer = None
+                                rows_in_file = 0
+            if writer is not None:
+                write_pending()
+                writer.close()
+                out.close()
+        except Exception:
+            if out is not None:
+                out.abort()
+            for key in outputs[:-1] if out is not None else outputs:
+                self.store.delete(key)
+            raise
+        return outputs
+
+
+def partition_for(prefix, date):
+    """The dt= partition of a date under prefix."""
+    return f"{prefix.rstrip('/')}/dt={date}/"
+
+
+def previous_day(now=None):
+    """Yesterday's date (UTC) as YYYY-MM-DD: the most recent day no longer being written."""
+    now = time.time() if now is None else now
+    return (datetime.fromtimestamp(now, timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def ledger_compactor(store, **options):
+    return Compactor(store, ledger.default_format(), key_of=ledger_event_id, **options)
+
+
+def log_compactor(store, **options):
+    return Compactor(store, JsonLinesFormat(), **options)
+
+
+def main(argv=None):
+    """Compact ledger or log partitions from the command line."""
+    import argparse
+    import sys
+    from object_store import LocalObjectStore, S3ObjectStore
+
+    parser = argparse.ArgumentParser(description="Merge the small objects of date partitions into a few large ones.")
+    location = parser.add_mutually_exclusive_group(required=True)
+    location.add_argument("--bucket", help="S3 bucket holding the partitions.")
+    location.add_argument("--root", help="Local directory holding the partitions.")
+    parser.add_argument("--prefix", default=ledger.LEDGER_PREFIX, help="Table prefix above the dt= partitions.")
+    parser.add_argument("--kind", choices=["ledger", "logs"], default="ledger", help="What the partitions hold.")
+    parser.add_argument("--date", action="append", help="Date to compact, YYYY-MM-DD (repeatable; defaults to yesterday).")
+    parser.add_argument("--max-rows-per-file", type=int, default=1000000, help="The most rows in one output object.")
+    args = parser.parse_args(argv)
+
+    if args.bucket:
+        import boto3
+        store = S3ObjectStore(args.bucket, boto3.client('s3'))
+    else:
+        store = LocalObjectStore(args.root)
+    compactor = (ledger_compactor if args.kind == "ledger" else log_compactor)(
+        store, max_rows_per_file=args.max_rows_per_file
+    )
+    for date in args.date or [previous_day()]:
+        print(json.dumps(compactor.compact(partition_for(args.prefix, date))), file=sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,175 @@
+import hashlib
+import threading
+import time
+
+
+class MemoryCounterStore:
+    """
+    Per-window counters held in process memory.
+
+    Good enough for a single warm container; use a shared store (e.g. DynamoDBCounterStore)
+    when limits must hold across containers.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def increment(self, key, ttl):
+        """Add one to key's counter and return the new count; the counter expires after ttl seconds."""
+        now = self._clock()
+        with self._lock:
+            count, expires_at = self._counters.get(key, (0, 0))
+            if expires_at <= now:
+                count, expires_at = 0, now + ttl
+            self._counters[key] = (count + 1, expires_at)
+            if len(self._counters) > 10000:
+                self._counters = {k: v for k, v in self._counters.items() if v[1] > now}
+            return count + 1
+
+    def get(self, key):
+        now = self._clock()
+        with self._lock:
+            count, expires_at = self._counters.get(key, (0, 0))
+            return count if expires_at > now else 0
+
+    def delete(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+
+
+class DynamoDBCounterStore:
+    """
+    Per-window counters in a DynamoDB table, shared by every container.
+
+    The table needs a string partition key "pk" and TTL enabled on "expires_at".
+    Increments are atomic UpdateItem operations: a conditional reset when the counter is
+    missing or expired, otherwise an ADD.
+    """
+
+    def __init__(self, table_name, dynamodb_client, clock=time.time):
+        self.table_name = table_name
+        self.dynamodb = dynamodb_client
+        self._clock = clock
+
+    def increment(self, key, ttl):
+        now = self._clock()
+        try:
+            # An item past its TTL may not have been deleted yet; its count must start over.
+            self.dynamodb.update_item(
+                TableName=self.table_name,
+                Key={'pk': {'S': key}},
+                UpdateExpression="SET #count = :one, expires_at = :expires_at",
+                ConditionExpression="attribute_not_exists(pk) OR expires_at <= :now",
+                ExpressionAttributeNames={'#count': 'count'},
+                ExpressionAttributeValues={':one': {'N': '1'}, ':expires_at': {'N': str(int(now + ttl))},
+                                           ':now': {'N': str(int(now))}}
+            )
+            return 1
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            pass
+        response = self.dynamodb.update_item(
+            TableName=self.table_name,
+            Key={'pk': {'S': key}},
+            UpdateExpression="ADD #count :one",
+            ExpressionAttributeNames={'#count': 'count'},
+            ExpressionAttributeValues={':one': {'N': '1'}},
+            ReturnValues="UPDATED_NEW"
+        )
+        return int(response['Attributes']['count']['N'])
+
+    def get(self, key):
+        item = self.dynamodb.get_item(TableName=self.table_name, Key={'pk': {'S': key}}).get('Item')
+        if not item or int(item['expires_at']['N']) <= self._clock():
+            return 0
+        return int(item['count']['N'])
+
+    def delete(self, key):
+        self.dynamodb.delete_item(TableName=self.table_name, Key={'pk': {'S': key}})
+
+
+class SlidingWindowLimiter:
+    """
+    Allows at most limit hits per key within any window of the given length.
+
+    Uses the sliding window counter approximation: the previous fixed window's count is
+    weighted by how much of it still overlaps the sliding window. This needs only two
+    counters per key, so it works the same against memory or a shared store.
+    """
+
+    def __init__(self, limit, window, store, name="limit", clock=time.time):
+        self.limit = limit
+        self.window = window
+        self.store = store
+        self.name = name
+        self._clock = clock
+
+    def hit(self, key):
+        """
+        Count a hit for key.
+
+        :return: A tuple of (allowed, retry_after seconds).
+        """
+        now = self._clock()
+        index = int(now // self.window)
+        elapsed = (now % self.window) / self.window
+        current = self.store.increment(f"{self.name}:{key}:{index}", ttl=2 * self.window)
+        previous = self.store.get(f"{self.name}:{key}:{index - 1}")
+
+        estimate = previous * (1 - elapsed) + current
+        if estimate <= self.limit:
+            return True, 0.0
+        return False, self.window * (1 - elapsed)
+
+
+def content_digest(first_name, email, message):
+    """Hash a contact submission so identical payloads map to the same key."""
+    normalized = "\x1f".join(" ".join((value or "").split()).lower() for value in (first_name, email, message))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class ContactGuard:
+    """
+    Screens contact form submissions before any SSM or SES call.
+
+    Identical submissions within dedup_window seconds are reported as duplicates, and
+    each sender email and source IP is limited to a number of submissions per window.
+
+    :param store: The counter store (MemoryCounterStore by default).
+    :param dedup_window: Seconds during which an identical submission counts as a duplicate.
+    :param per_email: (limit, window seconds) per sender email.
+    :param per_ip: (limit, window seconds) per source IP.
+    """
+
+    def __init__(self, store=None, dedup_window=600, per_email=(3, 3600), per_ip=(10, 3600), clock=time.time):
+        self.store = store or MemoryCounterStore(clock=clock)
+        self.dedup_window = dedup_window
+        self.email_limiter = SlidingWindowLimiter(*per_email, self.store, name="contact-email", clock=clock)
+        self.ip_limiter = SlidingWindowLimiter(*per_ip, self.store, name="contact-ip", clock=clock)
+
+    def check(self, first_name, email, message, source_ip=None):
+        """
+        Decide whether a submission may be sent.
+
+        :return: A tuple of (decision, detail): ("ok", digest), ("duplicate", digest) or
+            ("limited", retry_after seconds).
+        """
+        digest = content_digest(first_name, email, message)
+        if self.store.increment(f"contact-dedup:{digest}", ttl=self.dedup_window) > 1:
+            return "duplicate", digest
+
+        checks = [(self.email_limiter, email.strip().lower())]
+        if source_ip:
+            checks.append((self.ip_limiter, source_ip))
+        for limiter, key in checks:
+            allowed, retry_after = limiter.hit(key)
+            if not allowed:
+                # A rejected submission must not block the same content once the limit resets.
+                self.forget(digest)
+                return "limited", retry_after
+        return "ok", digest
+
+    def forget(self, digest):
+        """Drop a submission from the dedup window, e.g. because sending it failed."""
+        self.store.delete(f"contact-dedup:{digest}")
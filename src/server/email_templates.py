@@ -0,0 +1,206 @@
+import html
+import json
+import re
+
+
+# SES allows at most 50 destinations per SendBulkTemplatedEmail call.
+MAX_BULK_DESTINATIONS = 50
+
+_PLACEHOLDER = re.compile(r"{{\s*([A-Za-z_][A-Za-z0-9_]*)\s*}}")
+
+
+class CompiledTemplate:
+    """
+    A template string split once into its static parts and placeholder names.
+
+    Placeholders use the {{name}} syntax SES templates use, so the same source renders
+    locally and in SES. Rendering only joins the cached static parts with the values.
+    """
+
+    def __init__(self, source, escape=False):
+        self.source = source
+        self.escape = escape
+        self.parts = []
+        self.fields = []
+        position = 0
+        for match in _PLACEHOLDER.finditer(source):
+            self.parts.append(source[position:match.start()])
+            self.fields.append(match.group(1))
+            position = match.end()
+        self.parts.append(source[position:])
+
+    def render(self, data):
+        missing = [field for field in self.fields if field not in data]
+        if missing:
+            raise ValueError(f"Missing template data: {', '.join(sorted(set(missing)))}")
+        pieces = [self.parts[0]]
+        for field, part in zip(self.fields, self.parts[1:]):
+            value = str(data[field])
+            pieces.append(html.escape(value) if self.escape else value)
+            pieces.append(part)
+        return "".join(pieces)
+
+
+class EmailTemplate:
+    """
+    An email template with a subject, a text part and an optional HTML part, compiled once.
+
+    :param name: The template's name; the SES template is named prefix + name.
+    :param subject: The subject template.
+    :param text: The plain text body template.
+    :param html_part: An optional HTML body template; values are HTML-escaped, as in SES.
+    """
+
+    def __init__(self, name, subject, text, html_part=None):
+        self.name = name
+        self.subject = CompiledTemplate(subject)
+        self.text = CompiledTemplate(text)
+        self.html = CompiledTemplate(html_part, escape=True) if html_part else None
+
+    def render(self, data):
+        """Render the template locally, returning a dict with subject, text and html."""
+        return {
+            "subject": self.subject.render(data),
+            "text": self.text.render(data),
+            "html": self.html.render(data) if self.html else None,
+        }
+
+    def message(self, data):
+        """Render the template as the Message argument of SES SendEmail."""
+        rendered = self.render(data)
+        body = {'Text': {'Data': rendered['text']}}
+        if rendered['html'] is not None:
+            body['Html'] = {'Data': rendered['html']}
+        return {'Subject': {'Data': rendered['subject']}, 'Body': body}
+
+    def ses_definition(self, prefix=""):
+        """Return the template in the shape SES CreateTemplate/UpdateTemplate expect."""
+        definition = {
+            'TemplateName': f"{prefix}{self.name}",
+            'SubjectPart': self.subject.source,
+            'TextPart': self.text.source,
+        }
+        if self.html:
+            definition['HtmlPart'] = self.html.source
+        return definition
+
+
+# Templates shared by every mail the server sends, compiled at import.
+TEMPLATES = {
+    template.name: template
+    for template in [
+        EmailTemplate(
+            "contact-us",
+            subject="Contact Us Form Submission",
+            text="Name: {{first_name}}\nEmail: {{email}}\nMessage: {{message}}"
+        ),
+        EmailTemplate(
+            "donation-receipt",
+            subject="Thank you for your donation",
+            text=(
+                "Dear {{first_name}},\n\n"
+                "Thank you for your gift of {{amount}} {{currency}} on {{date}}.\n"
+                "Reference: {{reference}}\n\n"
+                "God bless you."
+            ),
+            html_part=(
+                "<p>Dear {{first_name}},</p>"
+                "<p>Thank you for your gift of <strong>{{amount}} {{currency}}</strong> on {{date}}.</p>"
+                "<p>Reference: {{reference}}</p>"
+                "<p>God bless you.</p>"
+            )
+        ),
+        EmailTemplate(
+            "notice",
+            subject="{{subject}}",
+            text="Dear {{first_name}},\n\n{{body}}",
+            html_part="<p>Dear {{first_name}},</p><p>{{body}}</p>"
+        ),
+    ]
+}
+
+
+def sync_templates(ses, templates, prefix=""):
+    """
+    Create or update SES templates so they match the local definitions.
+
+    Templates that already match are left alone, so syncing on every deploy is cheap.
+
+    :param ses: The SES client.
+    :param templates: An iterable of EmailTemplate objects.
+    :param prefix: Prepended to each template name in SES (e.g. per environment).
+    :return: A dict of template name -> "created", "updated" or "unchanged".
+    """
+    outcomes = {}
+    for template in templates:
+        definition = template.ses_definition(prefix)
+        try:
+            existing = ses.get_template(TemplateName=definition['TemplateName'])['Template']
+        except ses.exceptions.TemplateDoesNotExistException:
+            ses.create_template(Template=definition)
+            outcomes[template.name] = "created"
+            continue
+
+        parts = ('SubjectPart', 'TextPart', 'HtmlPart')
+        if all(existing.get(part) == definition.get(part) for part in parts):
+            outcomes[template.name] = "unchanged"
+        else:
+            ses.update_template(Template=definition)
+            outcomes[template.name] = "updated"
+    return outcomes
+
+
+def send_templated(ses, template, source, to_addresses, data, prefix=""):
+    """
+    Send one templated email through SES SendTemplatedEmail.
+
+    The data is checked against the template's fields first, so a missing value fails
+    here rather than as an asynchronous SES rendering failure.
+
+    :return: The SES message id.
+    """
+    template.render(data)
+    response = ses.send_templated_email(
+        Source=source,
+        Destination={'ToAddresses': list(to_addresses)},
+        Template=f"{prefix}{template.name}",
+        TemplateData=json.dumps(data)
+    )
+    return response['MessageId']
+
+
+def send_bulk_templated(ses, template, source, destinations, default_data=None, prefix=""):
+    """
+    Send a templated email to many recipients, MAX_BULK_DESTINATIONS per SES call.
+
+    :param ses: The SES client.
+    :param template: The EmailTemplate (already synced to SES).
+    :param source: The sender address.
+    :param destinations: An iterable of (address, per-recipient data) pairs; consumed lazily.
+    :param default_data: Data shared by every recipient; per-recipient data overrides it.
+    :param prefix: The SES template name prefix.
+    :return: A generator of (address, SES status entry) pairs, one per destination.
+    """
+    default_data = default_data or {}
+    chunk = []
+
+    def send(chunk):
+        response = ses.send_bulk_templated_email(
+            Source=source,
+            Template=f"{prefix}{template.name}",
+            DefaultTemplateData=json.dumps(default_data),
+            Destinations=[
+                {'Destination': {'ToAddresses': [address]}, 'ReplacementTemplateData': json.dumps(data)}
+                for address, data in chunk
+            ]
+        )
+        return zip((address for address, _ in chunk), response['Status'])
+
+    for address, data in destinations:
+        template.render({**default_data, **data})
+        chunk.append((address, data))
+        if len(chunk) == MAX_BULK_DESTINATIONS:
+            yield from send(chunk)
+            chunk = []
+    if chunk:
+        yield from send(chunk)
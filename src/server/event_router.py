@@ -0,0 +1,163 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger()
+
+
+class UnroutableEvent(Exception):
+    """No handler is registered for an event."""
+
+
+def arn_name(arn):
+    """Return the resource name at the end of an ARN, e.g. the queue, topic or rule name."""
+    return (arn or "").rsplit(":", 1)[-1].rsplit("/", 1)[-1]
+
+
+def event_kind(event):
+    """
+    Classify a Lambda event.
+
+    Direct invocations of a long-running job (bulk import, erasure, bulk mail) name the job
+    in a "job" field.
+
+    :return: "http", "sqs", "sns", "schedule", "cognito", "job", or None if the event is not recognized.
+    """
+    if 'httpMethod' in event:
+        return "http"
+    records = event.get('Records')
+    if records:
+        source = records[0].get('eventSource') or records[0].get('EventSource')
+        return {"aws:sqs": "sqs", "aws:sns": "sns"}.get(source)
+    if event.get('source') == "aws.events" and event.get('detail-type') == "Scheduled Event":
+        return "schedule"
+    if 'triggerSource' in event and 'userPoolId' in event:
+        return "cognito"
+    if isinstance(event.get('job'), str):
+        return "job"
+    return None
+
+
+class EventRouter:
+    """
+    Dispatches non-HTTP Lambda events to registered handlers, so one deployment serves every workload.
+
+    SQS and SNS events are routed by the name of their queue or topic, schedules by their
+    EventBridge rule name, Cognito triggers by triggerSource prefix, and direct job
+    invocations by their "job" field. A queue or topic
+    takes either a batch handler (event, context), which receives the whole event, or a
+    record handler (record, context), which the router runs concurrently on up to
+    max_workers threads. For SQS, records whose handler raised are returned as
+    batchItemFailures; FIFO queues are processed in order and stop at the first failure,
+    which fails the rest of the batch, as SQS requires. For SNS, any failure is re-raised
+    after the batch so Lambda retries the invocation.
+
+    :param max_workers: The most records processed at once.
+    :param on_dispatch: An optional callback (kind, records, failures) run after each event.
+    """
+
+    def __init__(self, max_workers=8, on_dispatch=None):
+        self.max_workers = max_workers
+        self.on_dispatch = on_dispatch
+        self._routes = {"sqs": {}, "sns": {}, "schedule": {}, "job": {}}
+        self._triggers = []
+
+    def on_queue(self, name, handler=None, batch_handler=None):
+        """Route SQS events from the queue called name."""
+        self._register("sqs", name, handler, batch_handler)
+
+    def on_topic(self, name, handler=None, batch_handler=None):
+        """Route SNS events from the topic called name."""
+        self._register("sns", name, handler, batch_handler)
+
+    def on_schedule(self, rule_name, handler):
+        """Route EventBridge scheduled events of the rule called rule_name to handler(event, context)."""
+        self._routes["schedule"][rule_name] = (None, handler)
+
+    def on_job(self, name, handler):
+        """Route direct invocations whose "job" field is name to handler(event, context)."""
+        self._routes["job"][name] = (None, handler)
+
+    def on_cognito_trigger(self, prefix, handler):
+        """Route Cognito trigger events whose triggerSource starts with prefix to handler(event, context)."""
+        self._triggers.append((prefix, handler))
+
+    def _register(self, kind, name, handler, batch_handler):
+        if (handler is None) == (batch_handler is None):
+            raise ValueError("Register exactly one of handler and batch_handler.")
+        self._routes[kind][name] = (handler, batch_handler)
+
+    def _route(self, kind, name):
+        route = self._routes[kind].get(name)
+        if route is None:
+            raise UnroutableEvent(f"No handler for {kind} {name!r}")
+        return route
+
+    def dispatch(self, event, context):
+        """
+        Run the handler for a non-HTTP event and return its result.
+
+        :raises UnroutableEvent: If the event's kind or source has no handler.
+        """
+        kind = event_kind(event)
+        if kind in ("sqs", "sns"):
+            records = event['Records']
+            arn = records[0].get('eventSourceARN') if kind == "sqs" else records[0]['Sns'].get('TopicArn')
+            handler, batch_handler = self._route(kind, arn_name(arn))
+            if batch_handler is not None:
+                result = batch_handler(event, context)
+                failures = len((result or {}).get('batchItemFailures', [])) if isinstance(result, dict) else 0
+                self._dispatched(kind, len(records), failures)
+                return result
+            failed = self._process_records(records, handler, context, ordered=arn_name(arn).endswith(".fifo"))
+            self._dispatched(kind, len(records), len(failed))
+            if kind == "sns":
+                if failed:
+                    raise RuntimeError(f"{len(failed)} of {len(records)} SNS records failed")
+                return {"processed": len(records)}
+            return {"batchItemFailures": [{"itemIdentifier": record['messageId']} for record in failed]}
+
+        if kind == "schedule":
+            _, handler = self._route("schedule", arn_name((event.get('resources') or [""])[0]))
+            self._dispatched(kind, 1, 0)
+            return handler(event, context)
+
+        if kind == "job":
+            _, handler = self._route("job", event['job'])
+            self._dispatched(kind, 1, 0)
+            return handler(event, context)
+
+        if kind == "cognito":
+            for prefix, handler in self._triggers:
+                if event['triggerSource'].startswith(prefix):
+                    return handler(event, context)
+            # Cognito expects the event back; triggers without a handler pass through unchanged.
+            return event
+
+        raise UnroutableEvent("Unrecognized event")
+
+    def _process_records(self, records, handler, context, ordered=False):
+        def run(record):
+            try:
+                handler(record, context)
+                return True
+            except Exception as e:
+                logger.error(f"Failed to process record {record.get('messageId')}: {str(e)}", exc_info=True)
+                return False
+
+        if ordered:
+            for position, record in enumerate(records):
+                if not run(record):
+                    return records[position:]
+            return []
+
+        if len(records) == 1 or self.max_workers <= 1:
+            succeeded = [run(record) for record in records]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(records))) as executor:
+                succeeded = list(executor.map(run, records))
+        return [record for record, ok in zip(records, succeeded) if not ok]
+
+    def _dispatched(self, kind, records, failures):
+        if self.on_dispatch is not None:
+            self.on_dispatch(kind, records, failures)
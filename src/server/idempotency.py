@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalIdempotencyTable:
+    """A process-local stand-in for DynamoDBIdempotencyTable, used for tests and local runs."""
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def put_if_absent(self, key, ttl):
+        """Record key unless it is already recorded; return True if it was recorded now."""
+        now = self._clock()
+        with self._lock:
+            expires_at = self._items.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+            self._items[key] = now + ttl
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class DynamoDBIdempotencyTable:
+    """
+    Processed keys in a DynamoDB table, recorded with a conditional PutItem.
+
+    The table needs a string partition key "pk" and TTL enabled on "expires_at", like the
+    contact guard's counter table, so an AdminTable-style single table can hold both.
+    """
+
+    def __init__(self, table_name, dynamodb_client, clock=time.time):
+        self.table_name = table_name
+        self.dynamodb = dynamodb_client
+        self._clock = clock
+
+    def put_if_absent(self, key, ttl):
+        now = self._clock()
+        try:
+            self.dynamodb.put_item(
+                TableName=self.table_name,
+                Item={'pk': {'S': key}, 'expires_at': {'N': str(int(now + ttl))}},
+                # An item past its TTL may not have been deleted yet; it no longer counts.
+                ConditionExpression="attribute_not_exists(pk) OR expires_at < :now",
+                ExpressionAttributeValues={':now': {'N': str(int(now))}}
+            )
+            return True
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def delete(self, key):
+        self.dynamodb.delete_item(TableName=self.table_name, Key={'pk': {'S': key}})
+
+
+class IdempotencyStore:
+    """
+    Remembers which keys (e.g. webhook event ids) have been claimed, so replays are skipped.
+
+    Recently seen keys are held in an in-memory LRU, so a replay arriving at a warm container
+    is rejected without a network call; otherwise the table's conditional put decides, so
+    exactly one claim of a key succeeds across containers.
+
+    :param table: A DynamoDBIdempotencyTable or LocalIdempotencyTable.
+    :param prefix: Prepended to every key in the table.
+    :param ttl: Seconds a claim is kept.
+    :param capacity: The most keys held in the in-memory LRU.
+    """
+
+    def __init__(self, table, prefix="", ttl=7 * 24 * 3600, capacity=10000):
+        self.table = table
+        self.prefix = prefix
+        self.ttl = ttl
+        self.capacity = capacity
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key):
+        with self._lock:
+            self._recent[key] = True
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.capacity:
+                self._recent.popitem(last=False)
+
+    def claim(self, key):
+        """
+        Claim key for processing.
+
+        :return: True if this is the first claim of key, False if it is a replay.
+        """
+        with self._lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                return False
+        claimed = self.table.put_if_absent(self.prefix + key, self.ttl)
+        self._remember(key)
+        return claimed
+
+    def release(self, key):
+        """Give up a claim, e.g. because processing failed, so a redelivery is processed."""
+        with self._lock:
+            self._recent.pop(key, None)
+        self.table.delete(self.prefix + key)
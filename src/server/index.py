@@ -1,29 +1,134 @@
+import base64
 import boto3
 import json
 import logging
 import requests
 import jwt
 import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import bulk_users
+import user_erasure
+import bulk_mailer
+import attachments
+import compaction
+from contact_guard import ContactGuard, DynamoDBCounterStore
+from rate_limiter import AdaptiveTokenBucket, RateLimiterRegistry, RateLimitExceeded, TokenBucket
+from negative_cache import NegativeCache, NegativeCacheHit
+from profile_cache import ProfileCache
+from single_flight import SingleFlight
+from metrics import emit_metric
+from object_store import LocalObjectStore, S3ObjectStore
+from email_templates import TEMPLATES, sync_templates
+from event_router import EventRouter
+from idempotency import DynamoDBIdempotencyTable, IdempotencyStore, LocalIdempotencyTable
+from ledger import LedgerWriter
+from paypal_webhooks import CertCache, WebhookVerificationError, verify_webhook
+from queues import LocalQueue, QueueMessage, SQSQueue
+from sheets_sink import GoogleSheetsClient, PartialWriteError, SheetsSink, sale_row
+from suppression import SuppressionList, parse_ses_notification
+from user_export import EXPORT_FORMATS, export_users, flatten_user, iter_user_pages, iter_users
+from user_index import ChangeLog, UserIndex
 
 load_dotenv()
 
 client = boto3.client('cognito-idp', region_name='us-west-1')
 ses = boto3.client('ses', region_name='us-west-1')
 ssm = boto3.client('ssm')
+# Clients that only some routes and workers use are created on first use, keeping them off
+# the cold start of every other request.
+s3 = None
+sqs = None
+dynamodb = None
+
+def get_s3():
+    global s3
+    if s3 is None:
+        s3 = boto3.client('s3')
+    return s3
+
+
+def get_sqs():
+    global sqs
+    if sqs is None:
+        sqs = boto3.client('sqs')
+    return sqs
+
+
+def get_dynamodb():
+    global dynamodb
+    if dynamodb is None:
+        dynamodb = boto3.client('dynamodb')
+    return dynamodb
+
+
+# Client-side token buckets per Cognito quota category, so bursts are queued briefly or shed before AWS throttles.
+cognito_limiters = RateLimiterRegistry.for_cognito()
+
+def cognito_call(operation, **kwargs):
+    """Call a Cognito API operation through its quota category's rate limiter."""
+    return cognito_limiters.call(operation, getattr(client, operation), **kwargs)
+
+# Emails recently reported as unknown by Cognito, so repeated lookups for them skip the Cognito call.
+unknown_users = NegativeCache(
+    ttl=float(os.getenv('NEGATIVE_CACHE_TTL_SECONDS', '60')),
+    memory_bytes=int(os.getenv('NEGATIVE_CACHE_BYTES', str(64 * 1024)))
+)
+
+# Recently fetched user attributes, used to skip no-op attribute writes in update_user.
+user_profiles = ProfileCache(ttl=float(os.getenv('PROFILE_CACHE_TTL_SECONDS', '60')))
+
+# Concurrent admin_get_user calls for the same email share one request.
+user_lookups = SingleFlight()
+
+# Admin user search index; loaded on first search, then kept current by sign-ups, updates,
+# deletes and erasures, which other containers pick up from the change log.
+USER_INDEX_KEY = "user-index/latest.idx"
+user_search_index = None
+user_index_changes = None
 
 environment = os.getenv('ENVIRONMENT')
 domain_name = os.getenv('DOMAIN_NAME')
 
+# Parameters are cached per warm container so repeated lookups skip the SSM round trip.
+SSM_CACHE_TTL_SECONDS = int(os.getenv('SSM_CACHE_TTL_SECONDS', '300'))
+_ssm_cache = {}
+
 def get_ssm_parameter(name: str) -> str:
-    """Fetch a parameter from AWS SSM Parameter Store with decryption enabled."""
+    """Fetch a parameter from AWS SSM Parameter Store with decryption enabled, caching it for SSM_CACHE_TTL_SECONDS."""
+    cached = _ssm_cache.get(name)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+
     response = ssm.get_parameter(Name=name, WithDecryption=True)
-    return response['Parameter']['Value']
+    value = response['Parameter']['Value']
+    _ssm_cache[name] = (value, time.monotonic() + SSM_CACHE_TTL_SECONDS)
+    return value
 
 def get_environment() -> str:
     """Retrieve the deployment environment, defaulting to 'dev' if not set."""
     return os.environ.get("ENVIRONMENT", "dev")
 
+class ConfigurationError(RuntimeError):
+    """A queue, table or bucket the deployed function needs is not configured."""
+
+def get_resource_setting(variable):
+    """
+    Return the environment variable naming a queue, table or bucket, or None if it is unset.
+
+    Unset is only allowed outside Lambda (local development and tests), where callers use
+    an in-process stand-in. In Lambda such a stand-in would acknowledge work and then lose
+    it with the container, so a missing setting raises instead.
+
+    :raises ConfigurationError: If the variable is unset in Lambda.
+    """
+    value = os.getenv(variable)
+    if not value and os.getenv('AWS_LAMBDA_FUNCTION_NAME'):
+        raise ConfigurationError(f"{variable} is not configured.")
+    return value
+
 def get_user_pool_id() -> str:
     """Retrieve Cognito User Pool ID from SSM."""
     return get_ssm_parameter(f"/rcw-client-backend-{get_environment()}/COGNITO_USER_POOL_ID")
@@ -40,6 +145,10 @@ def get_paypal_secret() -> str:
     """Retrieve PayPal Secret from SSM."""
     return get_ssm_parameter(f"/rcw-client-backend-{get_environment()}/PAYPAL_SECRET")
 
+def get_paypal_webhook_id() -> str:
+    """Retrieve the PayPal webhook ID from SSM."""
+    return get_ssm_parameter(f"/rcw-client-backend-{get_environment()}/PAYPAL_WEBHOOK_ID")
+
 def get_sender_email() -> str:
     """Retrieve SES Sender Email from SSM."""
     return get_ssm_parameter(f"/rcw-client-backend-{get_environment()}/SESIdentitySenderParameter")
@@ -48,12 +157,20 @@ def get_recipient_email() -> str:
     """Retrieve SES Recipient Email from SSM."""
     return get_ssm_parameter(f"/rcw-client-backend-{get_environment()}/SESRecipientParameter")
 
+def get_attachment_link_secret() -> str:
+    """Retrieve the secret that signs contact attachment download links from SSM."""
+    return get_ssm_parameter(f"/rcw-client-backend-{get_environment()}/CONTACT_ATTACHMENT_LINK_SECRET")
+
 # ALLOW_ORIGIN = domain_name
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 def lambda_handler(event, context):
+    # Queue, topic, schedule and Cognito trigger events go to the background handlers (see event_router).
+    if 'httpMethod' not in event:
+        return event_router.dispatch(event, context)
+
     try:
         # Extract HTTP method and resource path from the event
         http_method = event['httpMethod']
@@ -64,11 +181,13 @@ def lambda_handler(event, context):
             return cors_response(200, {"message": "CORS preflight successful"})
         
         # Parse body for non-GET/DELETE requests
+        body = {}
         if http_method not in ['GET', 'DELETE']:
-            body = json.loads(event.get('body', "{}"))
+            body = json.loads(get_raw_body(event) or b"{}")
         
         # Extract common parameters from query or body
-        email = body.get('email') if http_method not in ['GET', 'DELETE'] else event.get('queryStringParameters', {}).get('email')
+        query_params = event.get('queryStringParameters') or {}
+        email = body.get('email') if http_method not in ['GET', 'DELETE'] else query_params.get('email')
         password = body.get('password') if http_method != 'GET' else None
         first_name = body.get('first_name') if http_method != 'GET' else None
         last_name = body.get('last_name') if http_method != 'GET' else None
@@ -79,11 +198,13 @@ def lambda_handler(event, context):
         message = body.get('message') if http_method != 'GET' else None
         custom_id = body.get('custom_id') if http_method != 'GET' else None
         amount = body.get('amount') if http_method != 'GET' else None
+        source_ip = (event.get('requestContext') or {}).get('identity', {}).get('sourceIp')
         currency = body.get('currency', "USD") if http_method == "POST" and resource_path in ["/create-paypal-order", "/create-paypal-subscription"] else None
 
         # Route handler map
         route_map = {
             ("/signup", "POST"): lambda: sign_up(password, email, first_name, last_name),
+            ("/register", "POST"): lambda: register(password, email, first_name, last_name),
             ("/confirm", "POST"): lambda: confirm_user(email),
             ("/confirm-email", "POST"): lambda: confirm_email(access_token, confirmation_code),
             ("/confirm-email-resend", "POST"): lambda: confirm_email_resend(access_token),
@@ -93,14 +214,33 @@ def lambda_handler(event, context):
             ("/user", "GET"): lambda: get_user(email),
             ("/user", "PATCH"): lambda: update_user(email, attribute_updates),
             ("/user", "DELETE"): lambda: delete_user(email),
-            ("/contact-us", "POST"): lambda: contact_us(first_name, email, message),
+            ("/contact-us", "POST"): lambda: contact_us(first_name, email, message, source_ip, body.get('attachments')),
+            ("/contact-us/attachments", "POST"): lambda: create_contact_attachment_route(body.get('filename'), body.get('content_type')),
+            (attachments.DOWNLOAD_PATH, "GET"): lambda: download_contact_attachment_route(
+                query_params.get('key'), query_params.get('expires'), query_params.get('signature')
+            ),
             ("/create-paypal-order", "POST"): lambda: create_paypal_order_route(amount, custom_id, currency),
             ("/create-paypal-subscription", "POST"): lambda: create_paypal_subscription_route(amount, custom_id),
+            ("/paypal/webhook", "POST"): lambda: paypal_webhook_route(event.get('headers') or {}, get_raw_body(event)),
+            ("/batch", "POST"): lambda: batch_route(body.get('requests'), event),
+            ("/admin/users/export", "POST"): lambda: export_users_route(body.get('format', "ndjson"), body.get('filter')),
+            ("/admin/jobs", "GET"): lambda: get_admin_job_route(query_params.get('id')),
+            ("/admin/users/search", "GET"): lambda: search_users_route(query_params),
+            ("/admin/users/index", "POST"): lambda: rebuild_user_index_route(),
+            ("/admin/users/lookup", "POST"): lambda: lookup_users_route(body.get('emails')),
+            ("/admin/email-templates/sync", "POST"): lambda: sync_email_templates_route(),
         }
         
         # Check if the route exists and execute the corresponding function
         result = route_map.get((resource_path, http_method))
+        if result and resource_path.startswith("/admin/"):
+            # Checked per request, before coalescing, so only admins share admin responses.
+            denied = require_admin(event)
+            if denied:
+                return denied
         if result:
+            if http_method == "GET" and resource_path in COALESCED_GET_ROUTES:
+                return coalesced_get(resource_path, query_params, result)
             return result()
         else:
             return cors_response(404, {"message": "Resource not found"})
@@ -110,6 +250,121 @@ def lambda_handler(event, context):
         return cors_response(500, {"message": str(e)})
 
 
+def get_raw_body(event):
+    """Return the request body exactly as received, as bytes."""
+    body = event.get('body') or ""
+    if event.get('isBase64Encoded'):
+        return base64.b64decode(body)
+    return body.encode('utf-8')
+
+
+# Request Coalescing
+# Idempotent GET routes whose identical concurrent requests share one execution.
+COALESCED_GET_ROUTES = {"/user", "/admin/users/search"}
+
+def record_coalescing(key, followers):
+    """Publish how many requests one coalesced route execution served."""
+    emit_metric({"Route": key[0]}, Requests=followers + 1, Executions=1, CoalescedRequests=followers)
+
+
+route_flights = SingleFlight(on_done=record_coalescing)
+
+def coalesced_get(resource_path, query_params, handler):
+    """
+    Run a GET route handler, sharing its response with identical requests already in flight.
+
+    Requests are identical when the path and query string match; these routes take no
+    headers into account, so the response is the same for every caller. The coalescing
+    ratio is published as Requests / Executions per route (see record_coalescing).
+
+    :param resource_path: The request path.
+    :param query_params: The request's query string parameters.
+    :param handler: The route handler to run.
+    :return: The route's CORS response; each caller gets its own copy.
+    """
+    key = (resource_path, tuple(sorted(query_params.items())))
+    response, _ = route_flights.do(key, handler)
+    return {**response, "headers": dict(response["headers"])}
+
+
+# Batch Requests
+MAX_BATCH_REQUESTS = int(os.getenv('MAX_BATCH_REQUESTS', '20'))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '8'))
+
+def batch_route(sub_requests, event=None):
+    """
+    Run several API requests in a single invocation through the regular route table.
+
+    Each sub-request is an object with "route", "method" and optionally "id", "body",
+    "query" and "depends_on" (a list of ids of earlier sub-requests). Sub-requests whose
+    dependencies have completed run concurrently; a sub-request whose dependency did not
+    return a 2xx status is skipped with a 424 status. Sub-requests carry the batch's
+    requestContext and headers, so per-IP limits and authorization apply to them as well.
+
+    :param sub_requests: The list of sub-requests from the request body.
+    :param event: The API Gateway event of the batch request.
+    :return: A CORS response with one {id, status, body} entry per sub-request, in order.
+    """
+    if not isinstance(sub_requests, list) or not sub_requests:
+        return cors_response(400, {"message": "A non-empty 'requests' list is required."})
+    if len(sub_requests) > MAX_BATCH_REQUESTS:
+        return cors_response(400, {"message": f"A batch may contain at most {MAX_BATCH_REQUESTS} requests."})
+
+    # Validate every item up front so a malformed batch does no work at all.
+    ids = []
+    for index, item in enumerate(sub_requests):
+        if not isinstance(item, dict) or not item.get('route') or not item.get('method'):
+            return cors_response(400, {"message": f"Request {index} must include 'route' and 'method'."})
+        if not isinstance(item['route'], str) or not isinstance(item['method'], str):
+            return cors_response(400, {"message": f"Request {index} must give 'route' and 'method' as strings."})
+        if item['route'] == "/batch":
+            return cors_response(400, {"message": "Batch requests cannot be nested."})
+        item_id = str(item.get('id', index))
+        if item_id in ids:
+            return cors_response(400, {"message": f"Duplicate request id '{item_id}'."})
+        if not isinstance(item.get('depends_on', []), list):
+            return cors_response(400, {"message": f"Request '{item_id}' must give 'depends_on' as a list of request ids."})
+        # Dependencies must point at earlier items, which rules out cycles.
+        unknown = [dep for dep in item.get('depends_on', []) if str(dep) not in ids]
+        if unknown:
+            return cors_response(400, {"message": f"Request '{item_id}' depends on unknown or later requests: {unknown}."})
+        ids.append(item_id)
+
+    def dispatch(item):
+        response = lambda_handler({
+            "httpMethod": item['method'].upper(),
+            "path": item['route'],
+            "body": json.dumps(item.get('body') or {}),
+            "queryStringParameters": item.get('query') or {},
+            "requestContext": (event or {}).get('requestContext') or {},
+            "headers": (event or {}).get('headers') or {}
+        }, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    results = {}
+    pending = list(range(len(sub_requests)))
+    with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(sub_requests))) as pool:
+        while pending:
+            ready = [i for i in pending if all(str(dep) in results for dep in sub_requests[i].get('depends_on', []))]
+            futures = {}
+            for i in ready:
+                failed = [str(dep) for dep in sub_requests[i].get('depends_on', []) if not 200 <= results[str(dep)][0] < 300]
+                if failed:
+                    results[ids[i]] = (424, {"message": f"Skipped because a dependency failed: {failed}."})
+                else:
+                    futures[i] = pool.submit(dispatch, sub_requests[i])
+            for i, future in futures.items():
+                results[ids[i]] = future.result()
+            pending = [i for i in pending if i not in ready]
+
+    return cors_response(200, {
+        "responses": [
+            {"id": item_id, "status": results[item_id][0], "body": results[item_id][1]}
+            for item_id in ids
+        ]
+    })
+
+
 # Helper function to add CORS headers
 def cors_response(status_code, body):
     return {
@@ -143,7 +398,7 @@ def sign_up(password, email, first_name, last_name):
     
     try:
         # Attempt to sign the user up using the Cognito admin API.
-        client.sign_up(
+        response = cognito_call('sign_up',
             ClientId=get_user_pool_client_id(), # Retrieve the Cognito User Pool ID.
             Username=email,
             Password=password,
@@ -153,12 +408,19 @@ def sign_up(password, email, first_name, last_name):
                 {'Name': 'custom:lastName', 'Value': last_name}
             ]
         )
-        return cors_response(200, {"message": "User signed up successfully"})
+        unknown_users.discard(email)
+        record_user_index_changes([{"email": email, "first_name": first_name, "last_name": last_name}])
+        # When the pre sign-up trigger auto-confirms the user, the client can skip /confirm.
+        return cors_response(200, {
+            "message": "User signed up successfully",
+            "user_confirmed": bool(response.get('UserConfirmed', False))
+        })
     
     except Exception as e:
         # Map known exceptions to their corresponding HTTP status and messages.
         # For some exceptions, if the message is None, use the dynamic error message from Cognito.
         error_map = {
+            RateLimitExceeded: (429, "Too many requests. Please try again later."),
             client.exceptions.UsernameExistsException: (409, "User already exists"),
             client.exceptions.AliasExistsException: (409, "A user with this email or phone number already exists."),
             client.exceptions.InvalidPasswordException: (400, None),
@@ -192,7 +454,7 @@ def confirm_user(email):
     """
     try:
         # Attempt to confirm the user's sign-up using the Cognito admin API.
-        client.admin_confirm_sign_up(
+        cognito_call('admin_confirm_sign_up',
             UserPoolId=get_user_pool_id(),  # Retrieve the Cognito User Pool ID.
             Username=email                   # Use the email as the username.
         )
@@ -201,6 +463,7 @@ def confirm_user(email):
     except Exception as e:
         # Define an error map to associate specific exception types with their respective HTTP status codes and messages.
         error_map = {
+            RateLimitExceeded: (429, "Too many requests. Please try again later."),
             client.exceptions.UserNotFoundException: (
                 404, "We could not find a user with this email address."
             ),
@@ -221,6 +484,110 @@ def confirm_user(email):
         return cors_response(500, {"message": "Something went wrong while confirming the user. Please try again later."})
 
 
+# Pre Sign-Up Trigger
+def should_auto_confirm(email):
+    """
+    Decide whether a new sign-up should be confirmed automatically.
+
+    Controlled by the AUTO_CONFIRM_USERS environment variable (defaults to "true") and,
+    optionally, AUTO_CONFIRM_EMAIL_DOMAINS, a comma-separated allow list of email domains.
+
+    :param email: The email address the user is signing up with.
+    :return: True if the user should be confirmed without calling /confirm.
+    """
+    if os.environ.get("AUTO_CONFIRM_USERS", "true").lower() != "true":
+        return False
+    if not email or "@" not in email:
+        return False
+
+    allowed_domains = [
+        domain.strip().lower()
+        for domain in os.environ.get("AUTO_CONFIRM_EMAIL_DOMAINS", "").split(",")
+        if domain.strip()
+    ]
+    if not allowed_domains:
+        return True
+    return email.rsplit("@", 1)[1].lower() in allowed_domains
+
+
+def pre_sign_up_handler(event, context):
+    """
+    Cognito pre sign-up trigger that confirms users according to policy.
+
+    Auto-confirming here removes the admin_confirm_sign_up call (and the /confirm
+    round trip) from registration. The email address is still verified by code
+    through /confirm-email, so autoVerifyEmail is left untouched.
+
+    :param event: The Cognito PreSignUp trigger event.
+    :param context: The Lambda context object.
+    :return: The event, with the response section filled in for Cognito.
+    """
+    trigger_source = event.get('triggerSource')
+    if trigger_source != "PreSignUp_SignUp":
+        return event
+
+    email = event.get('request', {}).get('userAttributes', {}).get('email')
+    response = event.setdefault('response', {})
+    response['autoConfirmUser'] = should_auto_confirm(email)
+
+    logger.info(f"Pre sign-up trigger ({trigger_source}): autoConfirmUser={response['autoConfirmUser']}")
+    return event
+
+
+# Register (Sign-Up + Confirm + Log-In)
+def register(password, email, first_name, last_name):
+    """
+    Register a user in a single invocation: sign up, confirm (when the pre sign-up trigger
+    has not already done so), log in, and send the email verification code.
+
+    Each step reuses the existing route function, so a failing step returns the same status
+    and message as the standalone route, plus the name of the failed step and the steps that
+    already completed (e.g. a failed login after a successful sign-up can be retried via /login).
+
+    :param password: The user's password.
+    :param email: The user's email address (used as the username).
+    :param first_name: The user's first name.
+    :param last_name: The user's last name.
+    :return: A CORS response with authentication tokens or the failing step's error.
+    """
+    completed_steps = []
+
+    def step_failed(step, response):
+        body = json.loads(response['body'])
+        body.update({"failed_step": step, "completed_steps": completed_steps})
+        return cors_response(response['statusCode'], body)
+
+    response = sign_up(password, email, first_name, last_name)
+    if response['statusCode'] != 200:
+        return step_failed("signup", response)
+    completed_steps.append("signup")
+
+    if not json.loads(response['body']).get("user_confirmed"):
+        response = confirm_user(email)
+        if response['statusCode'] != 200:
+            return step_failed("confirm", response)
+    completed_steps.append("confirm")
+
+    response = log_in(email, password)
+    if response['statusCode'] != 200:
+        return step_failed("login", response)
+    completed_steps.append("login")
+    tokens = json.loads(response['body'])
+
+    # The verification code is best effort: the user can always request a new one from /confirm-email-resend.
+    response = confirm_email_resend(tokens["access_token"])
+    verification_code_sent = response['statusCode'] == 200
+    if verification_code_sent:
+        completed_steps.append("verification_code")
+
+    tokens.update({
+        "message": "User registered successfully",
+        "verification_code_sent": verification_code_sent,
+        "completed_steps": completed_steps
+    })
+    return cors_response(200, tokens)
+
+
 # Confirm Email
 def confirm_email(access_token, confirmation_code):
     """
@@ -235,7 +602,7 @@ def confirm_email(access_token, confirmation_code):
     """
     try:
         # Attempt to verify the email attribute using the confirmation code.
-        client.verify_user_attribute(
+        cognito_call('verify_user_attribute',
             AccessToken=access_token,
             AttributeName='email',
             Code=confirmation_code
@@ -246,6 +613,7 @@ def confirm_email(access_token, confirmation_code):
     except Exception as e:
         # Mapping of known exception types to their corresponding response status and message.
         error_map = {
+            RateLimitExceeded: (429, "Too many requests. Please wait a moment and try again."),
             client.exceptions.CodeMismatchException: (
                 400, "The confirmation code you entered is incorrect. Please check and try again."
             ),
@@ -286,7 +654,7 @@ def confirm_email_resend(access_token):
     """
     try:
         # Request a new verification code for the email attribute.
-        client.get_user_attribute_verification_code(
+        cognito_call('get_user_attribute_verification_code',
             AccessToken=access_token,
             AttributeName='email'
         )
@@ -295,6 +663,7 @@ def confirm_email_resend(access_token):
     except Exception as e:
         # Map known exceptions to their HTTP status codes and error messages.
         error_map = {
+            RateLimitExceeded: (429, "You have exceeded the number of allowed attempts. Please wait before trying again."),
             client.exceptions.LimitExceededException: (
                 429, "You have exceeded the number of allowed attempts. Please wait before trying again."
             ),
@@ -331,7 +700,7 @@ def log_in(email, password):
         return cors_response(400, {"message": "Email and password are required"})
     
     try:
-        response = client.initiate_auth(
+        response = cognito_call('initiate_auth',
             ClientId=get_user_pool_client_id(),
             AuthFlow='USER_PASSWORD_AUTH',
             AuthParameters={
@@ -355,6 +724,7 @@ def log_in(email, password):
     except Exception as e:
         # Define known exceptions with corresponding HTTP status codes and messages.
         error_map = {
+            RateLimitExceeded: (429, "Too many login attempts right now. Please wait a moment and try again."),
             client.exceptions.NotAuthorizedException: (
                 401, "The email or password provided is incorrect. Please try again."
             ),
@@ -380,16 +750,23 @@ def forgot_password(email):
     :return: A CORS response indicating the result of the password reset request.
     """
     try:
-        client.forgot_password(
+        if email in unknown_users:
+            raise NegativeCacheHit(email)
+
+        cognito_call('forgot_password',
             ClientId=get_user_pool_client_id(),
             Username=email
         )
         return cors_response(200, {"message": "Password reset initiated. Check your email for the code."})
     
     except Exception as e:
+        if email and isinstance(e, client.exceptions.UserNotFoundException):
+            unknown_users.add(email)
+
         # Map specific exceptions to their corresponding HTTP status codes and messages.
         error_map = {
-            client.exceptions.UserNotFoundException: (
+            RateLimitExceeded: (429, "You have exceeded the number of allowed attempts. Please wait a while before trying again."),
+            (client.exceptions.UserNotFoundException, NegativeCacheHit): (
                 404, "We could not find an account associated with this email address."
             ),
             client.exceptions.LimitExceededException: (
@@ -420,7 +797,7 @@ def confirm_forgot_password(email, confirmation_code, new_password):
     :return: A CORS response indicating the result of the password reset confirmation.
     """
     try:
-        client.confirm_forgot_password(
+        cognito_call('confirm_forgot_password',
             ClientId=get_user_pool_client_id(),
             Username=email,
             ConfirmationCode=confirmation_code,
@@ -431,6 +808,7 @@ def confirm_forgot_password(email, confirmation_code, new_password):
     except Exception as e:
         # Define a mapping of exceptions to their respective HTTP status codes and messages.
         error_map = {
+            RateLimitExceeded: (429, "You have made too many attempts. Please wait a while before trying again."),
             client.exceptions.CodeMismatchException: (
                 400, "The confirmation code you entered is incorrect. Please check the code and try again."
             ),
@@ -472,7 +850,11 @@ def get_user(email):
         return cors_response(400, {"message": "Missing required 'email' query parameter"})
     
     try:
-        response = client.admin_get_user(
+        # Emails Cognito recently reported as unknown are answered without another call.
+        if email in unknown_users:
+            raise NegativeCacheHit(email)
+
+        response = cognito_call('admin_get_user',
             UserPoolId=get_user_pool_id(),
             Username=email
         )
@@ -480,6 +862,7 @@ def get_user(email):
         user_attributes = {attr['Name']: attr['Value'] for attr in response['UserAttributes']}
         # Determine the email verification status.
         email_verified = user_attributes.get("email_verified", "false").lower() == "true"
+        user_profiles.put(email, user_attributes)
 
         return cors_response(200, {
             "message": "User data retrieved successfully",
@@ -488,9 +871,13 @@ def get_user(email):
         })
     
     except Exception as e:
+        if isinstance(e, client.exceptions.UserNotFoundException):
+            unknown_users.add(email)
+
         # Map specific exceptions to HTTP statuses and messages.
         error_map = {
-            client.exceptions.UserNotFoundException: (
+            RateLimitExceeded: (429, "Too many requests have been made in a short period. Please wait a while before retrying."),
+            (client.exceptions.UserNotFoundException, NegativeCacheHit): (
                 404, "The requested user could not be found. Please check the provided details and try again."
             ),
             client.exceptions.InvalidParameterException: (
@@ -511,14 +898,109 @@ def get_user(email):
         })
 
 
+# Bulk User Lookup
+MAX_LOOKUP_EMAILS = int(os.getenv('MAX_LOOKUP_EMAILS', '100'))
+LOOKUP_MAX_WORKERS = int(os.getenv('LOOKUP_MAX_WORKERS', '8'))
+
+def fetch_user_attributes(email):
+    """
+    Fetch a user's attributes from Cognito, sharing the call with concurrent lookups of the same email.
+
+    :param email: The user's email address.
+    :return: The user's attributes as a dict.
+    """
+    def fetch():
+        response = cognito_call('admin_get_user', UserPoolId=get_user_pool_id(), Username=email)
+        user_attributes = {attr['Name']: attr['Value'] for attr in response['UserAttributes']}
+        user_profiles.put(email, user_attributes)
+        return user_attributes
+
+    user_attributes, _ = user_lookups.do(email.lower(), fetch)
+    return dict(user_attributes)
+
+
+def found_user_result(email, user_attributes, source):
+    return {
+        "email": email,
+        "status": "found",
+        "source": source,
+        "user_attributes": user_attributes,
+        "email_verified": user_attributes.get("email_verified", "false").lower() == "true"
+    }
+
+
+def lookup_user(email):
+    """
+    Fetch one email from Cognito for lookup_users_route and describe the outcome.
+
+    :param email: The user's email address.
+    :return: A dict with the email, a status (found, not_found, throttled or error) and, when
+        found, the user's attributes and email verification status.
+    """
+    try:
+        return found_user_result(email, fetch_user_attributes(email), "cognito")
+
+    except Exception as e:
+        if isinstance(e, client.exceptions.UserNotFoundException):
+            unknown_users.add(email)
+            return {"email": email, "status": "not_found"}
+        if isinstance(e, (RateLimitExceeded, client.exceptions.TooManyRequestsException)):
+            return {"email": email, "status": "throttled"}
+        logger.error(f"Unexpected error looking up {email}: {str(e)}", exc_info=True)
+        return {"email": email, "status": "error"}
+
+
+def lookup_users_route(emails):
+    """
+    Look up many users in one request.
+
+    Cached profiles and known-unknown emails are answered immediately; the remaining emails
+    are fetched from Cognito concurrently (behind the Cognito rate limiter), with identical
+    in-flight lookups sharing one admin_get_user call.
+
+    :param emails: A list of up to MAX_LOOKUP_EMAILS email addresses.
+    :return: A CORS response with one result per distinct email, in request order.
+    """
+    if not isinstance(emails, list) or not emails:
+        return cors_response(400, {"message": "Missing required 'emails' list"})
+    if len(emails) > MAX_LOOKUP_EMAILS:
+        return cors_response(400, {"message": f"A lookup can contain at most {MAX_LOOKUP_EMAILS} emails"})
+    if not all(isinstance(email, str) and email.strip() for email in emails):
+        return cors_response(400, {"message": "Every email must be a non-empty string"})
+
+    emails = list(dict.fromkeys(email.strip() for email in emails))
+    results = {}
+    misses = []
+    for email in emails:
+        cached = user_profiles.get(email)
+        if cached is not None:
+            results[email] = found_user_result(email, cached, "cache")
+        elif email in unknown_users:
+            results[email] = {"email": email, "status": "not_found"}
+        else:
+            misses.append(email)
+
+    if misses:
+        with ThreadPoolExecutor(max_workers=min(LOOKUP_MAX_WORKERS, len(misses))) as executor:
+            for email, result in zip(misses, executor.map(lookup_user, misses)):
+                results[email] = result
+
+    return cors_response(200, {
+        "message": "User lookup completed",
+        "results": [results[email] for email in emails]
+    })
+
+
 # Update User Attributes
 def update_user(email, attribute_updates):
     """
     Update user attributes in the Cognito User Pool.
 
     Handles password updates separately using admin_set_user_password, and updates any
-    other attributes using admin_update_user_attributes. Returns a CORS response indicating
-    the result.
+    other attributes using admin_update_user_attributes. Attributes are diffed against the
+    cached profile, or the profile read from Cognito on a cache miss, so only changed values
+    are written (and the call is skipped when nothing changed); the password and attribute
+    updates run concurrently. Returns a CORS response indicating the result.
 
     :param email: The email (username) of the user to update.
     :param attribute_updates: A dictionary of attribute names and their new values.
@@ -531,29 +1013,76 @@ def update_user(email, attribute_updates):
     
     try:
         # Handle password update separately, if provided.
-        if 'password' in attribute_updates:
-            new_password = attribute_updates.pop('password')
-            client.admin_set_user_password(
+        new_password = attribute_updates.pop('password', None)
+
+        def update_password():
+            cognito_call('admin_set_user_password',
                 UserPoolId=get_user_pool_id(),
                 Username=email,
                 Password=new_password,
                 Permanent=True
             )
-        
-        # Update any remaining attributes.
+            return {}
+
+        def update_attributes():
+            # Only send attributes that differ from the cached profile, fetching it on a miss.
+            current_attributes = user_profiles.get(email)
+            if current_attributes is None:
+                response = cognito_call('admin_get_user', UserPoolId=get_user_pool_id(), Username=email)
+                current_attributes = {attr['Name']: attr['Value'] for attr in response['UserAttributes']}
+                user_profiles.put(email, current_attributes)
+            changed = {key: value for key, value in attribute_updates.items() if current_attributes.get(key) != value}
+            if changed:
+                cognito_call('admin_update_user_attributes',
+                    UserPoolId=get_user_pool_id(),
+                    Username=email,
+                    UserAttributes=[{'Name': key, 'Value': value} for key, value in changed.items()]
+                )
+            return changed
+
+        updates = []
+        if new_password is not None:
+            updates.append(update_password)
         if attribute_updates:
-            attributes = [{'Name': key, 'Value': value} for key, value in attribute_updates.items()]
-            client.admin_update_user_attributes(
-                UserPoolId=get_user_pool_id(),
-                Username=email,
-                UserAttributes=attributes
-            )
-        
-        return cors_response(200, {"message": "User attributes updated successfully"})
+            updates.append(update_attributes)
+
+        if len(updates) > 1:
+            # The attribute update, including any profile read it needs, overlaps the password update.
+            with ThreadPoolExecutor(max_workers=len(updates)) as pool:
+                futures = [pool.submit(update) for update in updates]
+                # Surface the first failure in submission order (password before attributes).
+                changed_attributes = [future.result() for future in futures][-1]
+        else:
+            changed_attributes = updates[0]() if updates else {}
+
+        # A new email resets verification in Cognito, so drop the entry instead of patching it.
+        if 'email' in changed_attributes:
+            user_profiles.invalidate(email)
+        else:
+            user_profiles.merge(email, changed_attributes)
+
+        if changed_attributes.keys() & {'email', 'custom:firstName', 'custom:lastName'}:
+            change = {
+                "email": changed_attributes.get('email', email),
+                "first_name": changed_attributes.get('custom:firstName'),
+                "last_name": changed_attributes.get('custom:lastName')
+            }
+            if 'email' in changed_attributes:
+                change["previous_email"] = email
+            record_user_index_changes([change])
+
+        return cors_response(200, {
+            "message": "User attributes updated successfully",
+            "updated_attributes": sorted(changed_attributes)
+        })
     
     except Exception as e:
+        # A partial update may have gone through, so the cached profile can no longer be trusted.
+        user_profiles.invalidate(email)
+
         # Map specific exceptions to their HTTP statuses and messages.
         error_map = {
+            RateLimitExceeded: (429, "Too many requests have been made in a short period. Please wait a while before retrying."),
             client.exceptions.UserNotFoundException: (
                 404, "No user was found with the provided email address."
             ),
@@ -599,15 +1128,18 @@ def delete_user(email):
         return cors_response(400, {"message": "Email is required"})
     
     try:
-        client.admin_delete_user(
+        cognito_call('admin_delete_user',
             UserPoolId=get_user_pool_id(),
             Username=email
         )
+        user_profiles.invalidate(email)
+        record_user_index_changes([{"email": email, "removed": True}])
         return cors_response(200, {"message": "User deleted successfully"})
     
     except Exception as e:
         # Map specific exceptions to HTTP statuses and messages.
         error_map = {
+            RateLimitExceeded: (429, "Too many requests have been made in a short period. Please wait a while before retrying."),
             client.exceptions.UserNotFoundException: (
                 404, "No user was found with the provided email address. Please check and try again."
             ),
@@ -628,33 +1160,724 @@ def delete_user(email):
         })
 
 
+# Admin Authorization
+ADMIN_GROUP = os.getenv('ADMIN_GROUP', "admin")
+
+def get_bearer_token(headers):
+    """Return the token of an "Authorization: Bearer <token>" header, or None."""
+    for name, value in (headers or {}).items():
+        if name.lower() == "authorization" and value and value.startswith("Bearer "):
+            return value[len("Bearer "):].strip() or None
+    return None
+
+
+def require_admin(event):
+    """
+    Check that a request was made by a member of the ADMIN_GROUP Cognito group.
+
+    The caller sends their Cognito access token as "Authorization: Bearer <token>". Cognito
+    GetUser accepts only genuine, unexpired and unrevoked tokens; the token's claims must
+    then name this user pool as issuer and list ADMIN_GROUP among the user's groups.
+
+    :param event: The API Gateway event.
+    :return: None if the caller is an admin, otherwise a 401, 403 or 429 CORS response.
+    """
+    token = get_bearer_token(event.get('headers'))
+    if not token:
+        return cors_response(401, {"message": "Sign in as an administrator to use this resource."})
+
+    try:
+        cognito_call('get_user', AccessToken=token)
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except Exception as e:
+        error_map = {
+            (client.exceptions.NotAuthorizedException, jwt.InvalidTokenError): (
+                401, "Your session is invalid or has expired. Please sign in again."
+            ),
+            (RateLimitExceeded, client.exceptions.TooManyRequestsException): (
+                429, "Too many requests have been made in a short period. Please wait a while before retrying."
+            )
+        }
+        for exc_type, (status, message) in error_map.items():
+            if isinstance(e, exc_type):
+                return cors_response(status, {"message": message})
+        raise
+
+    # GetUser accepts tokens from any user pool in the region, so check which one issued it.
+    if claims.get('token_use') != "access" or claims.get('iss', "").rsplit("/", 1)[-1] != get_user_pool_id():
+        return cors_response(401, {"message": "Your session is invalid or has expired. Please sign in again."})
+    if ADMIN_GROUP not in claims.get('cognito:groups', []):
+        return cors_response(403, {"message": "You are not authorized to use this resource."})
+    return None
+
+
+# Admin Jobs
+ADMIN_JOB_PREFIX = "admin-jobs/"
+admin_job_queue = None
+admin_job_store = None
+
+def get_admin_job_queue():
+    """
+    Return the queue admin jobs run from: the SQS queue at ADMIN_JOB_QUEUE_URL, or an
+    in-process LocalQueue when no URL is configured outside Lambda.
+
+    :raises ConfigurationError: If ADMIN_JOB_QUEUE_URL is unset in Lambda.
+    """
+    global admin_job_queue
+    if admin_job_queue is None:
+        queue_url = get_resource_setting('ADMIN_JOB_QUEUE_URL')
+        admin_job_queue = SQSQueue(queue_url, get_sqs()) if queue_url else LocalQueue()
+    return admin_job_queue
+
+
+def get_admin_job_store():
+    """
+    Return the store of admin job records: ADMIN_JOB_BUCKET, or /tmp outside Lambda.
+
+    :raises ConfigurationError: If ADMIN_JOB_BUCKET is unset in Lambda.
+    """
+    global admin_job_store
+    if admin_job_store is None:
+        bucket = get_resource_setting('ADMIN_JOB_BUCKET')
+        admin_job_store = S3ObjectStore(bucket, get_s3()) if bucket else LocalObjectStore("/tmp/admin-jobs")
+    return admin_job_store
+
+
+def save_admin_job(job):
+    get_admin_job_store().put(f"{ADMIN_JOB_PREFIX}{job['job_id']}.json", json.dumps(job).encode('utf-8'),
+                              content_type="application/json")
+
+
+def load_admin_job(job_id):
+    store = get_admin_job_store()
+    key = f"{ADMIN_JOB_PREFIX}{job_id}.json"
+    return json.loads(store.get(key)) if store.exists(key) else None
+
+
+def start_admin_job(job_type, params):
+    """
+    Record an admin job as queued and send it to the admin job queue.
+
+    Jobs that can outlast API Gateway's 29 second limit run this way; the caller polls
+    GET /admin/jobs?id=<job_id> for the outcome.
+
+    :param job_type: A key of ADMIN_JOB_RUNNERS.
+    :param params: The job's JSON-serializable parameters.
+    :return: A 202 CORS response with the job id.
+    """
+    job = {"job_id": uuid.uuid4().hex, "type": job_type, "status": "queued", "params": params,
+           "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+    save_admin_job(job)
+    get_admin_job_queue().send({"job_id": job['job_id']})
+    return cors_response(202, {"message": "Job queued", "job_id": job['job_id'], "status": "queued"})
+
+
+def get_admin_job_route(job_id):
+    """
+    Report an admin job's status and, once it is complete, its result.
+
+    :param job_id: The id start_admin_job returned.
+    :return: A CORS response with the job record.
+    """
+    if not job_id:
+        return cors_response(400, {"message": "Missing required 'id' query parameter"})
+    try:
+        job = load_admin_job(job_id)
+        if job is None:
+            return cors_response(404, {"message": "No job was found with the provided id."})
+        if job['type'] == "user-export" and job['status'] == "complete":
+            # Signed now rather than when the job finished, so the link is always fresh.
+            job['result']['download_url'] = S3ObjectStore(os.environ["USER_EXPORT_BUCKET"], get_s3()).url(job['result']['key'])
+        return cors_response(200, job)
+    except Exception as e:
+        logger.error(f"Unexpected error in get_admin_job_route: {str(e)}", exc_info=True)
+        return cors_response(500, {"message": "An unexpected error occurred while reading the job. Please try again later."})
+
+
+def run_admin_job(job_id):
+    """
+    Run a queued admin job and record its outcome.
+
+    Throttling leaves the job queued, to be retried; any other error fails it for good.
+
+    :param job_id: The job to run.
+    :return: True if the job is finished (complete or failed), False if it should be retried.
+    """
+    job = load_admin_job(job_id)
+    if job is None or job['status'] in ("complete", "failed"):
+        return True
+
+    save_admin_job({**job, "status": "running"})
+    try:
+        result = ADMIN_JOB_RUNNERS[job['type']](job_id, **job['params'])
+        save_admin_job({**job, "status": "complete", "result": result,
+                        "finished_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())})
+        return True
+    except Exception as e:
+        if isinstance(e, (RateLimitExceeded, client.exceptions.TooManyRequestsException)):
+            logger.warning(f"Admin job {job_id} was throttled; it will be retried.")
+            save_admin_job(job)
+            return False
+
+        error_map = {
+            client.exceptions.InvalidParameterException: "The export filter is invalid. Please verify it and try again."
+        }
+        error = next((message for exc_type, message in error_map.items() if isinstance(e, exc_type)), None)
+        if error is None:
+            logger.error(f"Unexpected error in admin job {job_id}: {str(e)}", exc_info=True)
+            error = "An unexpected error occurred while running the job."
+        save_admin_job({**job, "status": "failed", "error": error,
+                        "finished_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())})
+        return True
+
+
+def admin_job_worker(event, context):
+    """
+    Lambda entry point that runs queued admin jobs one after another.
+
+    Triggered by the admin job queue (use a batch size of 1, since jobs are long), it
+    reports throttled jobs as batchItemFailures so SQS retries them. Invoked any other way,
+    it drains the queue.
+
+    :param event: An SQS event, or any other event to drain the queue.
+    :param context: The Lambda context object.
+    :return: {"batchItemFailures": [...]} for SQS events, otherwise finished and retried counts.
+    """
+    if 'Records' in event:
+        failures = []
+        for record in event['Records']:
+            if not run_admin_job(QueueMessage.from_sqs_record(record).body['job_id']):
+                failures.append({"itemIdentifier": record['messageId']})
+        return {"batchItemFailures": failures}
+
+    queue = get_admin_job_queue()
+    finished = retried = 0
+    while True:
+        messages = queue.receive(max_messages=10)
+        if not messages:
+            break
+        done = [queued for queued in messages if run_admin_job(queued.body['job_id'])]
+        queue.delete(done)
+        finished += len(done)
+        retried += len(messages) - len(done)
+        if retried:
+            break
+    return {"finished": finished, "retried": retried}
+
+
+# Admin User Export
+def export_users_route(export_format="ndjson", filter_expression=None):
+    """
+    Start exporting every user in the pool to S3 as NDJSON or CSV.
+
+    The export runs as an admin job (see run_user_export), since a large pool takes longer
+    than API Gateway waits. The destination bucket is taken from the USER_EXPORT_BUCKET
+    environment variable.
+
+    :param export_format: "ndjson" (default) or "csv".
+    :param filter_expression: An optional ListUsers filter, e.g. 'cognito:user_status = "CONFIRMED"'.
+    :return: A 202 CORS response with the job id to poll at GET /admin/jobs.
+    """
+    if export_format not in EXPORT_FORMATS:
+        return cors_response(400, {"message": f"Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}."})
+
+    if not os.environ.get("USER_EXPORT_BUCKET"):
+        logger.error("USER_EXPORT_BUCKET is not configured.")
+        return cors_response(500, {"message": "User export is not configured. Please contact support."})
+
+    try:
+        return start_admin_job("user-export", {"export_format": export_format, "filter_expression": filter_expression})
+    except Exception as e:
+        logger.error(f"Unexpected error in export_users_route: {str(e)}", exc_info=True)
+        return cors_response(500, {
+            "message": "An unexpected error occurred while exporting users. Please try again later."
+        })
+
+
+def run_user_export(job_id, export_format="ndjson", filter_expression=None):
+    """
+    Export every user in the pool to USER_EXPORT_BUCKET.
+
+    Users are read page by page from Cognito ListUsers and streamed straight into a multipart
+    upload, so memory use stays constant however large the pool is. The object is named
+    after the job, so a retried job replaces its own output.
+
+    :param job_id: The admin job id.
+    :return: {"key", "count"}.
+    """
+    extension, content_type = EXPORT_FORMATS[export_format]
+    key = f"user-exports/{job_id}.{extension}"
+    store = S3ObjectStore(os.environ["USER_EXPORT_BUCKET"], get_s3())
+    users = iter_users(
+        lambda **kwargs: cognito_call('list_users', **kwargs),
+        get_user_pool_id(),
+        filter_expression=filter_expression
+    )
+    with store.open_writer(key, content_type=content_type) as out:
+        count = export_users(users, out, export_format)
+    return {"key": key, "count": count}
+
+
+# Admin User Search
+def get_user_index_changes():
+    """
+    Return the user index change log under USER_INDEX_BUCKET, or None when no bucket is set
+    (the index then only reflects changes made in the container that holds it).
+    """
+    global user_index_changes
+    if user_index_changes is None and os.getenv('USER_INDEX_BUCKET'):
+        user_index_changes = ChangeLog(S3ObjectStore(os.environ['USER_INDEX_BUCKET'], get_s3()))
+    return user_index_changes
+
+
+def record_user_index_changes(changes):
+    """
+    Apply user changes to this container's search index, if it is loaded, and persist them
+    to the change log so other containers and later cold starts apply them too.
+
+    A change log failure is logged rather than raised: the user change itself has already
+    succeeded in Cognito, and the next index rebuild picks it up.
+
+    :param changes: A list of UserIndex.apply() entries.
+    """
+    if user_search_index is not None:
+        for change in changes:
+            user_search_index.apply(change)
+    try:
+        change_log = get_user_index_changes()
+        if change_log is not None:
+            change_log.record(changes)
+    except Exception as e:
+        logger.error(f"Failed to record user index changes: {str(e)}", exc_info=True)
+
+
+def buffer_user_index_change(change):
+    """
+    Like record_user_index_changes, for bulk jobs: the change is applied to a loaded index
+    now but persisted by the next flush_user_index_changes, so a batch writes one object.
+    """
+    if user_search_index is not None:
+        user_search_index.apply(change)
+    change_log = get_user_index_changes()
+    if change_log is not None:
+        change_log.add(change)
+
+
+def flush_user_index_changes():
+    """Persist buffered user index changes; run before a bulk job checkpoints its rows as done."""
+    change_log = get_user_index_changes()
+    if change_log is not None:
+        change_log.flush()
+
+
+def get_user_search_index():
+    """
+    Return the admin user search index, loading it on first use.
+
+    The snapshot is memory-mapped from USER_INDEX_PATH (default /tmp/user-index.idx). When
+    USER_INDEX_BUCKET is set and no local snapshot exists yet, the latest snapshot is
+    downloaded from that bucket first. Changes recorded since the snapshot was rebuilt are
+    then applied from the change log, which is re-read at most once a minute.
+    """
+    global user_search_index
+    change_log = get_user_index_changes()
+    if user_search_index is None:
+        path = os.getenv('USER_INDEX_PATH', '/tmp/user-index.idx')
+        bucket = os.getenv('USER_INDEX_BUCKET')
+        rebuilt_at = None
+        if bucket and not os.path.exists(path):
+            try:
+                # Read before downloading: a snapshot replaced in between is newer, never older.
+                metadata = get_s3().head_object(Bucket=bucket, Key=USER_INDEX_KEY).get('Metadata', {})
+                rebuilt_at = float(metadata['rebuilt-at']) if 'rebuilt-at' in metadata else None
+                get_s3().download_file(bucket, USER_INDEX_KEY, path)
+            except Exception as e:
+                logger.warning(f"No user index snapshot downloaded from {bucket}: {str(e)}")
+        user_search_index = UserIndex(path)
+        if change_log is not None:
+            change_log.reset(since=rebuilt_at)
+    if change_log is not None:
+        try:
+            change_log.refresh(user_search_index)
+        except Exception as e:
+            logger.error(f"Failed to refresh the user index from its change log: {str(e)}", exc_info=True)
+    return user_search_index
+
+
+def search_users_route(query_params):
+    """
+    Search users by prefix for the admin user table.
+
+    Supported query parameters: q (prefix), field (email, first_name or last_name),
+    sort (defaults to field), order (asc or desc), cursor and limit (1-100, default 25).
+
+    :param query_params: The request's query string parameters.
+    :return: A CORS response with the matching users and the cursor for the next page.
+    """
+    try:
+        limit = int(query_params.get('limit', 25))
+        if not 1 <= limit <= 100:
+            raise ValueError("Limit must be between 1 and 100.")
+
+        users, next_cursor = get_user_search_index().search(
+            prefix=query_params.get('q', ""),
+            field=query_params.get('field', "email"),
+            sort=query_params.get('sort'),
+            descending=query_params.get('order', "asc") == "desc",
+            cursor=query_params.get('cursor'),
+            limit=limit
+        )
+        return cors_response(200, {"users": users, "next_cursor": next_cursor})
+
+    except ValueError as e:
+        return cors_response(400, {"message": str(e)})
+    except Exception as e:
+        logger.error(f"Unexpected error in search_users_route: {str(e)}", exc_info=True)
+        return cors_response(500, {"message": "An unexpected error occurred while searching users. Please try again later."})
+
+
+def rebuild_user_index_route():
+    """
+    Start rebuilding the admin user search index as an admin job (see run_user_index_rebuild),
+    since listing a large pool takes longer than API Gateway waits.
+
+    :return: A 202 CORS response with the job id to poll at GET /admin/jobs.
+    """
+    try:
+        return start_admin_job("user-index", {})
+    except Exception as e:
+        logger.error(f"Unexpected error in rebuild_user_index_route: {str(e)}", exc_info=True)
+        return cors_response(500, {"message": "An unexpected error occurred while rebuilding the user index. Please try again later."})
+
+
+def run_user_index_rebuild(job_id):
+    """
+    Rebuild the admin user search index from Cognito ListUsers.
+
+    The new snapshot replaces the local one and, when USER_INDEX_BUCKET is set, is uploaded
+    so other containers pick it up on their next cold start. Changes recorded while users
+    were being listed are applied again on top of it, and changes old enough to be in every
+    container's snapshot are trimmed from the change log.
+
+    :param job_id: The admin job id.
+    :return: {"count"}: the number of indexed users.
+    """
+    index = get_user_search_index()
+    rebuilt_at = time.time()
+    users = iter_users(lambda **kwargs: cognito_call('list_users', **kwargs), get_user_pool_id())
+    count = index.rebuild(flatten_user(user) for user in users)
+
+    bucket = os.getenv('USER_INDEX_BUCKET')
+    if bucket:
+        get_s3().upload_file(index.snapshot_path, bucket, USER_INDEX_KEY,
+                       ExtraArgs={"Metadata": {"rebuilt-at": str(rebuilt_at)}})
+    change_log = get_user_index_changes()
+    if change_log is not None:
+        change_log.trim(rebuilt_at)
+        change_log.reset(since=rebuilt_at)
+        change_log.refresh(index, force=True)
+    return {"count": count}
+
+
+# Admin jobs by type; see start_admin_job.
+ADMIN_JOB_RUNNERS = {
+    "user-export": run_user_export,
+    "user-index": run_user_index_rebuild,
+}
+
+
+# Bulk User Import
+BULK_IMPORT_MAX_WORKERS = int(os.getenv('BULK_IMPORT_MAX_WORKERS', '8'))
+BULK_IMPORT_SAFETY_MARGIN_SECONDS = float(os.getenv('BULK_IMPORT_SAFETY_MARGIN_SECONDS', '30'))
+
+def record_bulk_user(row, outcome):
+    """
+    Keep the caches and search index in line with a user created or updated in bulk.
+
+    :param row: The imported row.
+    :param outcome: "created" or "updated".
+    """
+    email = row['email'].strip()
+    if outcome == "created":
+        unknown_users.discard(email)
+    user_profiles.invalidate(email)
+    buffer_user_index_change({"email": email, "first_name": row.get('first_name') or None,
+                              "last_name": row.get('last_name') or None})
+
+
+def bulk_import_handler(event, context):
+    """
+    Lambda entry point that imports or updates users from a CSV or JSON Lines file in S3.
+
+    Each row has an email, an optional action (create, update or upsert, the default) and
+    attribute columns (first_name, last_name, phone_number, email_verified, custom:*).
+    Rows are applied on a bounded worker pool behind the Cognito rate limiter. Progress is
+    checkpointed next to the input, so when the invocation runs out of time, or rows are
+    still throttled after their retries, it returns "incomplete" and the next invocation
+    with the same event carries on where it stopped.
+    Per-row results are streamed to a JSON Lines object under bulk-users/results/.
+    Invoke it directly or through lambda_handler with "job": "bulk-import".
+
+    :param event: {"bucket": ..., "key": ..., "format": "csv" or "jsonl" (defaults to the key's extension)}.
+    :param context: The Lambda context object.
+    :return: A dict with the job status, per-status counts, checkpoint position and results key.
+    """
+    bucket, key = event['bucket'], event['key']
+    input_format = event.get('format') or ("jsonl" if key.endswith((".jsonl", ".ndjson")) else "csv")
+
+    store = S3ObjectStore(bucket, get_s3())
+    checkpoint = bulk_users.Checkpoint(store, f"bulk-users/checkpoints/{key}.json", on_save=flush_user_index_changes)
+    results_key = f"bulk-users/results/{key}/{time.strftime('%Y-%m-%dT%H-%M-%SZ', time.gmtime())}.ndjson"
+
+    deadline = None
+    if context is not None:
+        remaining = context.get_remaining_time_in_millis() / 1000
+        deadline = time.monotonic() + remaining - BULK_IMPORT_SAFETY_MARGIN_SECONDS
+
+    rows = bulk_users.read_rows(bulk_users.open_text(store.open_reader(key)), input_format)
+    results = bulk_users.process_rows(
+        rows, cognito_call, get_user_pool_id(),
+        checkpoint=checkpoint,
+        max_workers=BULK_IMPORT_MAX_WORKERS,
+        on_success=record_bulk_user,
+        deadline=deadline
+    )
+    with store.open_writer(results_key, content_type="application/x-ndjson") as out:
+        summary = bulk_users.write_results(results, out)
+    flush_user_index_changes()
+
+    # Throttled rows are left pending in the checkpoint for the next invocation.
+    stopped = deadline is not None and time.monotonic() >= deadline
+    status = "incomplete" if stopped or summary.get('throttled') else "complete"
+    logger.info(f"Bulk import of s3://{bucket}/{key} {status}: {summary}")
+    return {"status": status, "summary": summary, "checkpoint": checkpoint.watermark, "results_key": results_key}
+
+
+# User Erasure (GDPR / retention)
+ERASURE_MAX_WORKERS = int(os.getenv('ERASURE_MAX_WORKERS', '8'))
+ERASURE_SAFETY_MARGIN_SECONDS = float(os.getenv('ERASURE_SAFETY_MARGIN_SECONDS', '30'))
+ERASURE_AUDIT_PREFIX = "user-erasure/audit"
+
+def forget_erased_user(email):
+    """
+    Drop an erased user from every cache and index that may still hold them.
+
+    The index removal is also buffered for the change log, where it acts as a tombstone: other
+    containers and cold starts hide the user even though the current snapshot still holds
+    them. Flushed with the audit log (see flush_user_index_changes).
+
+    :param email: The erased user's email address.
+    """
+    user_profiles.invalidate(email)
+    unknown_users.add(email)
+    buffer_user_index_change({"email": email, "removed": True})
+
+
+def erasure_handler(event, context):
+    """
+    Lambda entry point that erases users in bulk.
+
+    Accepts either an SQS event whose messages carry {"email": ...} or {"emails": [...]},
+    or a file job {"bucket": ..., "key": ...} listing users as CSV or JSON Lines with an
+    email column. Deletions run concurrently behind the Cognito rate limiter and every
+    erasure gets an audit record (hashed email, outcome, time) in the audit bucket
+    (USER_ERASURE_AUDIT_BUCKET, defaulting to the file job's bucket).
+
+    File jobs checkpoint their progress and stop ERASURE_SAFETY_MARGIN_SECONDS before the
+    Lambda timeout, returning "incomplete" so the same event can be re-invoked to carry on;
+    rows still throttled after their retries also leave the job "incomplete".
+    SQS messages that could not be completed are returned as batchItemFailures. Through
+    lambda_handler, file jobs carry "job": "user-erasure".
+
+    :param event: An SQS event or a file job.
+    :param context: The Lambda context object.
+    :return: A summary for file jobs, or {"batchItemFailures": [...]} for SQS events.
+    """
+    deadline = None
+    if context is not None:
+        remaining = context.get_remaining_time_in_millis() / 1000
+        deadline = time.monotonic() + remaining - ERASURE_SAFETY_MARGIN_SECONDS
+
+    audit_bucket = os.getenv('USER_ERASURE_AUDIT_BUCKET') or event.get('bucket')
+    if not audit_bucket:
+        raise ValueError("USER_ERASURE_AUDIT_BUCKET is not configured.")
+    audit = user_erasure.AuditLog(
+        S3ObjectStore(audit_bucket, get_s3()),
+        ERASURE_AUDIT_PREFIX,
+        hash_key=os.getenv('USER_ERASURE_HASH_KEY'),
+        job_id=event.get('key') or getattr(context, 'aws_request_id', None)
+    )
+
+    if 'Records' in event:
+        rows, sources = user_erasure.rows_from_queue_records(event['Records'])
+        results = user_erasure.erase_users(
+            rows, cognito_call, get_user_pool_id(), audit,
+            on_erased=forget_erased_user,
+            on_flush=flush_user_index_changes,
+            max_workers=ERASURE_MAX_WORKERS,
+            deadline=deadline
+        )
+        completed = {result['row'] for result in results if result['status'] not in ("failed", "throttled")}
+        failed_messages = {sources[row_number] for row_number, _ in rows if row_number not in completed}
+        logger.info(f"Erased {audit.written} users from {len(event['Records'])} messages; {len(failed_messages)} messages failed.")
+        return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in sorted(failed_messages)]}
+
+    bucket, key = event['bucket'], event['key']
+    input_format = event.get('format') or ("jsonl" if key.endswith((".jsonl", ".ndjson")) else "csv")
+    store = S3ObjectStore(bucket, get_s3())
+    checkpoint = bulk_users.Checkpoint(store, f"user-erasure/checkpoints/{key}.json")
+    results_key = f"user-erasure/results/{key}/{time.strftime('%Y-%m-%dT%H-%M-%SZ', time.gmtime())}.ndjson"
+
+    rows = bulk_users.read_rows(bulk_users.open_text(store.open_reader(key)), input_format)
+    results = user_erasure.erase_users(
+        rows, cognito_call, get_user_pool_id(), audit,
+        on_erased=forget_erased_user,
+        on_flush=flush_user_index_changes,
+        checkpoint=checkpoint,
+        max_workers=ERASURE_MAX_WORKERS,
+        deadline=deadline
+    )
+    with store.open_writer(results_key, content_type="application/x-ndjson") as out:
+        summary = bulk_users.write_results(results, out)
+
+    stopped = deadline is not None and time.monotonic() >= deadline
+    status = "incomplete" if stopped or summary.get('throttled') else "complete"
+    logger.info(f"User erasure of s3://{bucket}/{key} {status}: {summary}")
+    return {"status": status, "summary": summary, "checkpoint": checkpoint.watermark, "results_key": results_key}
+
+
 # Contact Us
-def contact_us(first_name, email, message):
+contact_guard = None
+
+def get_contact_guard():
+    """
+    Return the guard that deduplicates and rate limits contact form submissions.
+
+    Counters live in the DynamoDB table CONTACT_GUARD_TABLE when it is set, so limits hold
+    across containers, and in process memory otherwise.
+    """
+    global contact_guard
+    if contact_guard is None:
+        table_name = os.getenv('CONTACT_GUARD_TABLE')
+        contact_guard = ContactGuard(
+            store=DynamoDBCounterStore(table_name, get_dynamodb()) if table_name else None,
+            dedup_window=int(os.getenv('CONTACT_DEDUP_WINDOW_SECONDS', '600')),
+            per_email=(int(os.getenv('CONTACT_EMAIL_LIMIT_PER_HOUR', '3')), 3600),
+            per_ip=(int(os.getenv('CONTACT_IP_LIMIT_PER_HOUR', '10')), 3600)
+        )
+    return contact_guard
+
+
+contact_queue = None
+
+def get_contact_queue():
+    """
+    Return the queue contact messages are sent through in queue mode.
+
+    This is the SQS queue at CONTACT_QUEUE_URL, or an in-process LocalQueue when no URL is
+    configured outside Lambda (local development and tests).
+
+    :raises ConfigurationError: If CONTACT_QUEUE_URL is unset in Lambda.
+    """
+    global contact_queue
+    if contact_queue is None:
+        queue_url = get_resource_setting('CONTACT_QUEUE_URL')
+        contact_queue = SQSQueue(queue_url, get_sqs()) if queue_url else LocalQueue()
+    return contact_queue
+
+
+def send_contact_email(first_name, email, message, attachment_keys=None):
+    """
+    Email a contact message to the site's recipient address via AWS SES.
+
+    Attachments are not copied into the email; it lists a signed link for each to the
+    download route under API_BASE_URL, valid for CONTACT_ATTACHMENT_LINK_SECONDS. The route
+    re-signs a short-lived S3 URL on each use, so links outlive the function's temporary
+    credentials.
+
+    :param first_name: Sender's first name.
+    :param email: Sender's email address.
+    :param message: The content of the message.
+    :param attachment_keys: Keys of attachments uploaded to CONTACT_ATTACHMENT_BUCKET.
+    """
+    if attachment_keys:
+        expires_at = time.time() + int(os.getenv('CONTACT_ATTACHMENT_LINK_SECONDS', str(7 * 24 * 3600)))
+        base_url, secret = os.environ["API_BASE_URL"], get_attachment_link_secret()
+        links = "".join(
+            f"\n- {key.rsplit('/', 1)[-1]}: {attachments.download_link(base_url, secret, key, expires_at)}"
+            for key in attachment_keys
+        )
+        message = f"{message}\n\nAttachments:{links}"
+
+    ses.send_email(
+        Source=get_sender_email(),
+        Destination={'ToAddresses': [get_recipient_email()]},
+        Message=TEMPLATES["contact-us"].message({"first_name": first_name, "email": email, "message": message})
+    )
+
+
+def contact_us(first_name, email, message, source_ip=None, attachment_keys=None):
     """
     Send a contact message via AWS SES.
 
+    With CONTACT_US_MODE=queue the message is validated and enqueued instead, and the
+    route answers 202 straight away; contact_email_worker sends it later. This keeps the
+    form's latency independent of SSM and SES.
+
+    Before either, the contact guard screens the submission: a repeat of a message already
+    accepted within the dedup window gets the same success response without being sent
+    again, and a sender email or source IP over its hourly limit gets a 429. Neither
+    touches SSM or SES.
+
     :param first_name: Sender's first name.
     :param email: Sender's email address.
     :param message: The content of the message.
+    :param source_ip: The client's IP address, if known.
+    :param attachment_keys: Keys of attachments uploaded via /contact-us/attachments.
     :return: A CORS response with an appropriate status and message.
     """
     if not all([first_name, email, message]):
         return cors_response(400, {"message": "All fields are required: name, email, and message."})
-    
+
     try:
-        ses.send_email(
-            Source=get_sender_email(),
-            Destination={'ToAddresses': [get_recipient_email()]},
-            Message={
-                'Subject': {'Data': 'Contact Us Form Submission'},
-                'Body': {
-                    'Text': {'Data': f'Name: {first_name}\nEmail: {email}\nMessage: {message}'}
-                }
-            }
-        )
+        attachment_keys = attachments.validate_attachment_keys(attachment_keys)
+    except ValueError as e:
+        return cors_response(400, {"message": str(e)})
+    if attachment_keys and not (os.getenv('CONTACT_ATTACHMENT_BUCKET') and os.getenv('API_BASE_URL')):
+        logger.error("CONTACT_ATTACHMENT_BUCKET or API_BASE_URL is not configured.")
+        return cors_response(500, {"message": "Attachments are not configured. Please contact support."})
+
+    queued = os.getenv('CONTACT_US_MODE') == "queue"
+    guard = get_contact_guard()
+    # Different attachments make a different submission.
+    decision, detail = guard.check(first_name, email, "\n".join([message, *attachment_keys]), source_ip)
+    if decision == "duplicate":
+        logger.info("Ignoring duplicate contact message")
+        if queued:
+            return cors_response(202, {"message": "Message received. It will be sent shortly."})
+        return cors_response(200, {"message": "Message sent successfully."})
+    if decision == "limited":
+        minutes = max(1, round(detail / 60))
+        return cors_response(429, {"message": f"Too many messages. Please try again in {minutes} minute{'s' if minutes != 1 else ''}."})
+
+    try:
+        if queued:
+            get_contact_queue().send({
+                "first_name": first_name,
+                "email": email,
+                "message": message,
+                "attachments": attachment_keys,
+                "received_at": int(time.time())
+            })
+            return cors_response(202, {"message": "Message received. It will be sent shortly."})
+
+        send_contact_email(first_name, email, message, attachment_keys)
         return cors_response(200, {"message": "Message sent successfully."})
     
     except Exception as e:
+        # The message was not sent, so a retry of the same content must not count as a duplicate.
+        guard.forget(detail)
+
         # Map specific SES exceptions to HTTP statuses and messages.
         error_map = {
             ses.exceptions.MessageRejected: (
@@ -679,6 +1902,288 @@ def contact_us(first_name, email, message):
         })
 
 
+def create_contact_attachment_route(filename, content_type):
+    """
+    Issue a presigned S3 POST so the browser can upload a contact form attachment directly.
+
+    The file never passes through the Lambda, so this route costs the same whatever the
+    attachment size. The returned key is then sent with the message to /contact-us. The
+    bucket is taken from CONTACT_ATTACHMENT_BUCKET and should expire objects under
+    attachments.ATTACHMENT_PREFIX with a lifecycle rule.
+
+    :param filename: The name of the file to upload.
+    :param content_type: The file's content type.
+    :return: A CORS response with the object key, the upload url and the form fields.
+    """
+    if not filename or not content_type:
+        return cors_response(400, {"message": "filename and content_type are required."})
+
+    bucket = os.environ.get("CONTACT_ATTACHMENT_BUCKET")
+    if not bucket:
+        logger.error("CONTACT_ATTACHMENT_BUCKET is not configured.")
+        return cors_response(500, {"message": "Attachments are not configured. Please contact support."})
+
+    try:
+        max_bytes = int(os.getenv('CONTACT_ATTACHMENT_MAX_BYTES', str(10 * 1024 * 1024)))
+        upload = attachments.presigned_upload(get_s3(), bucket, filename, content_type, max_bytes)
+        return cors_response(200, {**upload, "max_bytes": max_bytes})
+
+    except ValueError as e:
+        return cors_response(400, {"message": str(e)})
+    except Exception as e:
+        logger.error(f"Unexpected error in create_contact_attachment_route: {str(e)}", exc_info=True)
+        return cors_response(500, {"message": "An unexpected error occurred while preparing the upload. Please try again later."})
+
+
+# Seconds the S3 URL a download link redirects to stays valid.
+ATTACHMENT_REDIRECT_SECONDS = 300
+
+def download_contact_attachment_route(key, expires, signature):
+    """
+    Redirect a signed attachment link from a contact email to a short-lived S3 URL.
+
+    The S3 URL is signed on each request, so it never outlives the credentials that
+    signed it; the emailed link's own expiry is checked against its HMAC signature.
+
+    :param key: The attachment's object key.
+    :param expires: When the link stops working, in epoch seconds.
+    :param signature: The link's signature (see attachments.download_link).
+    :return: A 302 response to the S3 URL, or a CORS response with an error message.
+    """
+    bucket = os.environ.get("CONTACT_ATTACHMENT_BUCKET")
+    if not bucket:
+        logger.error("CONTACT_ATTACHMENT_BUCKET is not configured.")
+        return cors_response(500, {"message": "Attachments are not configured. Please contact support."})
+
+    try:
+        attachments.verify_download(get_attachment_link_secret(), key, expires, signature)
+        url = S3ObjectStore(bucket, get_s3()).url(key, ATTACHMENT_REDIRECT_SECONDS)
+        response = cors_response(302, {"message": "Redirecting to the attachment."})
+        response["headers"]["Location"] = url
+        return response
+
+    except ValueError as e:
+        return cors_response(403, {"message": str(e)})
+    except Exception as e:
+        logger.error(f"Unexpected error in download_contact_attachment_route: {str(e)}", exc_info=True)
+        return cors_response(500, {"message": "An unexpected error occurred while preparing the download. Please try again later."})
+
+
+# Email Templates
+def get_email_template_prefix() -> str:
+    """Prefix for this environment's SES template names."""
+    return f"rcw-client-backend-{get_environment()}-"
+
+
+def sync_email_templates_route():
+    """
+    Push the server's email templates to SES so they can be used with SendTemplatedEmail
+    and SendBulkTemplatedEmail.
+
+    :return: A CORS response with each template's outcome (created, updated or unchanged).
+    """
+    try:
+        outcomes = sync_templates(ses, TEMPLATES.values(), prefix=get_email_template_prefix())
+        return cors_response(200, {"message": "Email templates synced successfully", "templates": outcomes})
+
+    except Exception as e:
+        logger.error(f"Unexpected error in sync_email_templates_route: {str(e)}", exc_info=True)
+        return cors_response(500, {"message": "An unexpected error occurred while syncing email templates. Please try again later."})
+
+
+# Contact Email Worker
+CONTACT_WORKER_MAX_WORKERS = int(os.getenv('CONTACT_WORKER_MAX_WORKERS', '4'))
+CONTACT_WORKER_SAFETY_MARGIN_SECONDS = float(os.getenv('CONTACT_WORKER_SAFETY_MARGIN_SECONDS', '10'))
+ses_send_limiter = None
+
+def get_ses_send_limiter():
+    """
+    Return the token bucket that paces SES sends.
+
+    The rate is SES_MAX_SEND_RATE if set, otherwise the account's MaxSendRate from
+    GetSendQuota, looked up once per container.
+    """
+    global ses_send_limiter
+    if ses_send_limiter is None:
+        rate = float(os.getenv('SES_MAX_SEND_RATE') or ses.get_send_quota()['MaxSendRate'])
+        ses_send_limiter = TokenBucket(rate, name="SESSend")
+    return ses_send_limiter
+
+
+def deliver_contact_messages(messages):
+    """
+    Send queued contact messages concurrently, paced to the SES max send rate.
+
+    A message SES rejects outright is logged and dropped, since resending it cannot succeed.
+
+    :param messages: A list of QueueMessage objects.
+    :return: The messages that failed and should be retried.
+    """
+    if not messages:
+        return []
+    limiter = get_ses_send_limiter()
+
+    def deliver(queued):
+        limiter.acquire(max_wait=float('inf'))
+        try:
+            send_contact_email(
+                queued.body['first_name'], queued.body['email'], queued.body['message'], queued.body.get('attachments')
+            )
+            return True
+        except Exception as e:
+            if isinstance(e, ses.exceptions.MessageRejected):
+                logger.error(f"Dropping contact message {queued.message_id} rejected by SES: {str(e)}")
+                return True
+            logger.error(f"Failed to send contact message {queued.message_id}: {str(e)}", exc_info=True)
+            return False
+
+    with ThreadPoolExecutor(max_workers=min(CONTACT_WORKER_MAX_WORKERS, len(messages))) as executor:
+        delivered = list(executor.map(deliver, messages))
+    return [queued for queued, ok in zip(messages, delivered) if not ok]
+
+
+def contact_email_worker(event, context):
+    """
+    Lambda entry point that sends queued contact messages.
+
+    Triggered by the contact queue, it sends the event's batch and reports the messages
+    to retry as batchItemFailures. Invoked any other way (e.g. on a schedule), it drains
+    the contact queue 10 messages at a time until the queue is empty or the invocation
+    nears its timeout.
+
+    :param event: An SQS event, or any other event to drain the queue.
+    :param context: The Lambda context object.
+    :return: {"batchItemFailures": [...]} for SQS events, otherwise sent and failed counts.
+    """
+    if 'Records' in event:
+        messages = []
+        for record in event['Records']:
+            try:
+                messages.append(QueueMessage.from_sqs_record(record))
+            except (ValueError, KeyError):
+                logger.error(f"Dropping malformed contact message {record.get('messageId')}")
+        failed = deliver_contact_messages(messages)
+        return {"batchItemFailures": [{"itemIdentifier": queued.message_id} for queued in failed]}
+
+    deadline = None
+    if context is not None:
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - CONTACT_WORKER_SAFETY_MARGIN_SECONDS
+
+    queue = get_contact_queue()
+    sent = failed = 0
+    while deadline is None or time.monotonic() < deadline:
+        messages = queue.receive(max_messages=10)
+        if not messages:
+            break
+        retry = deliver_contact_messages(messages)
+        # Failed messages are left on the queue and become visible again after the visibility timeout.
+        queue.delete([queued for queued in messages if queued not in retry])
+        sent += len(messages) - len(retry)
+        failed += len(retry)
+
+    logger.info(f"Contact email worker sent {sent} messages; {failed} left for retry.")
+    return {"sent": sent, "failed": failed}
+
+
+# Email Suppression
+email_suppressions = None
+
+def get_email_suppressions():
+    """
+    Return the email suppression list, refreshed incrementally at most once a minute.
+
+    Suppressions are stored in EMAIL_SUPPRESSION_BUCKET, or under /tmp when no bucket is
+    configured outside Lambda (local development and tests).
+
+    :raises ConfigurationError: If EMAIL_SUPPRESSION_BUCKET is unset in Lambda, where
+        /tmp suppressions would be lost with the container.
+    """
+    global email_suppressions
+    if email_suppressions is None:
+        bucket = get_resource_setting('EMAIL_SUPPRESSION_BUCKET')
+        store = S3ObjectStore(bucket, get_s3()) if bucket else LocalObjectStore("/tmp/email-suppressions")
+        email_suppressions = SuppressionList(store)
+    email_suppressions.refresh()
+    return email_suppressions
+
+
+def ses_notification_handler(event, context):
+    """
+    Lambda entry point for SES bounce and complaint notifications delivered through SNS.
+
+    Permanent bounces and complaints are added to the suppression list, so later sends
+    skip those addresses.
+
+    :param event: The SNS event.
+    :param context: The Lambda context object.
+    :return: The number of suppressed addresses.
+    """
+    records = []
+    for record in event.get('Records', []):
+        try:
+            records.extend(parse_ses_notification(json.loads(record['Sns']['Message'])))
+        except (KeyError, ValueError):
+            logger.error(f"Ignoring malformed SES notification: {record.get('Sns', {}).get('MessageId')}")
+
+    get_email_suppressions().add(records)
+    logger.info(f"Suppressed {len(records)} addresses from {len(event.get('Records', []))} SES notifications.")
+    return {"suppressed": len(records)}
+
+
+# Bulk Mailing
+BULK_MAIL_SAFETY_MARGIN_SECONDS = float(os.getenv('BULK_MAIL_SAFETY_MARGIN_SECONDS', '30'))
+
+def bulk_mail_handler(event, context):
+    """
+    Lambda entry point that emails a template to every confirmed, verified user.
+
+    Recipients are streamed from Cognito ListUsers, suppressed addresses are dropped in the
+    same pass, and the rest are sent in SendBulkTemplatedEmail batches paced to the SES
+    max send rate (shared with contact_email_worker). Progress is checkpointed in
+    BULK_MAIL_BUCKET under bulk-mail/<campaign_id>/, so when an invocation nears its
+    timeout it returns "incomplete" and re-invoking it with the same event carries on
+    with the next recipient. A finished campaign is never sent twice. Invoke it directly or
+    through lambda_handler with "job": "bulk-mail".
+
+    :param event: {"campaign_id": ..., "template": a name in email_templates.TEMPLATES,
+        "data": shared template data, "filter": optional ListUsers filter}.
+    :param context: The Lambda context object.
+    :return: A dict with the campaign status and sent, failed and skipped counts.
+    """
+    bucket = os.getenv('BULK_MAIL_BUCKET')
+    if not bucket:
+        raise ValueError("BULK_MAIL_BUCKET is not configured.")
+    template = TEMPLATES[event['template']]
+
+    deadline = None
+    if context is not None:
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - BULK_MAIL_SAFETY_MARGIN_SECONDS
+
+    checkpoint = bulk_mailer.CampaignCheckpoint(S3ObjectStore(bucket, get_s3()), f"bulk-mail/{event['campaign_id']}/checkpoint.json")
+    pages = iter_user_pages(
+        lambda **kwargs: cognito_call('list_users', **kwargs),
+        get_user_pool_id(),
+        filter_expression=event.get('filter', bulk_mailer.CONFIRMED_USERS_FILTER),
+        pagination_token=checkpoint.state['pagination_token']
+    )
+    finished = bulk_mailer.send_campaign(
+        ses, template, get_sender_email(), pages, checkpoint, get_ses_send_limiter(),
+        default_data=event.get('data'),
+        prefix=get_email_template_prefix(),
+        deadline=deadline,
+        exclude=get_email_suppressions().is_suppressed
+    )
+
+    state = checkpoint.state
+    logger.info(f"Bulk mail {event['campaign_id']}: sent={state['sent']} failed={state['failed']} skipped={state['skipped']}")
+    return {
+        "status": "complete" if finished else "incomplete",
+        "sent": state['sent'],
+        "failed": state['failed'],
+        "skipped": state['skipped']
+    }
+
+
 # Get Paypal Access Token
 def get_paypal_access_token():
     """
@@ -1279,3 +2784,298 @@ def create_paypal_subscription_route(amount, custom_id):
             "message": "An unexpected error occurred while processing your request. Please try again later.",
             "errorType": "InternalError"
         })
+
+
+# PayPal Webhook
+# PayPal signing certificates, cached per warm container so verification needs no network call.
+paypal_certs = CertCache(ttl=float(os.getenv('PAYPAL_CERT_CACHE_TTL_SECONDS', str(24 * 3600))))
+webhook_events = None
+
+def get_webhook_events():
+    """
+    Return the idempotency store of processed PayPal webhook event ids.
+
+    Claims are recorded in the DynamoDB table WEBHOOK_EVENTS_TABLE, or in process memory
+    when it is not set outside Lambda (local development and tests).
+
+    :raises ConfigurationError: If WEBHOOK_EVENTS_TABLE is unset in Lambda.
+    """
+    global webhook_events
+    if webhook_events is None:
+        table_name = get_resource_setting('WEBHOOK_EVENTS_TABLE')
+        webhook_events = IdempotencyStore(
+            DynamoDBIdempotencyTable(table_name, get_dynamodb()) if table_name else LocalIdempotencyTable(),
+            prefix="paypal-webhook#",
+            ttl=int(os.getenv('WEBHOOK_EVENTS_TTL_SECONDS', str(30 * 24 * 3600)))
+        )
+    return webhook_events
+
+
+webhook_queue = None
+
+def get_webhook_queue():
+    """
+    Return the queue verified PayPal webhook events are handed to paypal_webhook_worker through.
+
+    This is the SQS queue at WEBHOOK_QUEUE_URL, or an in-process LocalQueue when no URL is
+    configured outside Lambda (local development and tests).
+
+    :raises ConfigurationError: If WEBHOOK_QUEUE_URL is unset in Lambda.
+    """
+    global webhook_queue
+    if webhook_queue is None:
+        queue_url = get_resource_setting('WEBHOOK_QUEUE_URL')
+        webhook_queue = SQSQueue(queue_url, get_sqs()) if queue_url else LocalQueue()
+    return webhook_queue
+
+
+def paypal_webhook_route(headers, body):
+    """
+    Receive a PayPal webhook event, verifying its signature locally.
+
+    The PAYPAL-TRANSMISSION-SIG header is checked against the CRC32 of the raw body with
+    the certificate from PAYPAL-CERT-URL (see paypal_webhooks.verify_webhook) instead of
+    PayPal's verify-webhook-signature API, so a warm container verifies without a round trip.
+
+    PayPal redelivers events it thinks failed, so each event id is claimed in the webhook
+    idempotency store before any further work; a replay is acknowledged with a 200 and
+    nothing else.
+
+    A new event is only enqueued for paypal_webhook_worker, which does the downstream
+    writes, so the response time does not depend on Google's API. If it cannot be enqueued
+    (or the queue or idempotency table is not configured) the claim is released and a 500
+    makes PayPal redeliver it.
+
+    :param headers: The request headers.
+    :param body: The raw request body as bytes.
+    :return: A CORS response; 400 if the event could not be verified.
+    """
+    event_id = None
+    try:
+        verify_webhook(headers, body, get_paypal_webhook_id(), paypal_certs)
+        webhook_event = json.loads(body)
+        if not webhook_event.get('id'):
+            raise ValueError("The webhook event has no id.")
+        # Resolve both before claiming, so missing configuration cannot leave a claim behind.
+        events, queue = get_webhook_events(), get_webhook_queue()
+        if not events.claim(webhook_event['id']):
+            logger.info(f"Ignoring replayed PayPal webhook {webhook_event['id']}")
+            return cors_response(200, {"message": "Webhook already received.", "event_id": webhook_event['id']})
+        event_id = webhook_event['id']
+
+        queue.send({"event": webhook_event})
+        logger.info(f"Queued PayPal webhook {event_id} ({webhook_event.get('event_type')})")
+        return cors_response(200, {"message": "Webhook received.", "event_id": event_id})
+
+    except Exception as e:
+        if event_id is not None:
+            get_webhook_events().release(event_id)
+
+        # Map specific exceptions to their corresponding HTTP status, message, and error type.
+        error_map = {
+            WebhookVerificationError: (400, "The webhook could not be verified.", "VerificationError"),
+            ValueError: (400, "The webhook body is not a valid event.", "ValidationError"),
+            requests.exceptions.RequestException: (
+                503, "The PayPal signing certificate could not be downloaded. Please retry.", "CertificateError"
+            )
+        }
+
+        for exc_type, (status, msg, error_type) in error_map.items():
+            if isinstance(e, exc_type):
+                logger.error(f"{exc_type.__name__} in paypal_webhook_route: {e}")
+                return cors_response(status, {"message": msg, "errorType": error_type})
+
+        logger.error(f"Unexpected error in paypal_webhook_route: {e}", exc_info=True)
+        return cors_response(500, {
+            "message": "An unexpected error occurred while processing the webhook.",
+            "errorType": "InternalError"
+        })
+
+
+# Donations Sheet
+WEBHOOK_WORKER_SAFETY_MARGIN_SECONDS = float(os.getenv('WEBHOOK_WORKER_SAFETY_MARGIN_SECONDS', '10'))
+sheets_client = None
+sheets_sink = None
+ledger_writer = None
+
+def get_ledger_writer():
+    """
+    Return the writer of the donation ledger in LEDGER_BUCKET (under LEDGER_PREFIX), which Athena queries.
+
+    Returns None when LEDGER_BUCKET is not set, which turns the ledger off.
+    """
+    global ledger_writer
+    if ledger_writer is None and os.getenv('LEDGER_BUCKET'):
+        ledger_writer = LedgerWriter(
+            S3ObjectStore(os.environ['LEDGER_BUCKET'], get_s3()),
+            prefix=os.getenv('LEDGER_PREFIX', "ledger/donations/")
+        )
+    return ledger_writer
+
+
+def record_in_ledger(messages):
+    """Write the webhook events of a batch of queue messages to the donation ledger, as one micro-batch."""
+    writer = get_ledger_writer()
+    if writer is not None:
+        keys = writer.write([message.body['event'] for message in messages])
+        logger.info(f"Wrote {len(messages)} webhook events to the donation ledger in {len(keys)} objects.")
+
+
+def get_sheets_client():
+    """Return the Google Sheets client, authenticated with the service account key stored in SSM."""
+    global sheets_client
+    if sheets_client is None:
+        parameter_name = os.getenv('SERVICE_ACCOUNT_PARAMETER_NAME', "rcw-paypal-processor-gcp-service-account")
+        sheets_client = GoogleSheetsClient(json.loads(get_ssm_parameter(parameter_name)))
+    return sheets_client
+
+
+def get_sheets_sink():
+    """
+    Return the sink that appends completed sales from queued webhook events to the SPREADSHEET_ID sheet.
+
+    It reads the webhook queue and is paced to SHEETS_WRITES_PER_MINUTE append calls.
+    """
+    global sheets_sink
+    if sheets_sink is None:
+        sheet_range = os.getenv('SHEET_RANGE', "Sheet1!A:E")
+        sheets_sink = SheetsSink(
+            get_webhook_queue(),
+            lambda rows: get_sheets_client().append(os.environ["SPREADSHEET_ID"], sheet_range, rows),
+            row_for=lambda body: sale_row(body['event']),
+            limiter=AdaptiveTokenBucket(float(os.getenv('SHEETS_WRITES_PER_MINUTE', '60')) / 60, name="SheetsWrite"),
+            max_batch_rows=int(os.getenv('SHEETS_MAX_BATCH_ROWS', '500')),
+            on_batch=record_in_ledger
+        )
+    return sheets_sink
+
+
+def paypal_webhook_worker(event, context):
+    """
+    Lambda entry point that does the downstream work for queued PayPal webhook events.
+
+    Triggered by the webhook queue, it writes the event's batch to the donation ledger (when
+    LEDGER_BUCKET is set), then appends its completed sales to the donations sheet (one
+    values.append call per SHEETS_MAX_BATCH_ROWS rows) and reports the messages that were
+    not written as batchItemFailures, so SQS retries only those.
+    Invoked any other way (e.g. on a schedule), it drains the webhook queue the same way
+    until the queue is empty or the invocation nears its timeout.
+
+    :param event: An SQS event, or any other event to drain the queue.
+    :param context: The Lambda context object.
+    :return: {"batchItemFailures": [...]} for SQS events, otherwise {"status", "processed", "calls"}.
+    """
+    sink = get_sheets_sink()
+    if 'Records' in event:
+        messages = []
+        for record in event['Records']:
+            try:
+                message = QueueMessage.from_sqs_record(record)
+                if not isinstance(message.body, dict) or not isinstance(message.body.get('event'), dict):
+                    raise ValueError("The message has no webhook event.")
+                messages.append(message)
+            except (ValueError, KeyError):
+                logger.error(f"Dropping malformed webhook message {record.get('messageId')}")
+        try:
+            sink.write(messages)
+            failed = []
+        except PartialWriteError as e:
+            logger.error(f"Failed to append donation rows: {str(e)}", exc_info=True)
+            failed = e.failed
+        return {"batchItemFailures": [{"itemIdentifier": message.message_id} for message in failed]}
+
+    deadline = None
+    if context is not None:
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - WEBHOOK_WORKER_SAFETY_MARGIN_SECONDS
+
+    calls_before = sink.calls
+    try:
+        processed = sink.flush(deadline)
+        status = "complete"
+    except PartialWriteError as e:
+        logger.error(f"Failed to append donation rows: {str(e)}", exc_info=True)
+        processed, status = None, "failed"
+
+    logger.info(f"PayPal webhook worker {status}: {processed} events in {sink.calls - calls_before} append calls.")
+    return {"status": status, "processed": processed, "calls": sink.calls - calls_before}
+
+
+# Compaction
+def compaction_handler(event, context):
+    """
+    Lambda entry point that compacts yesterday's ledger and audit log partitions.
+
+    Run daily on a schedule, it merges the small objects the webhook worker wrote to the
+    donation ledger (LEDGER_BUCKET) and the erasure audit log (USER_ERASURE_AUDIT_BUCKET)
+    into a few large ones, so Athena opens fewer, better-compressed files. It also merges
+    the email suppression segments (EMAIL_SUPPRESSION_BUCKET) into their snapshot, so cold
+    starts read one object plus a day's segments. Stores that are not configured are skipped.
+
+    :param event: The scheduled event; an optional "dates" list of YYYY-MM-DD overrides yesterday.
+    :param context: The Lambda context object.
+    :return: {"partitions": [...], "suppression_segments": n} with the statistics of each
+        compacted partition and the number of suppression segments merged.
+    """
+    dates = event.get('dates') or [compaction.previous_day()]
+    max_rows_per_file = int(os.getenv('COMPACTION_MAX_ROWS_PER_FILE', '1000000'))
+    targets = []
+    if os.getenv('LEDGER_BUCKET'):
+        targets.append((
+            compaction.ledger_compactor(S3ObjectStore(os.environ['LEDGER_BUCKET'], get_s3()), max_rows_per_file=max_rows_per_file),
+            os.getenv('LEDGER_PREFIX', "ledger/donations/")
+        ))
+    if os.getenv('USER_ERASURE_AUDIT_BUCKET'):
+        targets.append((
+            compaction.log_compactor(S3ObjectStore(os.environ['USER_ERASURE_AUDIT_BUCKET'], get_s3()), max_rows_per_file=max_rows_per_file),
+            ERASURE_AUDIT_PREFIX
+        ))
+
+    results = []
+    for compactor, prefix in targets:
+        for date in dates:
+            stats = compactor.compact(compaction.partition_for(prefix, date))
+            logger.info(f"Compacted {stats['partition']}: {stats['sources']} objects into {stats['outputs']}, "
+                        f"{stats['rows_in'] - stats['rows_out']} duplicate rows dropped.")
+            results.append(stats)
+
+    suppression_segments = 0
+    if os.getenv('EMAIL_SUPPRESSION_BUCKET'):
+        suppression_segments = get_email_suppressions().compact()
+        logger.info(f"Merged {suppression_segments} email suppression segments into the snapshot.")
+    return {"partitions": results, "suppression_segments": suppression_segments}
+
+
+# Event Routing
+EVENT_ROUTER_MAX_WORKERS = int(os.getenv('EVENT_ROUTER_MAX_WORKERS', '8'))
+
+def resource_name(suffix):
+    """Default name of this environment's queues, topics and schedule rules."""
+    return f"rcw-client-backend-{get_environment()}-{suffix}"
+
+
+def queue_name(url_variable, suffix):
+    """Name of the queue whose URL is in url_variable, or the default name for suffix."""
+    url = os.getenv(url_variable)
+    return url.rstrip("/").rsplit("/", 1)[-1] if url else resource_name(suffix)
+
+
+def record_dispatch(kind, records, failures):
+    """Publish how many records each background event carried and how many failed."""
+    emit_metric({"EventType": kind}, Records=records, Failures=failures)
+
+
+# Background workloads run from the same deployment as the API. lambda_handler sends every
+# non-HTTP event here, routed by the queue, topic or schedule rule that produced it.
+event_router = EventRouter(max_workers=EVENT_ROUTER_MAX_WORKERS, on_dispatch=record_dispatch)
+event_router.on_queue(queue_name('CONTACT_QUEUE_URL', "contact"), batch_handler=contact_email_worker)
+event_router.on_queue(queue_name('WEBHOOK_QUEUE_URL', "paypal-webhooks"), batch_handler=paypal_webhook_worker)
+event_router.on_queue(queue_name('ERASURE_QUEUE_URL', "user-erasure"), batch_handler=erasure_handler)
+event_router.on_queue(queue_name('ADMIN_JOB_QUEUE_URL', "admin-jobs"), batch_handler=admin_job_worker)
+event_router.on_topic(os.getenv('SES_NOTIFICATION_TOPIC') or resource_name("ses-notifications"), batch_handler=ses_notification_handler)
+event_router.on_schedule(resource_name("contact-email-worker"), contact_email_worker)
+event_router.on_schedule(resource_name("paypal-webhook-worker"), paypal_webhook_worker)
+event_router.on_schedule(resource_name("compaction"), compaction_handler)
+event_router.on_job("bulk-import", bulk_import_handler)
+event_router.on_job("user-erasure", erasure_handler)
+event_router.on_job("bulk-mail", bulk_mail_handler)
+event_router.on_cognito_trigger("PreSignUp_", pre_sign_up_handler)
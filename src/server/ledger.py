@@ -0,0 +1,225 @@
+import csv
+import gzip
+import io
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+
+LEDGER_PREFIX = "ledger/donations/"
+
+# One row per verified webhook event, in this column order.
+LEDGER_COLUMNS = ("event_id", "event_type", "resource_id", "amount", "currency", "custom", "create_time")
+
+# Parquet and spooled temporary files stay in memory up to this size, then move to /tmp.
+SPOOL_BYTES = 8 * 1024 * 1024
+
+_DATE = re.compile(r"^(\d{4}-\d{2}-\d{2})")
+
+
+def ledger_row(webhook_event):
+    """Return the LEDGER_COLUMNS row for a verified PayPal webhook event."""
+    resource = webhook_event.get('resource') or {}
+    amount = resource.get('amount') or {}
+    return (
+        webhook_event.get('id'),
+        webhook_event.get('event_type'),
+        resource.get('id'),
+        amount.get('total') or amount.get('value'),
+        amount.get('currency') or amount.get('currency_code'),
+        resource.get('custom') or resource.get('custom_id'),
+        resource.get('create_time') or webhook_event.get('create_time'),
+    )
+
+
+def partition_date(row, now):
+    """The dt= partition of a row: the date of its create_time, or of now if it has none."""
+    match = _DATE.match(row[LEDGER_COLUMNS.index("create_time")] or "")
+    if match:
+        return match.group(1)
+    return datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%d")
+
+
+def partition_prefix(prefix, date):
+    return f"{prefix}dt={date}/"
+
+
+class _CsvGzipWriter:
+    def __init__(self, out):
+        self._gzip = gzip.GzipFile(fileobj=out, mode='wb')
+        self.write_rows([LEDGER_COLUMNS])
+
+    def write_rows(self, rows):
+        text = io.StringIO()
+        csv.writer(text).writerows(["" if value is None else value for value in row] for row in rows)
+        self._gzip.write(text.getvalue().encode("utf-8"))
+
+    def close(self):
+        self._gzip.close()
+
+
+class CsvGzipFormat:
+    """
+    Gzipped CSV with a header row; the fallback when pyarrow is not installed.
+
+    Every value is text and a missing value is an empty string. Athena reads it with the
+    OpenCSVSerde and skip.header.line.count = 1.
+    """
+
+    name = "csv.gz"
+    extension = ".csv.gz"
+    content_type = "application/gzip"
+
+    def open_writer(self, out):
+        """Return a writer with write_rows(rows) and close() that streams into the file-like out."""
+        return _CsvGzipWriter(out)
+
+    def read_batches(self, reader, batch_size=10000):
+        """Yield lists of at most batch_size rows from a file-like reader, without reading it all at once."""
+        with gzip.GzipFile(fileobj=reader, mode='rb') as unzipped:
+            lines = csv.reader(io.TextIOWrapper(unzipped, encoding="utf-8", newline=""))
+            next(lines, None)
+            batch = []
+            for line in lines:
+                batch.append(tuple(value or None for value in line))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+
+def _import_pyarrow():
+    """Import pyarrow on first use, or return None if it is not installed; it is slow to import."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+class _ParquetWriter:
+    def __init__(self, out, schema, pyarrow):
+        self._out = out
+        self._schema = schema
+        self._pyarrow = pyarrow
+        # ParquetWriter needs a seekable file; spool it and copy it to out on close.
+        self._spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        self._writer = pyarrow.parquet.ParquetWriter(self._spool, schema, compression="snappy")
+
+    def write_rows(self, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(LEDGER_COLUMNS)
+        arrays = [self._pyarrow.array([_decimal(value) for value in column] if name == "amount" else list(column),
+                                      type=self._schema.field(name).type)
+                  for name, column in zip(LEDGER_COLUMNS, columns)]
+        self._writer.write_table(self._pyarrow.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+        self._spool.seek(0)
+        shutil.copyfileobj(self._spool, self._out)
+        self._spool.close()
+
+
+def _decimal(value):
+    if value is None or isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(value).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        return None
+
+
+class ParquetFormat:
+    """Snappy-compressed Parquet; amount is DECIMAL(18, 2) and the other columns are strings."""
+
+    name = "parquet"
+    extension = ".parquet"
+    content_type = "application/vnd.apache.parquet"
+
+    def __init__(self):
+        pyarrow = self._pyarrow = _import_pyarrow()
+        if pyarrow is None:
+            raise RuntimeError("Parquet output requires pyarrow.")
+        self.schema = pyarrow.schema([
+            (name, pyarrow.decimal128(18, 2) if name == "amount" else pyarrow.string()) for name in LEDGER_COLUMNS
+        ])
+
+    def open_writer(self, out):
+        """Return a writer with write_rows(rows) and close() that writes a Parquet file into out."""
+        return _ParquetWriter(out, self.schema, self._pyarrow)
+
+    def read_batches(self, reader, batch_size=10000):
+        """Yield lists of at most batch_size rows, one row group batch at a time."""
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+            shutil.copyfileobj(reader, spool)
+            spool.seek(0)
+            for record_batch in self._pyarrow.parquet.ParquetFile(spool).iter_batches(batch_size=batch_size):
+                columns = [record_batch.column(name).to_pylist() for name in LEDGER_COLUMNS]
+                yield list(zip(*columns))
+
+
+def default_format():
+    """Parquet when pyarrow is installed, otherwise gzipped CSV."""
+    return ParquetFormat() if _import_pyarrow() is not None else CsvGzipFormat()
+
+
+def format_for_key(key):
+    """The format of a ledger object, from its extension."""
+    return ParquetFormat() if key.endswith(ParquetFormat.extension) else CsvGzipFormat()
+
+
+class LedgerWriter:
+    """
+    Writes verified webhook events to a columnar ledger in object storage, for Athena.
+
+    Each write() is one micro-batch (a queue batch of up to hundreds of events): its rows
+    go to one object per dt=YYYY-MM-DD partition, split every max_rows_per_file rows, so
+    Athena prunes by date and reads a few compressed files rather than one per event.
+    Events are written at least once; event_id identifies redelivered duplicates, which
+    compaction removes.
+
+    :param store: An object store (S3ObjectStore or LocalObjectStore).
+    :param prefix: The ledger's key prefix, i.e. the Athena table location.
+    :param fmt: A ParquetFormat or CsvGzipFormat; defaults to default_format().
+    :param max_rows_per_file: The most rows in one object.
+    """
+
+    def __init__(self, store, prefix=LEDGER_PREFIX, fmt=None, max_rows_per_file=100000, clock=time.time):
+        self.store = store
+        self.prefix = prefix
+        self.format = fmt or default_format()
+        self.max_rows_per_file = max_rows_per_file
+        self._clock = clock
+
+    def object_key(self, date):
+        stamp = datetime.fromtimestamp(self._clock(), timezone.utc).strftime("%Y%m%dT%H%M%S")
+        return f"{partition_prefix(self.prefix, date)}part-{stamp}-{uuid.uuid4().hex[:12]}{self.format.extension}"
+
+    def write(self, webhook_events):
+        """
+        Write a batch of webhook events.
+
+        :return: The keys of the objects written.
+        """
+        now = self._clock()
+        partitions = {}
+        for webhook_event in webhook_events:
+            row = ledger_row(webhook_event)
+            partitions.setdefault(partition_date(row, now), []).append(row)
+
+        keys = []
+        for date, rows in sorted(partitions.items()):
+            for start in range(0, len(rows), self.max_rows_per_file):
+                key = self.object_key(date)
+                with self.store.open_writer(key, content_type=self.format.content_type) as out:
+                    writer = self.format.open_writer(out)
+                    writer.write_rows(rows[start:start + self.max_rows_per_file])
+                    writer.close()
+                keys.append(key)
+        return keys
@@ -0,0 +1,34 @@
+import json
+import os
+import time
+
+
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', "RCW/Server")
+
+
+def emit_metric(dimensions, units=None, namespace=None, **values):
+    """
+    Publish metrics by writing a CloudWatch Embedded Metric Format line to stdout.
+
+    Lambda ships stdout to CloudWatch Logs, which turns the line into metrics without any
+    API call, so this is cheap enough to use on the request path.
+
+    :param dimensions: A dict of dimension names to values, e.g. {"Route": "/user"}.
+    :param units: An optional dict of metric name to unit; metrics default to "Count".
+    :param namespace: The CloudWatch namespace; defaults to METRICS_NAMESPACE.
+    :param values: The metric values by name.
+    """
+    units = units or {}
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace or METRICS_NAMESPACE,
+                "Dimensions": [list(dimensions)],
+                "Metrics": [{"Name": name, "Unit": units.get(name, "Count")} for name in values],
+            }],
+        },
+        **dimensions,
+        **values,
+    }
+    print(json.dumps(record), flush=True)
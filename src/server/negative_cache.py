@@ -0,0 +1,149 @@
+import hashlib
+import math
+import threading
+import time
+from array import array
+
+
+class NegativeCacheHit(Exception):
+    """Raised when a lookup is answered from the negative cache instead of the backing service."""
+
+
+class CountingBloomFilter:
+    """
+    A Bloom filter with one byte-sized counter per slot, so keys can be removed again.
+
+    Counters saturate at 255; a saturated counter is never decremented, which keeps the
+    filter free of false negatives at the cost of a slightly higher false-positive rate.
+    """
+
+    MAX_COUNT = 255
+
+    def __init__(self, size, hash_count):
+        self.size = size
+        self.hash_count = hash_count
+        self.counters = bytearray(size)
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            if self.counters[position] < self.MAX_COUNT:
+                self.counters[position] += 1
+
+    def remove(self, key):
+        """Remove a key previously added. Removing a key that was never added corrupts the filter."""
+        positions = self._positions(key)
+        if not all(self.counters[position] for position in positions):
+            return
+        for position in positions:
+            if self.counters[position] < self.MAX_COUNT:
+                self.counters[position] -= 1
+
+    def clear(self):
+        self.counters = bytearray(self.size)
+
+    def __contains__(self, key):
+        return all(self.counters[position] for position in self._positions(key))
+
+
+class NegativeCache:
+    """
+    A short-TTL set of keys known not to exist, with a fixed memory budget.
+
+    Keys are stored in a ring of counting Bloom filters, one per TTL slice. Keys are added
+    to the current slice and the oldest slice is cleared as time moves on, so an entry
+    lives between ttl * (slices - 1) / slices and ttl seconds. A false positive reports an
+    existing key as missing, so each slice takes at most memory_bytes / slices / 10 keys,
+    which keeps the error rate near 1% with 7 hashes; further keys in the same slice are
+    not cached. Each slice also keeps a 4-byte fingerprint per key (up to 40% on top of
+    memory_bytes), so discard() only removes keys that were really added.
+    """
+
+    def __init__(self, ttl=60.0, memory_bytes=64 * 1024, slices=4, hash_count=7, clock=time.monotonic):
+        self.slice_duration = ttl / slices
+        self._clock = clock
+        size = max(memory_bytes // slices, 1)
+        self.slice_capacity = max(size // 10, 1)
+        self._filters = [CountingBloomFilter(size, hash_count) for _ in range(slices)]
+        self._fingerprints = [array('I') for _ in range(slices)]
+        self._epochs = [None] * slices
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(key):
+        return key.strip().lower()
+
+    @staticmethod
+    def _fingerprint(key):
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=4, person=b"fingerprint").digest(), 'little')
+
+    def _clear(self, index):
+        self._filters[index].clear()
+        self._fingerprints[index] = array('I')
+
+    def _live_slots(self):
+        """Return the slots still inside the TTL window, clearing expired ones (newest first)."""
+        epoch = int(self._clock() // self.slice_duration)
+        slices = len(self._filters)
+        live = []
+        for age in range(slices):
+            index = (epoch - age) % slices
+            if self._epochs[index] != epoch - age:
+                # The slot belongs to an expired epoch (or has never been used).
+                if age == 0:
+                    self._clear(index)
+                    self._epochs[index] = epoch
+                    live.append(index)
+                continue
+            live.append(index)
+        return live
+
+    def add(self, key):
+        key = self._normalize(key)
+        with self._lock:
+            live = self._live_slots()
+            if any(key in self._filters[index] for index in live):
+                return
+            current = live[0]
+            # A full slice would push the false-positive rate up; skip caching until the next one.
+            if len(self._fingerprints[current]) >= self.slice_capacity:
+                return
+            self._filters[current].add(key)
+            self._fingerprints[current].append(self._fingerprint(key))
+
+    def discard(self, key):
+        """Forget a key, e.g. once the user it refers to has signed up."""
+        key = self._normalize(key)
+        fingerprint = self._fingerprint(key)
+        with self._lock:
+            for index in self._live_slots():
+                if key not in self._filters[index]:
+                    continue
+                fingerprints = self._fingerprints[index]
+                if fingerprint in fingerprints:
+                    fingerprints.remove(fingerprint)
+                    self._filters[index].remove(key)
+                if key in self._filters[index]:
+                    # A false positive: removing a key that was never added would corrupt the
+                    # counters, so forget the whole slice instead. It is only a cache.
+                    self._clear(index)
+
+    def __contains__(self, key):
+        if not key:
+            return False
+        key = self._normalize(key)
+        with self._lock:
+            return any(key in self._filters[index] for index in self._live_slots())
+
+    @staticmethod
+    def estimated_error_rate(memory_bytes, slices, hash_count, keys_per_slice):
+        """Approximate false-positive rate for a budget, to help size NEGATIVE_CACHE_BYTES."""
+        size = memory_bytes // slices
+        per_slice = (1 - math.exp(-hash_count * keys_per_slice / size)) ** hash_count
+        return 1 - (1 - per_slice) ** slices
@@ -0,0 +1,198 @@
+import os
+import tempfile
+
+
+class S3MultipartWriter:
+    """
+    A file-like writer that streams to S3 in multipart-upload parts.
+
+    At most one part is held in memory. Small objects (a single part) are sent with one
+    put_object call; a failed write aborts the multipart upload so no parts are left behind.
+    """
+
+    # S3 rejects multipart parts smaller than 5 MiB (except the last one).
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(self, s3_client, bucket, key, part_size=8 * 1024 * 1024, content_type=None):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.content_type = content_type
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+
+    def _extra_args(self):
+        return {"ContentType": self.content_type} if self.content_type else {}
+
+    def _upload_part(self, data):
+        if self._upload_id is None:
+            response = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self._extra_args())
+            self._upload_id = response['UploadId']
+        part_number = len(self._parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=part_number, Body=bytes(data)
+        )
+        self._parts.append({"ETag": response['ETag'], "PartNumber": part_number})
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def close(self):
+        if self._upload_id is None:
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self._extra_args())
+        else:
+            if self._buffer:
+                self._upload_part(self._buffer)
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={"Parts": self._parts}
+            )
+        self._buffer = bytearray()
+
+    def abort(self):
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class S3ObjectStore:
+    """Object storage backed by an S3 (or S3-compatible) bucket."""
+
+    def __init__(self, bucket, s3_client, part_size=8 * 1024 * 1024):
+        self.bucket = bucket
+        self.s3 = s3_client
+        self.part_size = max(part_size, S3MultipartWriter.MIN_PART_SIZE)
+
+    def open_writer(self, key, content_type=None):
+        return S3MultipartWriter(self.s3, self.bucket, key, self.part_size, content_type)
+
+    def open_reader(self, key):
+        return self.s3.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def put(self, key, data, content_type=None):
+        extra = {"ContentType": content_type} if content_type else {}
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=data, **extra)
+
+    def get(self, key):
+        return self.open_reader(key).read()
+
+    def exists(self, key):
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self.s3.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def list(self, prefix="", start_after=None):
+        paginator = self.s3.get_paginator('list_objects_v2')
+        extra = {"StartAfter": start_after} if start_after else {}
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, **extra):
+            for item in page.get('Contents', []):
+                yield item['Key']
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=key)
+
+    def url(self, key, expires_in=3600):
+        return self.s3.generate_presigned_url(
+            'get_object', Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=expires_in
+        )
+
+
+class _LocalWriter:
+    """Writes to a temporary file and renames it into place on close, so readers never see partial objects."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        self._file = os.fdopen(fd, 'wb')
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self._file.write(data)
+
+    def close(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class LocalObjectStore:
+    """A local-filesystem stand-in for S3ObjectStore, used for tests and local runs."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Key escapes the store root: {key}")
+        return path
+
+    def open_writer(self, key, content_type=None):
+        return _LocalWriter(self._path(key))
+
+    def open_reader(self, key):
+        return open(self._path(key), 'rb')
+
+    def put(self, key, data, content_type=None):
+        with self.open_writer(key) as out:
+            out.write(data)
+
+    def get(self, key):
+        with self.open_reader(key) as f:
+            return f.read()
+
+    def exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def list(self, prefix="", start_after=None):
+        keys = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/")
+                if key.startswith(prefix) and (start_after is None or key > start_after):
+                    keys.append(key)
+        return iter(sorted(keys))
+
+    def delete(self, key):
+        os.remove(self._path(key))
+
+    def url(self, key, expires_in=3600):
+        return "file://" + self._path(key)
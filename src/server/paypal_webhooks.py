@@ -0,0 +1,214 @@
+import base64
+import threading
+import time
+import warnings
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import requests
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.x509.oid import NameOID
+
+
+# Signing certificates are only fetched from PayPal's API hosts, and the certificate served
+# by each must be issued to that environment's message verification name.
+PAYPAL_CERT_HOSTS = {
+    "api.paypal.com": "messageverificationcerts.paypal.com",
+    "api.sandbox.paypal.com": "messageverificationcerts.sandbox.paypal.com",
+}
+PAYPAL_CERT_PATH_PREFIX = "/v1/notifications/certs/"
+
+# PayPal's message verification certificates chain to a DigiCert root.
+PAYPAL_ROOT_ORGANIZATION = "DigiCert Inc"
+
+SUPPORTED_AUTH_ALGOS = {"SHA256withRSA": hashes.SHA256}
+
+
+class WebhookVerificationError(Exception):
+    """A webhook's signature or signing certificate could not be verified."""
+
+
+def _header(headers, name):
+    # API Gateway passes headers with the client's casing.
+    for key, value in (headers or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+def expected_message(transmission_id, transmission_time, webhook_id, body):
+    """
+    Build the string PayPal signs for a webhook delivery.
+
+    :param body: The raw request body as bytes; its CRC32 is signed as an unsigned decimal.
+    """
+    return f"{transmission_id}|{transmission_time}|{webhook_id}|{zlib.crc32(body) & 0xffffffff}".encode('utf-8')
+
+
+_default_roots = None
+
+def paypal_trusted_roots():
+    """
+    The root certificates PayPal signing chains may end at: the DigiCert roots of the
+    certifi bundle requests ships with, loaded once.
+    """
+    global _default_roots
+    if _default_roots is None:
+        import certifi
+        with open(certifi.where(), "rb") as bundle, warnings.catch_warnings():
+            # Some unrelated roots in the bundle have non-positive serial numbers.
+            warnings.simplefilter("ignore")
+            roots = x509.load_pem_x509_certificates(bundle.read())
+        _default_roots = [root for root in roots
+                          if any(attr.value == PAYPAL_ROOT_ORGANIZATION for attr in root.subject.get_attributes_for_oid(NameOID.ORGANIZATION_NAME))]
+    return _default_roots
+
+
+def cert_names(cert):
+    """The DNS names a certificate is issued to: its subject alternative names, or else its common names."""
+    try:
+        return cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value.get_values_for_type(x509.DNSName)
+    except x509.ExtensionNotFound:
+        return [attr.value for attr in cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)]
+
+
+def _issued_by_trusted_root(cert, trusted_roots):
+    for root in trusted_roots:
+        if cert == root:
+            return True
+        if cert.issuer == root.subject:
+            try:
+                cert.verify_directly_issued_by(root)
+                return True
+            except (ValueError, TypeError, InvalidSignature):
+                continue
+    return False
+
+
+def load_cert_chain(pem, now=None, expected_name=None, trusted_roots=None):
+    """
+    Parse and check a PEM certificate chain as served at PAYPAL-CERT-URL.
+
+    The first certificate is the signing certificate, and must be issued to expected_name.
+    Every certificate must be within its validity period, each must be issued by the next
+    one in the chain, and the last must be one of trusted_roots or issued by one of them.
+
+    :param pem: The PEM bytes.
+    :param now: The current time as a timezone-aware datetime (defaults to now).
+    :param expected_name: The DNS name the signing certificate must be issued to.
+    :param trusted_roots: The root certificates to accept (defaults to paypal_trusted_roots()).
+    :return: The signing certificate.
+    :raises WebhookVerificationError: If the chain is empty, expired, broken, untrusted or
+        issued to another name.
+    """
+    try:
+        chain = x509.load_pem_x509_certificates(pem)
+    except ValueError as e:
+        raise WebhookVerificationError(f"Unreadable certificate: {e}")
+
+    now = now or datetime.now(timezone.utc)
+    for cert in chain:
+        if not cert.not_valid_before_utc <= now <= cert.not_valid_after_utc:
+            raise WebhookVerificationError(f"Certificate {cert.subject.rfc4514_string()} is not currently valid")
+    for cert, issuer in zip(chain, chain[1:]):
+        try:
+            cert.verify_directly_issued_by(issuer)
+        except (ValueError, TypeError, InvalidSignature):
+            raise WebhookVerificationError(f"Certificate {cert.subject.rfc4514_string()} is not issued by the next in the chain")
+    if not _issued_by_trusted_root(chain[-1], paypal_trusted_roots() if trusted_roots is None else trusted_roots):
+        raise WebhookVerificationError(f"Certificate {chain[-1].subject.rfc4514_string()} does not chain to a trusted root")
+    if expected_name is not None and expected_name not in cert_names(chain[0]):
+        raise WebhookVerificationError(f"Certificate {chain[0].subject.rfc4514_string()} is not issued to {expected_name}")
+    return chain[0]
+
+
+def fetch_cert(url, timeout=5):
+    """Download a PEM certificate chain."""
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+class CertCache:
+    """
+    Verified PayPal signing certificates, keyed by PAYPAL-CERT-URL.
+
+    A certificate is downloaded and checked once, then reused until ttl seconds have passed
+    or the certificate expires, whichever comes first. Verification on a warm container is
+    therefore CPU only.
+
+    :param fetch: A callable (url) -> PEM bytes.
+    :param ttl: Seconds to keep a certificate before downloading it again.
+    :param clock: A time source returning epoch seconds, replaceable in tests.
+    :param trusted_roots: The root certificates to accept (defaults to paypal_trusted_roots()).
+    """
+
+    def __init__(self, fetch=fetch_cert, ttl=24 * 3600, clock=time.time, trusted_roots=None):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._clock = clock
+        self.trusted_roots = trusted_roots
+        self._certs = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url):
+        """
+        Return the signing certificate at url.
+
+        :raises WebhookVerificationError: If the url is not a PayPal API certificate url or the
+            certificate does not check out.
+        """
+        parsed = urlparse(url or "")
+        if (parsed.scheme != "https" or parsed.netloc not in PAYPAL_CERT_HOSTS
+                or not parsed.path.startswith(PAYPAL_CERT_PATH_PREFIX)):
+            raise WebhookVerificationError(f"Untrusted certificate URL: {url}")
+
+        now = self._clock()
+        with self._lock:
+            cached = self._certs.get(url)
+            if cached and cached[1] > now:
+                self.hits += 1
+                return cached[0]
+
+        cert = load_cert_chain(self.fetch(url), now=datetime.fromtimestamp(now, timezone.utc),
+                               expected_name=PAYPAL_CERT_HOSTS[parsed.netloc], trusted_roots=self.trusted_roots)
+        expires_at = min(now + self.ttl, cert.not_valid_after_utc.timestamp())
+        with self._lock:
+            self.misses += 1
+            self._certs[url] = (cert, expires_at)
+        return cert
+
+
+def verify_webhook(headers, body, webhook_id, cert_cache):
+    """
+    Verify a PayPal webhook delivery locally, without calling verify-webhook-signature.
+
+    :param headers: The request headers (any casing).
+    :param body: The raw request body as bytes.
+    :param webhook_id: The id of the webhook subscription the delivery is for.
+    :param cert_cache: The CertCache to load the signing certificate from.
+    :raises WebhookVerificationError: If any header is missing or the signature does not match.
+    """
+    names = ("PAYPAL-TRANSMISSION-ID", "PAYPAL-TRANSMISSION-TIME", "PAYPAL-TRANSMISSION-SIG", "PAYPAL-CERT-URL", "PAYPAL-AUTH-ALGO")
+    values = {name: _header(headers, name) for name in names}
+    missing = [name for name, value in values.items() if not value]
+    if missing:
+        raise WebhookVerificationError(f"Missing headers: {', '.join(missing)}")
+
+    algorithm = SUPPORTED_AUTH_ALGOS.get(values["PAYPAL-AUTH-ALGO"])
+    if algorithm is None:
+        raise WebhookVerificationError(f"Unsupported signature algorithm: {values['PAYPAL-AUTH-ALGO']}")
+
+    cert = cert_cache.get(values["PAYPAL-CERT-URL"])
+    message = expected_message(values["PAYPAL-TRANSMISSION-ID"], values["PAYPAL-TRANSMISSION-TIME"], webhook_id, body)
+    try:
+        signature = base64.b64decode(values["PAYPAL-TRANSMISSION-SIG"], validate=True)
+        cert.public_key().verify(signature, message, padding.PKCS1v15(), algorithm())
+    except (ValueError, InvalidSignature):
+        raise WebhookVerificationError("Signature does not match")
@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ProfileCache:
+    """
+    A small thread-safe LRU cache of user attributes keyed by email, with a TTL.
+
+    Entries are copied in and out so callers can never mutate cached state by accident.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=1024, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(email):
+        return email.strip().lower()
+
+    def get(self, email):
+        """Return a copy of the cached attributes for email, or None if absent or expired."""
+        key = self._normalize(email)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            attributes, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(attributes)
+
+    def put(self, email, attributes):
+        key = self._normalize(email)
+        with self._lock:
+            self._entries[key] = (dict(attributes), self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def merge(self, email, updates):
+        """Apply attribute updates to a cached entry, keeping its original expiry."""
+        key = self._normalize(email)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[0].update(updates)
+
+    def invalidate(self, email):
+        with self._lock:
+            self._entries.pop(self._normalize(email), None)
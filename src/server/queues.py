@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class QueueMessage:
+    """A received message: its id, the handle needed to delete it, and its decoded JSON body."""
+
+    def __init__(self, message_id, receipt_handle, body):
+        self.message_id = message_id
+        self.receipt_handle = receipt_handle
+        self.body = body
+
+    @classmethod
+    def from_sqs_record(cls, record):
+        """Build a message from a record of an SQS Lambda event."""
+        return cls(record['messageId'], record.get('receiptHandle'), json.loads(record['body']))
+
+
+class SQSQueue:
+    """A JSON message queue backed by Amazon SQS."""
+
+    def __init__(self, queue_url, sqs_client):
+        self.queue_url = queue_url
+        self.sqs = sqs_client
+
+    def send(self, body):
+        """Enqueue a JSON-serializable body and return the message id."""
+        response = self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body))
+        return response['MessageId']
+
+    def receive(self, max_messages=10, wait_seconds=0):
+        """Receive up to max_messages (SQS allows at most 10), long polling for wait_seconds."""
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            WaitTimeSeconds=wait_seconds
+        )
+        return [
+            QueueMessage(message['MessageId'], message['ReceiptHandle'], json.loads(message['Body']))
+            for message in response.get('Messages', [])
+        ]
+
+    def delete(self, messages):
+        """Delete processed messages, 10 per DeleteMessageBatch call."""
+        for start in range(0, len(messages), 10):
+            chunk = messages[start:start + 10]
+            self.sqs.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{'Id': str(i), 'ReceiptHandle': message.receipt_handle} for i, message in enumerate(chunk)]
+            )
+
+
+class LocalQueue:
+    """
+    An in-process stand-in for SQSQueue, for local development and tests.
+
+    Received messages stay invisible until deleted or until visibility_timeout passes, at
+    which point they are delivered again, as with SQS.
+    """
+
+    def __init__(self, visibility_timeout=30.0, clock=time.monotonic):
+        self.visibility_timeout = visibility_timeout
+        self._clock = clock
+        self._ready = deque()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ready) + len(self._in_flight)
+
+    def send(self, body):
+        message_id = str(uuid.uuid4())
+        with self._lock:
+            self._ready.append((message_id, json.dumps(body)))
+        return message_id
+
+    def receive(self, max_messages=10, wait_seconds=0):
+        now = self._clock()
+        messages = []
+        with self._lock:
+            expired = [
+                (receipt_handle, message_id, body)
+                for receipt_handle, (message_id, body, visible_at) in self._in_flight.items()
+                if visible_at <= now
+            ]
+            # Redelivered messages go back to the front in the order they were first received.
+            for receipt_handle, message_id, body in reversed(expired):
+                del self._in_flight[receipt_handle]
+                self._ready.appendleft((message_id, body))
+            while self._ready and len(messages) < min(max_messages, 10):
+                message_id, body = self._ready.popleft()
+                receipt_handle = str(uuid.uuid4())
+                self._in_flight[receipt_handle] = (message_id, body, now + self.visibility_timeout)
+                messages.append(QueueMessage(message_id, receipt_handle, json.loads(body)))
+        return messages
+
+    def delete(self, messages):
+        with self._lock:
+            for message in messages:
+                self._in_flight.pop(message.receipt_handle, None)
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+
+
+# Default Cognito quota categories (requests per second) and the operations that share them.
+# Rates can be raised to match the account's quotas with COGNITO_RATE_LIMIT_<CATEGORY>,
+# e.g. COGNITO_RATE_LIMIT_USERUPDATE=50.
+COGNITO_QUOTA_CATEGORIES = {
+    "UserAuthentication": 120,
+    "UserCreation": 50,
+    "UserAccountRecovery": 30,
+    "UserRead": 120,
+    "UserUpdate": 25,
+    "UserList": 30,
+}
+
+# Operation -> quota category, as listed in the Cognito "API request rate quotas" table.
+COGNITO_OPERATION_CATEGORIES = {
+    "initiate_auth": "UserAuthentication",
+    "admin_initiate_auth": "UserAuthentication",
+    "sign_up": "UserCreation",
+    "admin_create_user": "UserCreation",
+    "admin_confirm_sign_up": "UserCreation",
+    "forgot_password": "UserAccountRecovery",
+    "confirm_forgot_password": "UserAccountRecovery",
+    "admin_get_user": "UserRead",
+    "get_user": "UserRead",
+    "admin_update_user_attributes": "UserUpdate",
+    "admin_set_user_password": "UserUpdate",
+    "admin_delete_user": "UserUpdate",
+    "verify_user_attribute": "UserUpdate",
+    "get_user_attribute_verification_code": "UserUpdate",
+    "list_users": "UserList",
+}
+
+# Error names AWS uses when a request is throttled.
+THROTTLE_ERROR_NAMES = {"TooManyRequestsException", "ThrottlingException", "Throttling"}
+
+
+def is_throttle_error(e):
+    """Return True if e is AWS reporting that a request was throttled."""
+    response = getattr(e, 'response', None)
+    error_code = response.get('Error', {}).get('Code') if isinstance(response, dict) else None
+    return type(e).__name__ in THROTTLE_ERROR_NAMES or error_code in THROTTLE_ERROR_NAMES
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would have to wait longer than allowed for a token."""
+
+    def __init__(self, category, retry_after):
+        super().__init__(f"Rate limit for {category} exceeded; retry after {retry_after:.2f}s")
+        self.category = category
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket.
+
+    Callers reserve tokens up front; if the bucket is short they sleep until their reservation
+    is covered, so waiting callers are served in arrival order. A caller that would have to
+    wait longer than max_wait is rejected instead and nothing is reserved.
+    """
+
+    def __init__(self, rate, capacity=None, name="default", clock=time.monotonic, sleep=time.sleep):
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, max_wait=0.0):
+        """
+        Take tokens from the bucket, waiting up to max_wait seconds for them.
+
+        :param tokens: The number of tokens to take.
+        :param max_wait: The longest the caller is willing to wait, in seconds.
+        :return: The number of seconds the caller waited.
+        :raises RateLimitExceeded: If the tokens would not be available within max_wait.
+        """
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (tokens - self.tokens) / self.rate)
+            if wait > max_wait:
+                raise RateLimitExceeded(self.name, wait)
+            self.tokens -= tokens
+
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    A token bucket that backs off when AWS throttles and recovers towards its ceiling.
+
+    Each throttle halves the rate (down to min_rate) and empties the bucket; each success
+    adds increase_ratio of the ceiling back (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, rate, capacity=None, name="default", min_rate=1.0, decrease_factor=0.5,
+                 increase_ratio=0.02, clock=time.monotonic, sleep=time.sleep):
+        super().__init__(rate, capacity, name, clock, sleep)
+        self.ceiling = float(rate)
+        self.min_rate = min(float(min_rate), self.ceiling)
+        self.decrease_factor = decrease_factor
+        self.increase_ratio = increase_ratio
+
+    def on_throttle(self):
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self):
+        if self.rate >= self.ceiling:
+            return
+        with self._lock:
+            self._refill()
+            self.rate = min(self.ceiling, self.rate + self.ceiling * self.increase_ratio)
+
+
+class RateLimiterRegistry:
+    """
+    One adaptive token bucket per quota category, looked up by operation name.
+    """
+
+    def __init__(self, categories, operation_categories, env_prefix, max_wait=0.0, **bucket_options):
+        self.operation_categories = operation_categories
+        self.max_wait = max_wait
+        self.limiters = {
+            category: AdaptiveTokenBucket(
+                float(os.getenv(f"{env_prefix}{category.upper()}", rate)), name=category, **bucket_options
+            )
+            for category, rate in categories.items()
+        }
+
+    @classmethod
+    def for_cognito(cls, **bucket_options):
+        """Build the registry for Cognito, reading overrides from the environment."""
+        return cls(
+            COGNITO_QUOTA_CATEGORIES,
+            COGNITO_OPERATION_CATEGORIES,
+            env_prefix="COGNITO_RATE_LIMIT_",
+            max_wait=float(os.getenv("COGNITO_RATE_LIMIT_MAX_WAIT", "0.25")),
+            **bucket_options
+        )
+
+    def limiter_for(self, operation):
+        category = self.operation_categories.get(operation)
+        return self.limiters.get(category)
+
+    def call(self, operation, fn, *args, **kwargs):
+        """
+        Call fn through the limiter for operation's category, adapting the rate to the result.
+
+        Operations without a known category are called directly.
+
+        :raises RateLimitExceeded: If the call was shed before reaching AWS.
+        """
+        limiter = self.limiter_for(operation)
+        if limiter is None:
+            return fn(*args, **kwargs)
+
+        limiter.acquire(max_wait=self.max_wait)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_throttle_error(e):
+                limiter.on_throttle()
+            raise
+        limiter.on_success()
+        return result
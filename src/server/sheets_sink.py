@@ -0,0 +1,233 @@
+import random
+import threading
+import time
+from urllib.parse import quote
+
+import jwt
+import requests
+
+
+TOKEN_URL = "https://oauth2.googleapis.com/token"
+SHEETS_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+SHEETS_SCOPE = "https://www.googleapis.com/auth/spreadsheets"
+
+# Rows per values.append call; Google caps a request at 10 MB, far above this for short rows.
+MAX_BATCH_ROWS = 500
+
+# Google asks for truncated exponential backoff, capped at 64 seconds.
+MAX_BACKOFF_SECONDS = 64.0
+
+
+class SheetsRetryableError(Exception):
+    """The Sheets API asked for the request to be retried (quota exceeded or unavailable)."""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"Google Sheets returned {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class PartialWriteError(Exception):
+    """Some queued rows could not be appended; failed holds their messages, in order."""
+
+    def __init__(self, failed, cause):
+        super().__init__(f"{len(failed)} rows not appended: {cause}")
+        self.failed = failed
+        self.cause = cause
+
+
+def sale_row(webhook_event):
+    """
+    Return the Sheet1!A:E row for a PAYMENT.SALE.COMPLETED webhook event, or None for other events.
+
+    The columns are the time, the sale id, the amount, the currency and the donation's custom field.
+    """
+    if webhook_event.get('event_type') != "PAYMENT.SALE.COMPLETED":
+        return None
+    resource = webhook_event.get('resource') or {}
+    amount = resource.get('amount') or {}
+    return [
+        resource.get('create_time') or webhook_event.get('create_time'),
+        resource.get('id'),
+        amount.get('total'),
+        amount.get('currency'),
+        resource.get('custom') or resource.get('custom_id') or "",
+    ]
+
+
+class GoogleSheetsClient:
+    """
+    A minimal Google Sheets REST client authenticated as a service account.
+
+    The OAuth access token is obtained with a signed JWT assertion and reused until shortly
+    before it expires.
+
+    :param service_account_info: The service account's JSON key, as a dict.
+    :param session: A requests session (or the requests module).
+    """
+
+    def __init__(self, service_account_info, session=requests, clock=time.time):
+        self.service_account_info = service_account_info
+        self.session = session
+        self._clock = clock
+        self._token = None
+        self._token_expires_at = 0
+        self._lock = threading.Lock()
+
+    def _access_token(self):
+        with self._lock:
+            now = self._clock()
+            if self._token and self._token_expires_at - 60 > now:
+                return self._token
+            assertion = jwt.encode({
+                "iss": self.service_account_info['client_email'],
+                "scope": SHEETS_SCOPE,
+                "aud": TOKEN_URL,
+                "iat": int(now),
+                "exp": int(now) + 3600,
+            }, self.service_account_info['private_key'], algorithm="RS256")
+            response = self.session.post(TOKEN_URL, data={
+                "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+                "assertion": assertion,
+            }, timeout=10)
+            response.raise_for_status()
+            token = response.json()
+            self._token = token['access_token']
+            self._token_expires_at = now + token.get('expires_in', 3600)
+            return self._token
+
+    def append(self, spreadsheet_id, range_, rows):
+        """
+        Append rows after the last row of range_ with one values.append call.
+
+        Values are stored as sent (RAW), never parsed as formulas: the custom column comes
+        from the donor's order, so "=IMPORTXML(...)" must stay text.
+
+        :raises SheetsRetryableError: On 429 (quota) and 5xx responses.
+        """
+        response = self.session.post(
+            f"{SHEETS_URL}/{spreadsheet_id}/values/{quote(range_)}:append",
+            params={"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+            headers={"Authorization": f"Bearer {self._access_token()}"},
+            json={"values": rows},
+            timeout=30
+        )
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get('Retry-After')
+            raise SheetsRetryableError(response.status_code, float(retry_after) if retry_after else None)
+        response.raise_for_status()
+        return response.json()
+
+
+class SheetsSink:
+    """
+    Rows for a spreadsheet, buffered on a queue and appended in batches.
+
+    Producers put() rows (or anything row_for maps to a row) on the queue and return at
+    once. flush() drains the queue and write() appends a batch of received messages, up to
+    max_batch_rows rows per values.append call and in queue order, so at peak a single API
+    call carries hundreds of webhook rows. Messages are deleted only after their rows are
+    appended (at-least-once), and a failed call stops the write so later rows are not
+    written ahead of it. Keep one writer at a time (e.g. reserved concurrency 1) and a FIFO
+    queue where strict ordering matters.
+
+    :param queue: An SQSQueue or LocalQueue.
+    :param append: A callable (rows) that appends rows with one API call, e.g. a bound
+        GoogleSheetsClient.append.
+    :param row_for: A callable (message body) -> row, or None for messages with nothing to
+        append. Defaults to the body's "row", as sent by put().
+    :param limiter: An optional (Adaptive)TokenBucket paced to the Sheets write quota.
+    :param max_batch_rows: The most rows per append call.
+    :param max_retries: Retries of a batch after quota or availability errors.
+    :param on_batch: An optional callable (messages) run with each batch before its rows are
+        appended, e.g. to archive the events elsewhere; if it raises, the whole batch fails.
+    """
+
+    def __init__(self, queue, append, row_for=None, limiter=None, max_batch_rows=MAX_BATCH_ROWS, max_retries=6,
+                 sleep=time.sleep, on_batch=None):
+        self.queue = queue
+        self.append = append
+        self.row_for = row_for or (lambda body: body['row'])
+        self.limiter = limiter
+        self.max_batch_rows = max_batch_rows
+        self.max_retries = max_retries
+        self.on_batch = on_batch
+        self._sleep = sleep
+        self.calls = 0
+
+    def put(self, row):
+        """Buffer one row; returns the queue message id."""
+        return self.queue.send({"row": row})
+
+    def append_rows(self, rows):
+        """Append rows in batches of max_batch_rows, retrying quota and availability errors with backoff."""
+        for start in range(0, len(rows), self.max_batch_rows):
+            self._append_batch(rows[start:start + self.max_batch_rows])
+
+    def _append_batch(self, batch):
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire(max_wait=float('inf'))
+            try:
+                self.calls += 1
+                self.append(batch)
+                if hasattr(self.limiter, 'on_success'):
+                    self.limiter.on_success()
+                break
+            except SheetsRetryableError as e:
+                if attempt == self.max_retries:
+                    raise
+                if hasattr(self.limiter, 'on_throttle'):
+                    self.limiter.on_throttle()
+                # Full jitter, unless the API said how long to wait.
+                backoff = random.uniform(0, min(MAX_BACKOFF_SECONDS, 2 ** attempt))
+                self._sleep(e.retry_after if e.retry_after is not None else backoff)
+
+    def write(self, messages):
+        """
+        Append the rows of received messages, in order.
+
+        :param messages: QueueMessage objects; those row_for maps to None are skipped.
+        :raises PartialWriteError: If an append call fails; it lists the messages of that call
+            and every later one, none of which were written, or every message if on_batch failed.
+        """
+        if self.on_batch is not None and messages:
+            try:
+                self.on_batch(messages)
+            except Exception as e:
+                raise PartialWriteError(list(messages), e) from e
+        pending = [(message, self.row_for(message.body)) for message in messages]
+        pending = [(message, row) for message, row in pending if row is not None]
+        for start in range(0, len(pending), self.max_batch_rows):
+            try:
+                self._append_batch([row for _, row in pending[start:start + self.max_batch_rows]])
+            except Exception as e:
+                raise PartialWriteError([message for message, _ in pending[start:]], e) from e
+
+    def flush(self, deadline=None):
+        """
+        Drain the queue into the sheet.
+
+        :param deadline: An optional time.monotonic() value after which no new batch is started.
+        :return: The number of messages handled.
+        :raises PartialWriteError: If a batch fails; its messages stay on the queue and are
+            redelivered after the visibility timeout.
+        """
+        appended = 0
+        while deadline is None or time.monotonic() < deadline:
+            batch = []
+            while len(batch) < self.max_batch_rows:
+                messages = self.queue.receive(max_messages=min(10, self.max_batch_rows - len(batch)))
+                if not messages:
+                    break
+                batch.extend(messages)
+            if not batch:
+                break
+            try:
+                self.write(batch)
+            except PartialWriteError as e:
+                self.queue.delete([message for message in batch if message not in e.failed])
+                raise
+            self.queue.delete(batch)
+            appended += len(batch)
+        return appended
@@ -0,0 +1,77 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it is still in
+    flight wait for it and receive the same result (or exception). Nothing is cached once
+    the call finishes, so later callers always get a fresh result.
+
+    :param on_done: An optional callback (key, followers) run after each execution, where
+        followers is the number of callers that shared it.
+    """
+
+    def __init__(self, on_done=None):
+        self.on_done = on_done
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) once for all concurrent callers with the same key.
+
+        :return: A tuple of (result, shared), where shared is True if this caller reused
+            another caller's execution.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.executions += 1
+            else:
+                leader = False
+                call.followers += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if self.on_done:
+                self.on_done(key, call.followers)
+        return call.result, False
+
+    def stats(self):
+        """Return request and execution counts and the coalescing ratio (requests per execution)."""
+        with self._lock:
+            executions, shared = self.executions, self.shared
+        return {
+            "requests": executions + shared,
+            "executions": executions,
+            "coalesced": shared,
+            "ratio": (executions + shared) / executions if executions else 1.0,
+        }
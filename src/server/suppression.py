@@ -0,0 +1,227 @@
+import calendar
+import json
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from negative_cache import CountingBloomFilter
+
+
+# Segment keys start with their UTC creation time in this format.
+SEGMENT_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+# Refreshes re-list segments this many seconds older than the newest one loaded, so a
+# segment written late (clock skew, slow writer) is still picked up.
+LIST_OVERLAP_SECONDS = 300
+
+
+def _normalize(email):
+    return (email or "").strip().lower()
+
+
+def parse_ses_notification(message):
+    """
+    Turn one SES notification into suppression records.
+
+    Permanent bounces and complaints suppress the address; transient bounces (full
+    mailbox, auto-reply, ...) do not, since later sends may well succeed.
+
+    :param message: The decoded SES notification (the SNS message body).
+    :return: A list of {"email", "reason", "detail", "at"} dicts.
+    """
+    notification_type = message.get('notificationType') or message.get('eventType')
+    at = datetime.now(timezone.utc).isoformat()
+
+    if notification_type == "Bounce":
+        bounce = message.get('bounce', {})
+        if bounce.get('bounceType') != "Permanent":
+            return []
+        return [
+            {"email": _normalize(recipient.get('emailAddress')), "reason": "bounce",
+             "detail": bounce.get('bounceSubType'), "at": bounce.get('timestamp', at)}
+            for recipient in bounce.get('bouncedRecipients', [])
+            if recipient.get('emailAddress')
+        ]
+    if notification_type == "Complaint":
+        complaint = message.get('complaint', {})
+        return [
+            {"email": _normalize(recipient.get('emailAddress')), "reason": "complaint",
+             "detail": complaint.get('complaintFeedbackType'), "at": complaint.get('timestamp', at)}
+            for recipient in complaint.get('complainedRecipients', [])
+            if recipient.get('emailAddress')
+        ]
+    return []
+
+
+def _parse_lines(data):
+    return [json.loads(line) for line in data.decode('utf-8').splitlines() if line.strip()]
+
+
+class SuppressionList:
+    """
+    Addresses that must not be emailed, mirrored in memory from an object store.
+
+    The store holds append-only JSON Lines segments under prefix, named so they sort by
+    creation time, and a snapshot that compact() periodically merges them into. The first
+    refresh reads the snapshot and the segments written since; later refreshes only list
+    segments from shortly before the newest one loaded and skip those already loaded, so
+    keeping the mirror current costs one small LIST per refresh_interval. Lookups are
+    purely in memory: a Bloom filter answers the common case (not suppressed) and the
+    exact set confirms its hits.
+
+    :param store: An object store (S3ObjectStore or LocalObjectStore).
+    :param prefix: The key prefix of the suppression segments.
+    :param refresh_interval: Seconds between incremental refreshes.
+    :param clock: A time source, replaceable in tests.
+    :param snapshot_key: The key of the snapshot; defaults to prefix with ".snapshot.ndjson"
+        in place of its trailing slash, outside the segment listing.
+    """
+
+    def __init__(self, store, prefix="email-suppressions/", refresh_interval=60.0, clock=time.monotonic,
+                 snapshot_key=None):
+        self.store = store
+        self.prefix = prefix
+        self.snapshot_key = snapshot_key or prefix.rstrip("/") + ".snapshot.ndjson"
+        self.refresh_interval = refresh_interval
+        self._clock = clock
+        self._emails = set()
+        self._filter = None
+        self._capacity = 0
+        self._loaded_keys = set()
+        self._newest = None
+        self._refreshed_at = None
+        self._snapshot_loaded = False
+        self._lock = threading.Lock()
+        self._resize(1024)
+
+    def _resize(self, capacity):
+        # About 1% false positives: ~9.6 bits per entry and 7 hash functions.
+        self._capacity = capacity
+        self._filter = CountingBloomFilter(size=math.ceil(capacity * 9.6), hash_count=7)
+        for email in self._emails:
+            self._filter.add(email)
+
+    def _add_local(self, emails):
+        with self._lock:
+            for email in emails:
+                if email and email not in self._emails:
+                    self._emails.add(email)
+                    self._filter.add(email)
+            if len(self._emails) > self._capacity:
+                self._resize(max(self._capacity, len(self._emails)) * 2)
+
+    def __len__(self):
+        return len(self._emails)
+
+    def refresh(self, force=False):
+        """Load segments written since the last refresh, at most once per refresh_interval unless forced."""
+        now = self._clock()
+        if not force and self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+            return 0
+        self._refreshed_at = now
+
+        start_after = None
+        if self._newest is not None:
+            start_after = self.prefix + time.strftime(SEGMENT_TIME_FORMAT, time.gmtime(self._newest - LIST_OVERLAP_SECONDS))
+
+        # List before reading the snapshot: a segment compacted away in between is then
+        # either in the snapshot read or missing when fetched, which re-reads the snapshot.
+        keys = [key for key in self.store.list(self.prefix, start_after=start_after) if key not in self._loaded_keys]
+        loaded = 0
+        if not self._snapshot_loaded:
+            loaded += self._load_snapshot()
+        for key in keys:
+            try:
+                data = self.store.get(key)
+            except Exception:
+                if self.store.exists(key):
+                    raise
+                loaded += self._load_snapshot()
+                continue
+            records = _parse_lines(data)
+            self._add_local(record['email'] for record in records)
+            self._mark_loaded(key)
+            loaded += len(records)
+        return loaded
+
+    def _load_snapshot(self):
+        self._snapshot_loaded = True
+        if not self.store.exists(self.snapshot_key):
+            return 0
+        emails = [record['email'] for record in _parse_lines(self.store.get(self.snapshot_key))]
+        self._add_local(emails)
+        return len(emails)
+
+    def compact(self):
+        """
+        Merge every segment into the snapshot, one record per address, then delete the segments.
+
+        The new snapshot replaces the old one in a single put before any segment is deleted,
+        so a reader always finds each suppression in one or the other. Run one compaction at
+        a time (e.g. from the daily compaction schedule).
+
+        :return: The number of segments merged.
+        """
+        segments = list(self.store.list(self.prefix))
+        if not segments:
+            return 0
+        sources = ([self.snapshot_key] if self.store.exists(self.snapshot_key) else []) + segments
+        seen = set()
+        with self.store.open_writer(self.snapshot_key, content_type="application/x-ndjson") as out:
+            for key in sources:
+                for record in _parse_lines(self.store.get(key)):
+                    if record.get('email') and record['email'] not in seen:
+                        seen.add(record['email'])
+                        out.write((json.dumps(record) + "\n").encode('utf-8'))
+        for key in segments:
+            self.store.delete(key)
+        self._add_local(seen)
+        return len(segments)
+
+    def _mark_loaded(self, key):
+        self._loaded_keys.add(key)
+        try:
+            written = calendar.timegm(time.strptime(key[len(self.prefix):].split("-")[0], SEGMENT_TIME_FORMAT))
+        except ValueError:
+            return
+        self._newest = max(self._newest or written, written)
+
+    def add(self, records):
+        """
+        Record suppressions: write them as a new segment and add them to the local mirror.
+
+        :param records: Suppression records, e.g. from parse_ses_notification.
+        :return: The segment key, or None if there was nothing to write.
+        """
+        records = [record for record in records if record.get('email')]
+        if not records:
+            return None
+        key = f"{self.prefix}{time.strftime(SEGMENT_TIME_FORMAT, time.gmtime())}-{uuid.uuid4().hex}.ndjson"
+        data = "".join(json.dumps(record) + "\n" for record in records).encode('utf-8')
+        self.store.put(key, data, content_type="application/x-ndjson")
+        self._add_local(record['email'] for record in records)
+        self._mark_loaded(key)
+        return key
+
+    def is_suppressed(self, email):
+        """Return True if email must not be mailed. Never makes a network call; see refresh()."""
+        email = _normalize(email)
+        return email in self._filter and email in self._emails
+
+    __contains__ = is_suppressed
+
+    def filter(self, recipients, key=None):
+        """
+        Yield the recipients that may be mailed, in one pass over recipients.
+
+        The list is refreshed once up front rather than per recipient.
+
+        :param recipients: An iterable of addresses, or of items key maps to an address.
+        :param key: An optional callable returning the address of an item.
+        """
+        self.refresh()
+        for recipient in recipients:
+            if not self.is_suppressed(key(recipient) if key else recipient):
+                yield recipient
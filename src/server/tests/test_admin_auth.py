@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import jwt
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+POOL_ID = "us-west-1_Pool"
+
+def access_token(groups=("admin",), pool_id=POOL_ID, token_use="access"):
+    claims = {"sub": "user-1", "token_use": token_use, "cognito:groups": list(groups),
+              "iss": f"https://cognito-idp.us-west-1.amazonaws.com/{pool_id}"}
+    return jwt.encode(claims, "signature-not-checked-by-these-tests", algorithm="HS256")
+
+def admin_event(path="/admin/users/lookup", token=None):
+    headers = {"authorization": f"Bearer {token}"} if token else {}
+    return {"httpMethod": "POST", "path": path, "headers": headers, "body": json.dumps({"emails": ["a@example.com"]})}
+
+@pytest.fixture
+def mock_cognito():
+    """
+    Patches Cognito and the user pool id; admin_get_user finds every user.
+    """
+    with patch("index.client") as mock_client, patch("index.get_user_pool_id", return_value=POOL_ID):
+        for name in ["NotAuthorizedException", "UserNotFoundException", "TooManyRequestsException"]:
+            setattr(mock_client.exceptions, name, type(name, (Exception,), {}))
+        mock_client.admin_get_user.return_value = {"UserAttributes": [{"Name": "email", "Value": "a@example.com"}]}
+        yield mock_client
+
+@pytest.mark.parametrize(
+    "token, expected_status",
+    [
+        # 1) No token => 401
+        (None, 401),
+        # 2) Not a JWT => 401
+        ("not-a-token", 401),
+        # 3) Token from another user pool => 401
+        (access_token(pool_id="us-west-1_Other"), 401),
+        # 4) ID token instead of an access token => 401
+        (access_token(token_use="id"), 401),
+        # 5) Signed-in user outside the admin group => 403
+        (access_token(groups=["members"]), 403),
+        # 6) Admin => 200
+        (access_token(), 200)
+    ]
+)
+def test_admin_routes_require_an_admin(mock_cognito, token, expected_status):
+    from index import lambda_handler
+
+    response = lambda_handler(admin_event(token=token), None)
+
+    assert response["statusCode"] == expected_status
+    assert mock_cognito.admin_get_user.called == (expected_status == 200)
+
+def test_rejected_tokens_are_refused(mock_cognito):
+    mock_cognito.get_user.side_effect = mock_cognito.exceptions.NotAuthorizedException("Access Token has been revoked")
+
+    from index import lambda_handler
+
+    assert lambda_handler(admin_event(token=access_token()), None)["statusCode"] == 401
+    mock_cognito.get_user.assert_called_once_with(AccessToken=access_token())
+
+def test_batch_sub_requests_are_checked(mock_cognito):
+    from index import lambda_handler
+
+    event = {"httpMethod": "POST", "path": "/batch", "headers": {"Authorization": f"Bearer {access_token(groups=[])}"},
+             "body": json.dumps({"requests": [{"route": "/admin/users/lookup", "method": "POST", "body": {"emails": ["a@example.com"]}}]})}
+    response = lambda_handler(event, None)
+
+    assert json.loads(response["body"])["responses"][0]["status"] == 403
+    mock_cognito.admin_get_user.assert_not_called()
@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+@pytest.fixture
+def mock_ssm_and_cognito():
+    """
+    A Pytest fixture that patches out SSM and Cognito for all tests.
+    Sets up 'fake_user_pool_id' and the Cognito exception classes.
+    """
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client:
+        # Mock SSM to return a fake user pool ID
+        mock_ssm.get_parameter.return_value = {
+            "Parameter": {"Value": "fake_user_pool_id"}
+        }
+
+        # Mock Cognito exception classes so we can raise them easily
+        mock_client.exceptions.NotAuthorizedException = type("NotAuthorizedException",(Exception,),{})
+        mock_client.exceptions.UserNotFoundException = type("UserNotFoundException",(Exception,),{})
+        mock_client.exceptions.InvalidParameterException = type("InvalidParameterException",(Exception,),{})
+        mock_client.exceptions.InvalidPasswordException = type("InvalidPasswordException",(Exception,),{})
+        mock_client.exceptions.TooManyRequestsException = type("TooManyRequestsException",(Exception,),{})
+
+        mock_client.admin_get_user.return_value = {
+            "UserAttributes": [
+                {"Name": "email", "Value": "user@example.com"},
+                {"Name": "custom:firstName", "Value": "John"}
+            ]
+        }
+
+        # Provide the mocks to the test function
+        yield (mock_ssm, mock_client)
+
+def batch_event(sub_requests):
+    return {
+        "httpMethod": "POST",
+        "path": "/batch",
+        "body": json.dumps({"requests": sub_requests})
+    }
+
+def test_batch_dispatches_through_route_table(mock_ssm_and_cognito):
+    """
+    Independent GET, PATCH and DELETE sub-requests all run and report their own status.
+    """
+    mock_ssm, mock_cognito_client = mock_ssm_and_cognito
+
+    from index import lambda_handler
+
+    start_time = time.time()
+    response = lambda_handler(batch_event([
+        {"id": "get", "route": "/user", "method": "GET", "query": {"email": "user@example.com"}},
+        {"id": "patch", "route": "/user", "method": "PATCH",
+         "body": {"email": "user@example.com", "attribute_updates": {"custom:lastName": "Doe"}}},
+        {"id": "delete", "route": "/user", "method": "DELETE", "query": {"email": "other@example.com"}},
+        {"id": "missing", "route": "/does-not-exist", "method": "GET"}
+    ]), None)
+    execution_time = time.time() - start_time
+
+    print(f"[test_batch] status={response['statusCode']}, time={execution_time:.4f}s")
+    assert execution_time < 0.5, "Batch took too long!"
+
+    assert response["statusCode"] == 200
+    results = {item["id"]: item for item in json.loads(response["body"])["responses"]}
+    assert results["get"]["status"] == 200
+    assert results["get"]["body"]["user_attributes"]["custom:firstName"] == "John"
+    assert results["patch"]["status"] == 200
+    assert results["delete"]["status"] == 200
+    assert results["missing"]["status"] == 404
+
+def test_batch_skips_items_whose_dependency_failed(mock_ssm_and_cognito):
+    """
+    A dependent sub-request runs after its dependency and is skipped with 424 if it failed.
+    """
+    mock_ssm, mock_cognito_client = mock_ssm_and_cognito
+    mock_cognito_client.admin_get_user.side_effect = mock_cognito_client.exceptions.UserNotFoundException()
+
+    from index import lambda_handler
+
+    response = lambda_handler(batch_event([
+        {"id": "update", "route": "/user", "method": "PATCH",
+         "body": {"email": "gone@example.com", "attribute_updates": {"custom:firstName": "Jane"}}},
+        {"id": "refetch", "route": "/user", "method": "GET",
+         "query": {"email": "gone@example.com"}, "depends_on": ["update"]}
+    ]), None)
+
+    responses = json.loads(response["body"])["responses"]
+    assert [item["id"] for item in responses] == ["update", "refetch"]
+    assert responses[0]["status"] == 404
+    assert responses[1]["status"] == 424
+    # Only the update read the profile; the refetch never ran.
+    mock_cognito_client.admin_get_user.assert_called_once()
+    mock_cognito_client.admin_update_user_attributes.assert_not_called()
+
+@pytest.mark.parametrize(
+    "sub_requests, expected_message",
+    [
+        # 1) Missing list
+        (None, "A non-empty 'requests' list is required."),
+        # 2) Missing route/method
+        ([{"route": "/user"}], "Request 0 must include 'route' and 'method'."),
+        # 3) Nested batch
+        ([{"route": "/batch", "method": "POST"}], "Batch requests cannot be nested."),
+        # 4) Dependency on a later item
+        ([{"id": "a", "route": "/user", "method": "GET", "depends_on": ["b"]},
+          {"id": "b", "route": "/user", "method": "GET"}],
+         "Request 'a' depends on unknown or later requests: ['b']."),
+        # 5) Too many requests
+        ([{"route": "/user", "method": "GET"}] * 21, "A batch may contain at most 20 requests."),
+        # 6) Method that is not a string
+        ([{"route": "/user", "method": "GET"}, {"route": "/user", "method": ["GET"]}],
+         "Request 1 must give 'route' and 'method' as strings."),
+        # 7) depends_on that is not a list
+        ([{"id": "a", "route": "/user", "method": "GET"}, {"id": "b", "route": "/user", "method": "GET", "depends_on": "a"}],
+         "Request 'b' must give 'depends_on' as a list of request ids.")
+    ]
+)
+def test_batch_validation(mock_ssm_and_cognito, sub_requests, expected_message):
+    """
+    Malformed batches are rejected with 400 before any sub-request runs.
+    """
+    mock_ssm, mock_cognito_client = mock_ssm_and_cognito
+
+    from index import batch_route
+
+    response = batch_route(sub_requests)
+
+    assert response["statusCode"] == 400
+    assert json.loads(response["body"])["message"] == expected_message
+    mock_cognito_client.admin_get_user.assert_not_called()
+
+def test_batch_sub_requests_keep_the_callers_context(mock_ssm_and_cognito):
+    """
+    Sub-requests see the batch's source IP, so the contact form's per-IP limit still applies.
+    """
+    from index import cors_response, lambda_handler
+
+    event = batch_event([{"id": str(i), "route": "/contact-us", "method": "POST",
+                          "body": {"firstName": "Bot", "email": f"bot{i}@example.com", "message": "Hi"}} for i in range(3)])
+    event["requestContext"] = {"identity": {"sourceIp": "203.0.113.9"}}
+    with patch("index.contact_us", return_value=cors_response(200, {"message": "sent"})) as mock_contact_us:
+        response = lambda_handler(event, None)
+
+    assert [item["status"] for item in json.loads(response["body"])["responses"]] == [200, 200, 200]
+    assert [call.args[3] for call in mock_contact_us.call_args_list] == ["203.0.113.9"] * 3
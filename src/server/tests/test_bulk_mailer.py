@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bulk_mailer import CampaignCheckpoint, send_campaign
+from email_templates import TEMPLATES
+from object_store import LocalObjectStore
+from rate_limiter import TokenBucket
+from suppression import SuppressionList
+from user_export import iter_user_pages
+
+def make_user(i):
+    return {
+        "Username": f"sub-{i}",
+        "Attributes": [
+            {"Name": "email", "Value": f"user{i}@example.com"},
+            # Every tenth user has not verified their email address.
+            {"Name": "email_verified", "Value": "false" if i % 10 == 9 else "true"},
+            {"Name": "custom:firstName", "Value": f"First{i}"}
+        ],
+        "Enabled": True,
+        "UserStatus": "CONFIRMED"
+    }
+
+class FakeListUsers:
+    """
+    Serves `total` users in pages of 60, like Cognito ListUsers with PaginationToken.
+    """
+    def __init__(self, total):
+        self.total = total
+
+    def __call__(self, **kwargs):
+        start = int(kwargs.get("PaginationToken", 0))
+        end = min(start + 60, self.total)
+        response = {"Users": [make_user(i) for i in range(start, end)]}
+        if end < self.total:
+            response["PaginationToken"] = str(end)
+        return response
+
+class FakeSES:
+    """
+    Records SendBulkTemplatedEmail destinations; can fail on a given call number.
+    """
+    def __init__(self, fail_on_call=None, error=None):
+        self.sent = []
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+        self.error = error or RuntimeError("Lambda was interrupted")
+
+    def send_bulk_templated_email(self, **kwargs):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise self.error
+        addresses = [destination["Destination"]["ToAddresses"][0] for destination in kwargs["Destinations"]]
+        self.sent.extend(addresses)
+        return {"Status": [{"Status": "Success", "MessageId": address} for address in addresses]}
+
+def pages_for(total, checkpoint):
+    return iter_user_pages(FakeListUsers(total), "fake_user_pool_id", pagination_token=checkpoint.state["pagination_token"])
+
+NOTICE_DATA = {"subject": "Service times", "body": "We now meet at 10am."}
+
+@pytest.mark.parametrize("rate, expected_chunk", [(200, 50), (14, 14)])
+def test_chunks_fit_the_send_rate(tmp_path, rate, expected_chunk):
+    ses = FakeSES()
+    ses.send_bulk_templated_email = MagicMock(side_effect=ses.send_bulk_templated_email)
+    checkpoint = CampaignCheckpoint(LocalObjectStore(str(tmp_path)), "checkpoint.json")
+    limiter = TokenBucket(rate, clock=lambda: 0.0, sleep=lambda seconds: None)
+
+    assert send_campaign(ses, TEMPLATES["notice"], "noreply@example.com", pages_for(100, checkpoint),
+                         checkpoint, limiter, default_data=NOTICE_DATA)
+
+    sizes = [len(call.kwargs["Destinations"]) for call in ses.send_bulk_templated_email.call_args_list]
+    assert max(sizes) == expected_chunk
+    assert sum(sizes) == 90
+    assert checkpoint.state["sent"] == 90 and checkpoint.state["skipped"] == 10
+
+def test_throughput_is_pinned_to_send_rate(tmp_path):
+    ses = FakeSES()
+    checkpoint = CampaignCheckpoint(LocalObjectStore(str(tmp_path)), "checkpoint.json")
+
+    start_time = time.perf_counter()
+    send_campaign(ses, TEMPLATES["notice"], "noreply@example.com", pages_for(250, checkpoint),
+                  checkpoint, TokenBucket(100), default_data=NOTICE_DATA)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"[test_bulk_mailer] {len(ses.sent)} recipients at 100/s in {elapsed:.2f}s")
+    assert len(ses.sent) == 225
+    # A one-second burst of 100, then the remaining 125 at 100 per second.
+    assert 1.1 < elapsed < 2.0
+
+def test_interrupted_campaign_resumes_without_duplicates(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    ses = FakeSES(fail_on_call=4)
+    limiter = TokenBucket(1000)
+
+    checkpoint = CampaignCheckpoint(store, "checkpoint.json")
+    with pytest.raises(RuntimeError):
+        send_campaign(ses, TEMPLATES["notice"], "noreply@example.com", pages_for(300, checkpoint),
+                      checkpoint, limiter, default_data=NOTICE_DATA)
+    # Batches stay within a ListUsers page: 50 + 4 from the first page, then 50 from the second.
+    assert len(ses.sent) == 104
+
+    checkpoint = CampaignCheckpoint(store, "checkpoint.json")
+    assert checkpoint.state["sent"] == 104
+    assert send_campaign(ses, TEMPLATES["notice"], "noreply@example.com", pages_for(300, checkpoint),
+                         checkpoint, limiter, default_data=NOTICE_DATA)
+
+    assert len(ses.sent) == len(set(ses.sent)) == 270
+    assert CampaignCheckpoint(store, "checkpoint.json").state["done"] is True
+
+def test_deadline_stops_before_sending(tmp_path):
+    ses = FakeSES()
+    checkpoint = CampaignCheckpoint(LocalObjectStore(str(tmp_path)), "checkpoint.json")
+
+    finished = send_campaign(ses, TEMPLATES["notice"], "noreply@example.com", pages_for(100, checkpoint),
+                             checkpoint, TokenBucket(1000), default_data=NOTICE_DATA, deadline=time.monotonic())
+
+    assert finished is False
+    assert ses.sent == []
+
+def test_ses_throttling_is_retried(tmp_path):
+    throttled = Exception("Maximum sending rate exceeded.")
+    throttled.response = {"Error": {"Code": "Throttling"}}
+    ses = FakeSES(fail_on_call=1, error=throttled)
+    checkpoint = CampaignCheckpoint(LocalObjectStore(str(tmp_path)), "checkpoint.json")
+
+    assert send_campaign(ses, TEMPLATES["notice"], "noreply@example.com", pages_for(20, checkpoint),
+                         checkpoint, TokenBucket(1000), default_data=NOTICE_DATA)
+    assert len(ses.sent) == 18
+
+def test_bulk_mail_handler(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    ses = FakeSES()
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 300000
+    event = {"campaign_id": "easter", "template": "notice", "data": NOTICE_DATA}
+    suppressions = SuppressionList(store)
+    suppressions.add([{"email": "user0@example.com", "reason": "bounce"}])
+
+    with patch('index.email_suppressions', suppressions), patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, patch('index.ses', ses), \
+         patch('index.S3ObjectStore', lambda bucket, s3: store), patch('index.ses_send_limiter', None), \
+         patch('index.get_sender_email', return_value="noreply@example.com"), \
+         patch.dict(os.environ, {"BULK_MAIL_BUCKET": "mail-bucket", "SES_MAX_SEND_RATE": "1000"}):
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+        mock_client.list_users.side_effect = FakeListUsers(130)
+
+        from index import bulk_mail_handler, lambda_handler
+
+        # 13 unverified users and one suppressed address are skipped.
+        assert bulk_mail_handler(event, context) == {"status": "complete", "sent": 116, "failed": 0, "skipped": 14}
+        assert "user0@example.com" not in ses.sent
+        assert mock_client.list_users.call_args.kwargs["Filter"] == 'cognito:user_status = "CONFIRMED"'
+
+        # A finished campaign is not sent again, including through the shared entry point.
+        assert lambda_handler({**event, "job": "bulk-mail"}, context)["status"] == "complete"
+        assert len(ses.sent) == 116
+        assert json.loads(store.get("bulk-mail/easter/checkpoint.json"))["done"] is True
@@ -0,0 +1,245 @@
+import os
+import sys
+import io
+import json
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bulk_users import Checkpoint, process_rows, read_rows, write_results
+from object_store import LocalObjectStore
+from rate_limiter import RateLimiterRegistry, RateLimitExceeded
+
+UsernameExistsException = type("UsernameExistsException", (Exception,), {})
+TooManyRequestsException = type("TooManyRequestsException", (Exception,), {})
+
+class FakeCognito:
+    """
+    Stands in for the rate-limited Cognito call: keeps users in a dict and records concurrency.
+    `failures` maps an operation to a list of exceptions raised by its next calls.
+    """
+    def __init__(self, existing=(), latency=0.0, failures=None):
+        self.users = {email: {} for email in existing}
+        self.latency = latency
+        self.failures = failures or {}
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, operation, **kwargs):
+        with self._lock:
+            self.calls.append((operation, kwargs))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            pending = self.failures.get(operation)
+            error = pending.pop(0) if pending else None
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if error:
+                raise error
+            attributes = {attr['Name']: attr['Value'] for attr in kwargs['UserAttributes']}
+            with self._lock:
+                if operation == 'admin_create_user':
+                    if kwargs['Username'] in self.users:
+                        raise UsernameExistsException("User account already exists")
+                    self.users[kwargs['Username']] = attributes
+                else:
+                    self.users[kwargs['Username']].update(attributes)
+            return {}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+def csv_stream(count):
+    lines = ["email,first_name,last_name"] + [f"user{i}@example.com,First{i},Last{i}" for i in range(count)]
+    return io.StringIO("\n".join(lines) + "\n")
+
+@pytest.mark.parametrize("input_format", ["csv", "jsonl"])
+def test_rows_are_created_updated_or_reported(input_format):
+    """
+    Upserts create new users and update existing ones; bad rows are reported, not fatal.
+    """
+    rows = [
+        {"email": "new@example.com", "first_name": "Nina", "last_name": "North"},
+        {"email": "old@example.com", "first_name": "Olga"},
+        {"email": "old@example.com", "action": "create", "first_name": "Olga"},
+        {"email": "", "first_name": "Nobody"},
+        {"email": "odd@example.com", "action": "merge"}
+    ]
+    if input_format == "csv":
+        text = "email,action,first_name,last_name\n" + "".join(
+            f"{row['email']},{row.get('action', '')},{row['first_name'] if 'first_name' in row else ''},{row.get('last_name', '')}\n"
+            for row in rows
+        )
+    else:
+        text = "".join(json.dumps(row) + "\n" for row in rows)
+
+    cognito = FakeCognito(existing=["old@example.com"])
+    results = sorted(
+        process_rows(read_rows(io.StringIO(text), input_format), cognito, "fake_user_pool_id", max_workers=2),
+        key=lambda result: result["row"]
+    )
+
+    assert [result["status"] for result in results] == ["created", "updated", "failed", "failed", "failed"]
+    assert results[2]["error"] == "UsernameExistsException"
+    assert results[3]["message"] == "Row has no email."
+    assert cognito.users["new@example.com"] == {
+        "email": "new@example.com", "custom:firstName": "Nina", "custom:lastName": "North"
+    }
+    assert cognito.users["old@example.com"] == {"custom:firstName": "Olga"}
+    create_call = next(kwargs for operation, kwargs in cognito.calls if operation == 'admin_create_user')
+    assert create_call["MessageAction"] == "SUPPRESS"
+
+def test_throttled_calls_are_retried():
+    """
+    Local rate limit shedding and AWS throttling both back off and retry instead of failing the row.
+    """
+    cognito = FakeCognito(failures={
+        'admin_create_user': [RateLimitExceeded("UserCreation", 0.01), TooManyRequestsException("Rate exceeded")]
+    })
+
+    results = list(process_rows(read_rows(csv_stream(3), "csv"), cognito, "fake_user_pool_id", max_workers=1))
+
+    assert [result["status"] for result in results] == ["created"] * 3
+    assert len(cognito.calls) == 5
+
+def test_rows_still_throttled_stay_pending_in_the_checkpoint(tmp_path):
+    """
+    A row that is still throttled after its retries is reported but not checkpointed, so
+    the next run applies it; a permanently failed row is checkpointed and not retried.
+    """
+    store = LocalObjectStore(str(tmp_path))
+    cognito = FakeCognito(failures={
+        'admin_create_user': [TooManyRequestsException("Rate exceeded")] * 6 + [ValueError("bad row")]
+    })
+
+    with patch("bulk_users.time.sleep"):
+        first_results = list(process_rows(
+            read_rows(csv_stream(3), "csv"), cognito, "fake_user_pool_id",
+            checkpoint=Checkpoint(store, "import.checkpoint.json"), max_workers=1
+        ))
+
+    # Rows that finish together are yielded in no set order.
+    assert sorted((result["row"], result["status"]) for result in first_results) == [(1, "throttled"), (2, "failed"), (3, "created")]
+    checkpoint = Checkpoint(store, "import.checkpoint.json")
+    assert [row for row in range(1, 4) if checkpoint.is_done(row)] == [2, 3]
+
+    second_results = list(process_rows(
+        read_rows(csv_stream(3), "csv"), cognito, "fake_user_pool_id", checkpoint=checkpoint, max_workers=1
+    ))
+
+    assert [(result["row"], result["status"]) for result in second_results] == [(1, "created")]
+    assert Checkpoint(store, "import.checkpoint.json").watermark == 3
+
+def test_concurrency_and_read_ahead_are_bounded():
+    """
+    No more than max_workers calls run at once and the input is only read a little ahead.
+    """
+    cognito = FakeCognito(latency=0.005)
+    consumed = 0
+
+    def rows():
+        nonlocal consumed
+        for row in read_rows(csv_stream(200), "csv"):
+            consumed += 1
+            yield row
+
+    results = process_rows(rows(), cognito, "fake_user_pool_id", max_workers=4)
+    for finished, _ in enumerate(results, start=1):
+        assert consumed <= finished + 4 * 2
+
+    assert finished == 200
+    assert 1 < cognito.max_active <= 4
+
+def test_interrupted_import_resumes_from_checkpoint(tmp_path):
+    """
+    A run stopped part-way saves its checkpoint; the next run only applies the remaining rows.
+    """
+    store = LocalObjectStore(str(tmp_path))
+    cognito = FakeCognito(latency=0.001)
+
+    first_run = process_rows(
+        read_rows(csv_stream(100), "csv"), cognito, "fake_user_pool_id",
+        checkpoint=Checkpoint(store, "import.checkpoint.json"), max_workers=4, save_every=10
+    )
+    first_results = [next(first_run) for _ in range(30)]
+    first_run.close()
+
+    checkpoint = Checkpoint(store, "import.checkpoint.json")
+    done = [row for row in range(1, 101) if checkpoint.is_done(row)]
+    assert len(done) == 30
+    assert {result["row"] for result in first_results} == set(done)
+
+    second_results = list(process_rows(
+        read_rows(csv_stream(100), "csv"), cognito, "fake_user_pool_id", checkpoint=checkpoint, max_workers=4
+    ))
+
+    assert len(second_results) == 70
+    assert {result["row"] for result in first_results + second_results} == set(range(1, 101))
+    # Rows in flight when the first run stopped are applied again and become updates.
+    assert {result["status"] for result in second_results} <= {"created", "updated"}
+    assert len(cognito.users) == 100
+    assert Checkpoint(store, "import.checkpoint.json").watermark == 100
+
+def test_throughput_under_cognito_rate_limit():
+    """
+    With the real limiter in front, the pipeline runs close to the UserCreation quota without failures.
+    """
+    limiters = RateLimiterRegistry.for_cognito()
+    cognito = FakeCognito(latency=0.002)
+
+    def call(operation, **kwargs):
+        return limiters.call(operation, lambda **kw: cognito(operation, **kw), **kwargs)
+
+    start_time = time.perf_counter()
+    out = io.BytesIO()
+    summary = write_results(process_rows(read_rows(csv_stream(150), "csv"), call, "fake_user_pool_id"), out)
+    elapsed = time.perf_counter() - start_time
+
+    rate = 150 / elapsed
+    print(f"[test_bulk_users] 150 rows in {elapsed:.2f}s ({rate * 3600:.0f} rows/hour)")
+    assert summary == {"created": 150}
+    assert len(out.getvalue().splitlines()) == 150
+    # UserCreation allows a burst of 50 then 50 requests per second (180,000 per hour):
+    # the last 100 rows need at least 2s, and the pipeline should not fall far behind that.
+    assert elapsed > 1.8
+    assert elapsed < 4.0
+
+def test_bulk_import_handler(tmp_path):
+    """
+    The Lambda entry point reads the file from the store, checkpoints next to it and feeds the caches.
+    """
+    store = LocalObjectStore(str(tmp_path))
+    store.put("imports/users.jsonl", b"".join(
+        (json.dumps({"email": f"user{i}@example.com", "first_name": f"First{i}"}) + "\n").encode("utf-8")
+        for i in range(5)
+    ))
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 300000
+
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, \
+         patch('index.S3ObjectStore', lambda bucket, s3: store):
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+
+        from index import bulk_import_handler, lambda_handler, unknown_users
+
+        unknown_users.add("user3@example.com")
+        result = bulk_import_handler({"bucket": "imports-bucket", "key": "imports/users.jsonl"}, context)
+
+        assert result["status"] == "complete"
+        assert result["summary"] == {"created": 5}
+        assert result["checkpoint"] == 5
+        assert mock_client.admin_create_user.call_count == 5
+        assert "user3@example.com" not in unknown_users
+        results = store.get(result["results_key"]).decode("utf-8").splitlines()
+        assert len(results) == 5
+
+        # Running the same job again, through the shared entry point, finds nothing left to do.
+        result = lambda_handler({"job": "bulk-import", "bucket": "imports-bucket", "key": "imports/users.jsonl"}, context)
+        assert result["summary"] == {}
+        assert mock_client.admin_create_user.call_count == 5
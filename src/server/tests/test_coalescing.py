@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import threading
+import time
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from negative_cache import NegativeCache
+from profile_cache import ProfileCache
+from single_flight import SingleFlight
+
+def run_concurrently(count, fn):
+    """
+    Start `count` threads running fn(i) at the same moment and return their results.
+    """
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        results[i] = fn(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def get_user_event(email):
+    return {"httpMethod": "GET", "path": "/user", "queryStringParameters": {"email": email}}
+
+@pytest.fixture
+def coalescing_index():
+    """
+    Mocks SSM and a slow Cognito admin_get_user, with fresh caches and a fresh route SingleFlight.
+    """
+    import index
+
+    flights = SingleFlight(on_done=index.record_coalescing)
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, \
+         patch('index.user_profiles', ProfileCache(ttl=60)), patch('index.unknown_users', NegativeCache()), \
+         patch('index.route_flights', flights):
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+        for name in ["UserNotFoundException", "InvalidParameterException", "TooManyRequestsException"]:
+            setattr(mock_client.exceptions, name, type(name, (Exception,), {}))
+
+        def admin_get_user(UserPoolId, Username):
+            time.sleep(0.1)
+            return {"UserAttributes": [{"Name": "email", "Value": Username}]}
+
+        mock_client.admin_get_user.side_effect = admin_get_user
+        yield index, mock_client, flights
+
+def test_identical_concurrent_gets_share_one_call(coalescing_index, capsys):
+    index, mock_client, flights = coalescing_index
+
+    responses = run_concurrently(8, lambda i: index.lambda_handler(get_user_event("same@example.com"), None))
+
+    assert mock_client.admin_get_user.call_count == 1
+    assert all(response["statusCode"] == 200 for response in responses)
+    assert len({json.loads(response["body"])["user_attributes"]["email"] for response in responses}) == 1
+    # Every caller gets its own response and headers objects.
+    assert len({id(response) for response in responses}) == 8
+    assert len({id(response["headers"]) for response in responses}) == 8
+
+    stats = flights.stats()
+    print(f"[test_coalescing] stats={stats}")
+    assert stats == {"requests": 8, "executions": 1, "coalesced": 7, "ratio": 8.0}
+
+    metric = json.loads(capsys.readouterr().out.splitlines()[0])
+    assert metric["Route"] == "/user"
+    assert (metric["Requests"], metric["Executions"], metric["CoalescedRequests"]) == (8, 1, 7)
+    assert {m["Name"] for m in metric["_aws"]["CloudWatchMetrics"][0]["Metrics"]} == {
+        "Requests", "Executions", "CoalescedRequests"
+    }
+
+def test_different_queries_are_not_coalesced(coalescing_index):
+    index, mock_client, flights = coalescing_index
+
+    responses = run_concurrently(4, lambda i: index.lambda_handler(get_user_event(f"user{i}@example.com"), None))
+
+    assert mock_client.admin_get_user.call_count == 4
+    assert [json.loads(response["body"])["user_attributes"]["email"] for response in responses] == [
+        f"user{i}@example.com" for i in range(4)
+    ]
+    assert flights.stats()["ratio"] == 1.0
+
+def test_non_get_routes_are_not_coalesced(coalescing_index):
+    index, mock_client, flights = coalescing_index
+    mock_client.admin_delete_user.side_effect = lambda **kwargs: time.sleep(0.05)
+
+    event = {"httpMethod": "DELETE", "path": "/user", "queryStringParameters": {"email": "same@example.com"}}
+    responses = run_concurrently(3, lambda i: index.lambda_handler(event, None))
+
+    assert all(response["statusCode"] == 200 for response in responses)
+    assert mock_client.admin_delete_user.call_count == 3
+    assert flights.stats()["executions"] == 0
+
+def test_coalesced_requests_after_completion_run_again(coalescing_index):
+    index, mock_client, _ = coalescing_index
+
+    # Sequential requests are not coalesced; the second one is served by get_user again.
+    index.lambda_handler(get_user_event("again@example.com"), None)
+    index.lambda_handler(get_user_event("again@example.com"), None)
+
+    assert mock_client.admin_get_user.call_count == 2
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import tracemalloc
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import compaction
+from benchmark_compaction import run_benchmark
+from compaction import Compactor, JsonLinesFormat, ledger_event_id, live_objects, partition_for
+from ledger import CsvGzipFormat, LedgerWriter
+from object_store import LocalObjectStore
+from user_erasure import AuditLog
+
+NOW = 1714564800.0  # 2024-05-01T12:00:00Z
+PARTITION = "ledger/donations/dt=2024-05-01/"
+
+def sale_event(i):
+    return {"id": f"WH-{i}", "event_type": "PAYMENT.SALE.COMPLETED",
+            "resource": {"id": f"SALE-{i}", "create_time": "2024-05-01T12:00:00Z", "amount": {"total": "10.00", "currency": "USD"}}}
+
+def write_batches(store, batches):
+    writer = LedgerWriter(store, fmt=CsvGzipFormat(), clock=lambda: NOW)
+    for batch in batches:
+        writer.write([sale_event(i) for i in batch])
+
+def read_ids(store, partition=PARTITION):
+    """Event ids of every row readers see, sorted; objects written in the same second have no set order."""
+    ids = []
+    for key in live_objects(store, partition):
+        with store.open_reader(key) as reader:
+            for batch in compaction.format_for_key(key).read_batches(reader):
+                ids.extend(row[0] for row in batch)
+    return sorted(ids, key=lambda event_id: int(event_id.split("-")[1]))
+
+def make_compactor(store, **options):
+    return Compactor(store, CsvGzipFormat(), key_of=ledger_event_id, clock=lambda: NOW, **options)
+
+def test_benchmark_shows_scan_reduction(tmp_path):
+    result = run_benchmark(str(tmp_path), days=3, batches_per_day=100, events_per_batch=5, fmt=CsvGzipFormat())
+    before, after = result["before"]["whole month"], result["after"]["whole month"]
+
+    print(f"[test_compaction] {before['objects']} -> {after['objects']} objects, {before['bytes']} -> {after['bytes']} bytes scanned, "
+          f"{before['rows']} -> {after['rows']} rows in {result['compaction']['seconds'] * 1000:.0f}ms")
+    assert after["objects"] == 3
+    assert after["bytes"] < before["bytes"] / 2
+    assert after["rows"] == after["events"] == before["events"] == 1500
+    assert after["total"] == before["total"]
+    assert result["compaction"]["duplicates_dropped"] == before["rows"] - 1500
+
+def test_partition_is_merged_without_duplicates(tmp_path):
+    store = LocalObjectStore(tmp_path)
+    write_batches(store, [range(i * 10, i * 10 + 10) for i in range(20)] + [[3, 57, 150]])
+
+    stats = make_compactor(store).compact(PARTITION)
+
+    assert stats == {"partition": PARTITION, "sources": 21, "outputs": 1, "rows_in": 203, "rows_out": 200}
+    assert read_ids(store) == [f"WH-{i}" for i in range(200)]
+    assert len(list(store.list(PARTITION))) == 2  # The compacted object and the manifest.
+
+    # Later writes are read alongside the compacted object, then merged into it next time.
+    write_batches(store, [[199, 200], [201]])
+    assert read_ids(store)[-3:] == ["WH-199", "WH-200", "WH-201"]
+    stats = make_compactor(store).compact(PARTITION)
+    assert (stats["sources"], stats["outputs"], stats["rows_out"]) == (3, 1, 202)
+    assert read_ids(store) == [f"WH-{i}" for i in range(202)]
+
+def test_small_partitions_are_left_alone(tmp_path):
+    store = LocalObjectStore(tmp_path)
+    write_batches(store, [range(5)])
+
+    assert make_compactor(store).compact(PARTITION)["sources"] == 0
+    assert make_compactor(store).compact("ledger/donations/dt=2024-05-02/")["sources"] == 0
+    assert read_ids(store) == [f"WH-{i}" for i in range(5)]
+
+def test_interrupted_compactions_never_show_duplicates(tmp_path):
+    store = LocalObjectStore(tmp_path)
+    write_batches(store, [range(i * 10, i * 10 + 10) for i in range(5)])
+    expected = [f"WH-{i}" for i in range(50)]
+
+    # Stopped before the manifest update: the new object is not read and is removed next time.
+    with patch.object(store, "put", side_effect=OSError("stopped")):
+        with pytest.raises(OSError):
+            make_compactor(store).compact(PARTITION)
+    assert len(list(store.list(PARTITION))) == 6
+    assert read_ids(store) == expected
+
+    # Stopped after the manifest update: the old objects are no longer read.
+    delete = store.delete
+
+    def delete_compacted_only(key):
+        if not compaction.is_compacted(key):
+            raise OSError("stopped")
+        delete(key)
+
+    with patch.object(store, "delete", side_effect=delete_compacted_only):
+        with pytest.raises(OSError):
+            make_compactor(store).compact(PARTITION)
+    assert len(list(store.list(PARTITION))) == 7
+    assert len(live_objects(store, PARTITION)) == 1
+    assert read_ids(store) == expected
+
+    assert make_compactor(store).compact(PARTITION)["sources"] == 0
+    assert len(list(store.list(PARTITION))) == 2
+    assert read_ids(store) == expected
+
+def test_failed_merge_leaves_no_outputs(tmp_path):
+    store = LocalObjectStore(tmp_path)
+    write_batches(store, [range(i * 10, i * 10 + 10) for i in range(5)])
+
+    with patch("compaction.format_for_key", side_effect=[CsvGzipFormat()] * 3 + [ValueError("corrupt object")]):
+        with pytest.raises(ValueError):
+            make_compactor(store, max_rows_per_file=10).compact(PARTITION)
+
+    assert not any(compaction.is_compacted(key) for key in store.list(PARTITION))
+    assert read_ids(store) == [f"WH-{i}" for i in range(50)]
+
+def test_memory_stays_bounded(tmp_path):
+    store = LocalObjectStore(tmp_path)
+    line = json.dumps({"subject": "a" * 64, "outcome": "deleted", "erased_at": "2024-05-01T12:00:00+00:00"}).encode() + b"\n"
+    for i in range(100):
+        store.put(f"logs/dt=2024-05-01/{i:04d}.ndjson", line * 1000)
+    total = 100 * 1000 * len(line)
+
+    compactor = Compactor(store, JsonLinesFormat(), max_rows_per_file=40000, batch_size=1000)
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    stats = compactor.compact("logs/dt=2024-05-01/")
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"[test_compaction] {total} bytes in 100 objects compacted in {elapsed * 1000:.0f}ms, peak memory {peak} bytes")
+    assert (stats["sources"], stats["outputs"], stats["rows_out"]) == (100, 3, 100000)
+    assert peak < total / 4
+
+def test_audit_log_partitions_are_compacted(tmp_path):
+    store = LocalObjectStore(tmp_path)
+    audit = AuditLog(store, "audit", job_id="job-1")
+    for i in range(5):
+        audit.record(f"user{i}@example.com", "deleted")
+        audit.flush()
+
+    partition = partition_for("audit", time.strftime("%Y-%m-%d", time.gmtime()))
+    assert len(live_objects(store, partition)) == 5
+    assert compaction.log_compactor(store).compact(partition)["outputs"] == 1
+
+    records = []
+    for key in live_objects(store, partition):
+        with store.open_reader(key) as reader:
+            records.extend(json.loads(line) for batch in JsonLinesFormat().read_batches(reader) for line in batch)
+    assert len(records) == 5 and {record["job_id"] for record in records} == {"job-1"}
+
+def test_scheduled_compaction(tmp_path):
+    store = LocalObjectStore(tmp_path / "ledger-bucket")
+    write_batches(store, [range(i * 10, i * 10 + 10) for i in range(4)])
+
+    with patch("index.S3ObjectStore", lambda bucket, client: LocalObjectStore(tmp_path / bucket)), \
+         patch("compaction.ledger.default_format", CsvGzipFormat), \
+         patch.dict(os.environ, {"LEDGER_BUCKET": "ledger-bucket"}):
+        from index import lambda_handler
+        event = {"source": "aws.events", "detail-type": "Scheduled Event", "dates": ["2024-05-01"],
+                 "resources": ["arn:aws:events:us-west-1:123456789012:rule/rcw-client-backend-dev-compaction"]}
+        result = lambda_handler(event, None)
+
+    assert [(item["partition"], item["sources"], item["outputs"]) for item in result["partitions"]] == [(PARTITION, 4, 1)]
+    assert read_ids(store) == [f"WH-{i}" for i in range(40)]
+
+def test_command_line(tmp_path, capsys):
+    store = LocalObjectStore(tmp_path)
+    write_batches(store, [range(i * 10, i * 10 + 10) for i in range(3)])
+
+    with patch("compaction.ledger.default_format", CsvGzipFormat):
+        assert compaction.main(["--root", str(tmp_path), "--date", "2024-05-01", "--date", "2024-05-02"]) == 0
+
+    output = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(item["partition"], item["sources"]) for item in output] == [(PARTITION, 3), ("ledger/donations/dt=2024-05-02/", 0)]
+    assert read_ids(store) == [f"WH-{i}" for i in range(30)]
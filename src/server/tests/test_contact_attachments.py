@@ -0,0 +1,155 @@
+import base64
+import os
+import sys
+import time
+import json
+import boto3
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from urllib.parse import parse_qs, urlsplit
+from attachments import ATTACHMENT_PREFIX, MAX_ATTACHMENTS, download_link, presigned_upload, safe_filename, validate_attachment_keys
+from contact_guard import ContactGuard
+from queues import LocalQueue
+
+# A real client with dummy credentials: presigning is done locally, so no request reaches AWS.
+s3_client = boto3.client("s3", region_name="us-west-1", aws_access_key_id="AKIDEXAMPLE", aws_secret_access_key="secret")
+
+@pytest.fixture
+def attachment_setup():
+    """
+    Patches SES, SSM, S3, the sender/recipient lookups, the link secret, the contact guard
+    and the attachment bucket.
+    """
+    with patch("index.ses") as mock_ses, patch('index.ssm') as mock_ssm, patch("index.s3", s3_client), \
+         patch("index.get_sender_email", return_value="noreply@example.com"), \
+         patch("index.get_recipient_email", return_value="office@example.com"), \
+         patch("index.get_attachment_link_secret", return_value="link-secret"), \
+         patch("index.contact_guard", ContactGuard()), \
+         patch.dict(os.environ, {"CONTACT_ATTACHMENT_BUCKET": "attachments-bucket", "API_BASE_URL": "https://api.example.org/"}):
+        mock_ses.exceptions = type("mock_exceptions", (), {})()
+        mock_ses.exceptions.MessageRejected = type("MessageRejected", (Exception,), {})
+        mock_ses.exceptions.MailFromDomainNotVerifiedException = type("MailFromDomainNotVerifiedException", (Exception,), {})
+        mock_ses.exceptions.ConfigurationSetDoesNotExistException = type("ConfigurationSetDoesNotExistException", (Exception,), {})
+        yield mock_ses, mock_ssm
+
+@pytest.mark.parametrize("filename, expected", [
+    ("request.pdf", "request.pdf"),
+    ("../../etc/passwd", "passwd"),
+    ("C:\\Users\\me\\My Letter (1).docx", "My-Letter-1-.docx"),
+    ("", "attachment"),
+])
+def test_safe_filename(filename, expected):
+    assert safe_filename(filename) == expected
+
+def test_presigned_upload_pins_type_and_size():
+    upload = presigned_upload(s3_client, "attachments-bucket", "Benevolence request.pdf", "application/pdf", 1024)
+
+    assert upload["key"].startswith(ATTACHMENT_PREFIX) and upload["key"].endswith("/Benevolence-request.pdf")
+    assert upload["fields"]["key"] == upload["key"]
+    assert upload["fields"]["Content-Type"] == "application/pdf"
+    policy = json.loads(base64.b64decode(upload["fields"]["policy"]))
+    assert ["content-length-range", 1, 1024] in policy["conditions"]
+    assert validate_attachment_keys([upload["key"]]) == [upload["key"]]
+
+    with pytest.raises(ValueError):
+        presigned_upload(s3_client, "attachments-bucket", "run.exe", "application/x-msdownload", 1024)
+
+@pytest.mark.parametrize("keys", [
+    ["uploads/secret.pdf"],
+    [ATTACHMENT_PREFIX + "2024/05/01/../../secret.pdf"],
+    [ATTACHMENT_PREFIX + "2024/05/01/" + "a" * 32 + "/x.pdf"] * (MAX_ATTACHMENTS + 1),
+    "not-a-list",
+])
+def test_invalid_keys_are_rejected(keys):
+    with pytest.raises(ValueError):
+        validate_attachment_keys(keys)
+
+def test_attachment_route_latency_is_independent_of_size(attachment_setup):
+    from index import lambda_handler
+
+    event = {"httpMethod": "POST", "path": "/contact-us/attachments",
+             "body": json.dumps({"filename": "scan.png", "content_type": "image/png"})}
+
+    start_time = time.perf_counter()
+    responses = [lambda_handler(event, None) for _ in range(50)]
+    elapsed = time.perf_counter() - start_time
+
+    print(f"[test_contact_attachments] 50 presigned uploads in {elapsed * 1000:.1f}ms")
+    assert all(response["statusCode"] == 200 for response in responses)
+    body = json.loads(responses[0]["body"])
+    assert body["url"] == "https://attachments-bucket.s3.amazonaws.com/"
+    assert body["max_bytes"] == 10 * 1024 * 1024
+    assert len({json.loads(response["body"])["key"] for response in responses}) == 50
+
+def test_attachment_route_validation(attachment_setup):
+    from index import create_contact_attachment_route
+
+    assert create_contact_attachment_route("scan.png", None)["statusCode"] == 400
+    assert create_contact_attachment_route("virus.exe", "application/x-msdownload")["statusCode"] == 400
+    with patch.dict(os.environ, {"CONTACT_ATTACHMENT_BUCKET": ""}):
+        assert create_contact_attachment_route("scan.png", "image/png")["statusCode"] == 500
+
+def test_contact_us_links_attachments(attachment_setup):
+    mock_ses, _ = attachment_setup
+    from index import contact_us
+
+    key = presigned_upload(s3_client, "attachments-bucket", "letter.pdf", "application/pdf", 1024)["key"]
+    response = contact_us("John", "john@example.com", "Please see the letter.", attachment_keys=[key])
+
+    assert response["statusCode"] == 200
+    text = mock_ses.send_email.call_args.kwargs["Message"]["Body"]["Text"]["Data"]
+    assert "Attachments:\n- letter.pdf: https://api.example.org/contact-us/attachments/download?" in text
+    link = text.split("- letter.pdf: ", 1)[1].split()[0]
+    assert parse_qs(urlsplit(link).query)["key"] == [key]
+
+    assert contact_us("John", "john@example.com", "Hi", attachment_keys=["../secret.pdf"])["statusCode"] == 400
+    assert mock_ses.send_email.call_count == 1
+
+def test_queued_message_keeps_attachments(attachment_setup):
+    mock_ses, _ = attachment_setup
+    queue = LocalQueue()
+    key = presigned_upload(s3_client, "attachments-bucket", "letter.pdf", "application/pdf", 1024)["key"]
+
+    with patch("index.contact_queue", queue), patch("index.ses_send_limiter", None), \
+         patch.dict(os.environ, {"CONTACT_US_MODE": "queue", "SES_MAX_SEND_RATE": "50"}):
+        from index import contact_us, deliver_contact_messages
+
+        assert contact_us("John", "john@example.com", "See attached.", attachment_keys=[key])["statusCode"] == 202
+        assert deliver_contact_messages(queue.receive()) == []
+
+    assert "- letter.pdf: https://api.example.org/contact-us/attachments/download?" in mock_ses.send_email.call_args.kwargs["Message"]["Body"]["Text"]["Data"]
+
+def download_event(link):
+    query = {name: values[0] for name, values in parse_qs(urlsplit(link).query).items()}
+    return {"httpMethod": "GET", "path": "/contact-us/attachments/download", "queryStringParameters": query}
+
+def test_download_route_redirects_to_a_fresh_short_lived_url(attachment_setup):
+    from index import lambda_handler
+
+    key = presigned_upload(s3_client, "attachments-bucket", "letter.pdf", "application/pdf", 1024)["key"]
+    link = download_link("https://api.example.org", "link-secret", key, time.time() + 7 * 24 * 3600)
+
+    response = lambda_handler(download_event(link), None)
+
+    assert response["statusCode"] == 302
+    location = response["headers"]["Location"]
+    assert location.startswith("https://attachments-bucket.s3.amazonaws.com/" + key)
+    assert int(parse_qs(urlsplit(location).query)["Expires"][0]) <= time.time() + 300
+
+@pytest.mark.parametrize("tamper", ["expired", "signature", "key"])
+def test_download_route_rejects_bad_links(attachment_setup, tamper):
+    from index import lambda_handler
+
+    key = presigned_upload(s3_client, "attachments-bucket", "letter.pdf", "application/pdf", 1024)["key"]
+    expires_at = time.time() - 1 if tamper == "expired" else time.time() + 3600
+    link = download_link("https://api.example.org", "other-secret" if tamper == "signature" else "link-secret", key, expires_at)
+    if tamper == "key":
+        link = link.replace("letter.pdf", "other.pdf")
+
+    response = lambda_handler(download_event(link), None)
+
+    assert response["statusCode"] == 403
+    assert "Location" not in response["headers"]
@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from contact_guard import ContactGuard, DynamoDBCounterStore, MemoryCounterStore, SlidingWindowLimiter
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+ConditionalCheckFailedException = type("ConditionalCheckFailedException", (Exception,), {})
+
+class FakeDynamoDB:
+    """
+    Implements the conditional reset, UpdateItem ADD, GetItem and DeleteItem calls DynamoDBCounterStore makes.
+    """
+    def __init__(self):
+        self.items = {}
+        self.exceptions = type("exceptions", (), {"ConditionalCheckFailedException": ConditionalCheckFailedException})
+
+    def update_item(self, TableName, Key, ExpressionAttributeValues, ConditionExpression=None, **kwargs):
+        item = self.items.get(Key['pk']['S'])
+        if ConditionExpression:
+            if item and int(item['expires_at']['N']) > int(ExpressionAttributeValues[':now']['N']):
+                raise ConditionalCheckFailedException("The conditional request failed")
+            self.items[Key['pk']['S']] = {'count': {'N': '1'}, 'expires_at': ExpressionAttributeValues[':expires_at']}
+            return {}
+        item['count'] = {'N': str(int(item['count']['N']) + 1)}
+        return {'Attributes': {'count': item['count']}}
+
+    def get_item(self, TableName, Key):
+        item = self.items.get(Key['pk']['S'])
+        return {'Item': item} if item else {}
+
+    def delete_item(self, TableName, Key):
+        self.items.pop(Key['pk']['S'], None)
+
+@pytest.fixture
+def guard_setup():
+    """
+    Patches SES, SSM, the sender/recipient lookups and the contact guard.
+    """
+    clock = FakeClock()
+    guard = ContactGuard(per_email=(3, 3600), per_ip=(5, 3600), clock=clock)
+    with patch("index.ses") as mock_ses, patch('index.ssm') as mock_ssm, \
+         patch("index.get_sender_email", return_value="noreply@example.com"), \
+         patch("index.get_recipient_email", return_value="office@example.com"), \
+         patch("index.contact_guard", guard):
+        mock_ses.exceptions = type("mock_exceptions", (), {})()
+        mock_ses.exceptions.MessageRejected = type("MessageRejected", (Exception,), {})
+        mock_ses.exceptions.MailFromDomainNotVerifiedException = type("MailFromDomainNotVerifiedException", (Exception,), {})
+        mock_ses.exceptions.ConfigurationSetDoesNotExistException = type("ConfigurationSetDoesNotExistException", (Exception,), {})
+        yield mock_ses, mock_ssm, clock
+
+def test_sliding_window_weights_previous_window():
+    clock = FakeClock(0.0)
+    limiter = SlidingWindowLimiter(4, 60, MemoryCounterStore(clock=clock), clock=clock)
+
+    assert all(limiter.hit("a")[0] for _ in range(4))
+    assert limiter.hit("a")[0] is False
+    assert limiter.hit("b")[0] is True
+
+    # Halfway through the next window, half of the previous window's 5 hits still count.
+    clock.now = 90.0
+    assert limiter.hit("a") == (True, 0.0)
+    assert limiter.hit("a")[0] is False
+
+    # Once the previous window has slid out completely, the key starts over.
+    clock.now = 180.0
+    assert all(limiter.hit("a")[0] for _ in range(4))
+
+def test_duplicates_are_detected_within_the_window():
+    clock = FakeClock()
+    guard = ContactGuard(dedup_window=600, clock=clock)
+
+    assert guard.check("John", "john@example.com", "Hello!")[0] == "ok"
+    # Case and whitespace differences do not make a new message.
+    assert guard.check("john", " JOHN@example.com", "Hello!  ")[0] == "duplicate"
+    assert guard.check("John", "john@example.com", "Hello again!")[0] == "ok"
+
+    clock.now += 601
+    assert guard.check("John", "john@example.com", "Hello!")[0] == "ok"
+
+def test_ip_limit_applies_across_senders():
+    guard = ContactGuard(per_email=(10, 3600), per_ip=(3, 3600), clock=FakeClock())
+
+    decisions = [guard.check(f"Bot{i}", f"bot{i}@example.com", "Buy now", "203.0.113.9")[0] for i in range(5)]
+    assert decisions == ["ok", "ok", "ok", "limited", "limited"]
+    assert guard.check("Ann", "ann@example.com", "Buy now", "198.51.100.1")[0] == "ok"
+
+def test_dynamodb_store_shares_limits_between_guards():
+    table = FakeDynamoDB()
+    clock = FakeClock()
+    first = ContactGuard(store=DynamoDBCounterStore("contact-guard", table, clock=clock), per_email=(2, 3600), clock=clock)
+    second = ContactGuard(store=DynamoDBCounterStore("contact-guard", table, clock=clock), per_email=(2, 3600), clock=clock)
+
+    assert first.check("John", "john@example.com", "One")[0] == "ok"
+    assert second.check("John", "john@example.com", "One")[0] == "duplicate"
+    assert second.check("John", "john@example.com", "Two")[0] == "ok"
+    assert first.check("John", "john@example.com", "Three")[0] == "limited"
+
+def test_dynamodb_counters_restart_once_expired():
+    table = FakeDynamoDB()
+    clock = FakeClock()
+    store = DynamoDBCounterStore("contact-guard", table, clock=clock)
+
+    assert [store.increment("key", ttl=60) for _ in range(3)] == [1, 2, 3]
+    # TTL deletion can lag by days; the expired item must not keep counting.
+    clock.now += 61
+    assert "key" in table.items and store.get("key") == 0
+    assert store.increment("key", ttl=60) == 1
+    assert store.get("key") == 1
+
+def test_duplicate_returns_success_without_ses_or_ssm(guard_setup):
+    mock_ses, mock_ssm, _ = guard_setup
+    from index import contact_us
+
+    assert contact_us("John", "john@example.com", "Hello!")["statusCode"] == 200
+    response = contact_us("John", "john@example.com", "Hello!")
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["message"] == "Message sent successfully."
+    assert mock_ses.send_email.call_count == 1
+
+def test_flood_is_rejected_quickly(guard_setup):
+    mock_ses, mock_ssm, _ = guard_setup
+    from index import contact_us
+
+    start_time = time.perf_counter()
+    statuses = [contact_us("Bot", "bot@example.com", f"Spam {i}", "203.0.113.9")["statusCode"] for i in range(200)]
+    elapsed = time.perf_counter() - start_time
+
+    print(f"[test_contact_guard] 200 submissions screened in {elapsed * 1000:.1f}ms")
+    assert statuses[:3] == [200, 200, 200]
+    assert set(statuses[3:]) == {429}
+    assert mock_ses.send_email.call_count == 3
+    mock_ssm.get_parameter.assert_not_called()
+    assert "minutes" in json.loads(contact_us("Bot", "bot@example.com", "Spam again")["body"])["message"]
+    assert elapsed < 1.0
+
+def test_failed_send_can_be_retried(guard_setup):
+    mock_ses, _, _ = guard_setup
+    from index import contact_us
+
+    mock_ses.send_email.side_effect = [mock_ses.exceptions.MessageRejected("rejected"), {"MessageId": "1"}]
+
+    assert contact_us("John", "john@example.com", "Hello!")["statusCode"] == 400
+    assert contact_us("John", "john@example.com", "Hello!")["statusCode"] == 200
+    assert mock_ses.send_email.call_count == 2
+
+def test_lambda_handler_passes_source_ip(guard_setup):
+    mock_ses, _, _ = guard_setup
+    from index import lambda_handler
+
+    def event(i):
+        return {
+            "httpMethod": "POST",
+            "path": "/contact-us",
+            "body": json.dumps({"first_name": f"Bot{i}", "email": f"bot{i}@example.com", "message": "Hi"}),
+            "requestContext": {"identity": {"sourceIp": "203.0.113.9"}}
+        }
+
+    statuses = [lambda_handler(event(i), None)["statusCode"] for i in range(7)]
+    assert statuses == [200] * 5 + [429] * 2
+    assert mock_ses.send_email.call_count == 5
@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from contact_guard import ContactGuard
+from queues import LocalQueue, SQSQueue
+
+MessageRejected = type("MessageRejected", (Exception,), {})
+
+@pytest.fixture
+def contact_setup():
+    """
+    Patches SES, SSM, the sender/recipient lookups, the contact queue, the SES send limiter and the contact guard.
+    """
+    queue = LocalQueue()
+    with patch("index.ses") as mock_ses, patch('index.ssm') as mock_ssm, \
+         patch("index.get_sender_email", return_value="noreply@example.com"), \
+         patch("index.get_recipient_email", return_value="office@example.com"), \
+         patch("index.contact_queue", queue), patch("index.ses_send_limiter", None), \
+         patch("index.contact_guard", ContactGuard()), \
+         patch.dict(os.environ, {"CONTACT_US_MODE": "queue", "SES_MAX_SEND_RATE": "50"}):
+        mock_ses.exceptions = type("mock_exceptions", (), {})()
+        mock_ses.exceptions.MessageRejected = MessageRejected
+        mock_ses.exceptions.MailFromDomainNotVerifiedException = type("MailFromDomainNotVerifiedException", (Exception,), {})
+        mock_ses.exceptions.ConfigurationSetDoesNotExistException = type("ConfigurationSetDoesNotExistException", (Exception,), {})
+        yield mock_ses, mock_ssm, queue
+
+def test_queue_mode_returns_202_without_touching_ses(contact_setup):
+    mock_ses, mock_ssm, queue = contact_setup
+    mock_ses.send_email.side_effect = lambda **kwargs: time.sleep(1)
+
+    from index import contact_us
+
+    start_time = time.perf_counter()
+    response = contact_us("John", "john@example.com", "Hello!")
+    elapsed = time.perf_counter() - start_time
+
+    print(f"[test_contact_queue] enqueue time={elapsed * 1000:.2f}ms")
+    assert response["statusCode"] == 202
+    assert elapsed < 0.05, "Enqueueing took too long!"
+    mock_ses.send_email.assert_not_called()
+    mock_ssm.get_parameter.assert_not_called()
+
+    message = queue.receive()[0]
+    assert {key: message.body[key] for key in ("first_name", "email", "message")} == {
+        "first_name": "John", "email": "john@example.com", "message": "Hello!"
+    }
+
+def test_queue_mode_still_validates(contact_setup):
+    _, _, queue = contact_setup
+
+    from index import contact_us
+
+    assert contact_us("John", "", "Hello!")["statusCode"] == 400
+    assert len(queue) == 0
+
+def test_missing_queue_url_fails_in_lambda(contact_setup):
+    """
+    A deployed function without CONTACT_QUEUE_URL answers 500 instead of queueing in memory and losing the message.
+    """
+    from index import contact_us
+
+    with patch("index.contact_queue", None), \
+         patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "rcw-client-backend-dev"}):
+        os.environ.pop("CONTACT_QUEUE_URL", None)
+        response = contact_us("John", "john@example.com", "Hello!")
+
+    assert response["statusCode"] == 500
+    # The failed submission does not count as a duplicate of the retry.
+    assert contact_us("John", "john@example.com", "Hello!")["statusCode"] == 202
+
+def test_worker_drains_queue(contact_setup):
+    mock_ses, _, queue = contact_setup
+
+    def send_email(**kwargs):
+        text = kwargs["Message"]["Body"]["Text"]["Data"]
+        if "reject me" in text:
+            raise MessageRejected("Email address is not verified.")
+        if "fail me" in text:
+            raise RuntimeError("SES is down")
+
+    mock_ses.send_email.side_effect = send_email
+
+    from index import contact_email_worker, contact_us
+
+    for i in range(23):
+        contact_us(f"Sender{i}", f"sender{i}@example.com", f"Message {i}")
+    contact_us("Rex", "rex@example.com", "reject me")
+    contact_us("Fay", "fay@example.com", "fail me")
+
+    result = contact_email_worker({}, None)
+
+    assert result == {"sent": 24, "failed": 1}
+    assert mock_ses.send_email.call_count == 25
+    sent_to = mock_ses.send_email.call_args.kwargs["Destination"]["ToAddresses"]
+    assert sent_to == ["office@example.com"]
+    # Only the failed message is left, invisible until its visibility timeout passes.
+    assert len(queue) == 1
+    assert queue.receive() == []
+
+def test_worker_paces_sends_to_ses_rate(contact_setup):
+    mock_ses, _, _ = contact_setup
+
+    from index import contact_email_worker, contact_us
+
+    with patch.dict(os.environ, {"SES_MAX_SEND_RATE": "20"}):
+        for i in range(40):
+            contact_us(f"Sender{i}", f"sender{i}@example.com", f"Message {i}")
+
+        start_time = time.perf_counter()
+        result = contact_email_worker({}, None)
+        elapsed = time.perf_counter() - start_time
+
+    print(f"[test_contact_queue] 40 messages at 20/s in {elapsed:.2f}s")
+    assert result == {"sent": 40, "failed": 0}
+    # A one-second burst of 20, then 20 more at 20 per second.
+    assert 0.9 < elapsed < 2.0
+
+def test_worker_sqs_event_reports_failures(contact_setup):
+    mock_ses, _, _ = contact_setup
+    mock_ses.send_email.side_effect = [None, RuntimeError("SES is down"), MessageRejected("Rejected")]
+
+    from index import contact_email_worker
+
+    records = [
+        {"messageId": f"m{i}", "receiptHandle": f"r{i}",
+         "body": json.dumps({"first_name": "A", "email": "a@example.com", "message": f"Message {i}"})}
+        for i in range(3)
+    ]
+    records.append({"messageId": "m3", "receiptHandle": "r3", "body": "not json"})
+
+    with patch("index.CONTACT_WORKER_MAX_WORKERS", 1):
+        response = contact_email_worker({"Records": records}, None)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+    assert mock_ses.send_email.call_count == 3
+
+def test_sqs_queue_uses_batch_deletes():
+    sqs = MagicMock()
+    sqs.send_message.return_value = {"MessageId": "id-1"}
+    sqs.receive_message.return_value = {"Messages": [
+        {"MessageId": f"id-{i}", "ReceiptHandle": f"handle-{i}", "Body": json.dumps({"n": i})} for i in range(10)
+    ]}
+    queue = SQSQueue("https://sqs.example.com/queue", sqs)
+
+    assert queue.send({"n": 1}) == "id-1"
+    assert json.loads(sqs.send_message.call_args.kwargs["MessageBody"]) == {"n": 1}
+
+    messages = queue.receive(max_messages=25)
+    assert sqs.receive_message.call_args.kwargs["MaxNumberOfMessages"] == 10
+    assert [message.body["n"] for message in messages] == list(range(10))
+
+    queue.delete(messages + messages[:2])
+    assert sqs.delete_message_batch.call_count == 2
+    assert len(sqs.delete_message_batch.call_args_list[0].kwargs["Entries"]) == 10
+
+def test_local_queue_redelivers_after_visibility_timeout():
+    now = [0.0]
+    queue = LocalQueue(visibility_timeout=30, clock=lambda: now[0])
+    queue.send({"n": 1})
+
+    first = queue.receive()
+    assert [message.body for message in first] == [{"n": 1}]
+    assert queue.receive() == []
+
+    now[0] = 31
+    again = queue.receive()
+    assert [message.message_id for message in again] == [first[0].message_id]
+    queue.delete(again)
+    assert len(queue) == 0
@@ -7,6 +7,8 @@ from unittest.mock import patch
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from contact_guard import ContactGuard
+
 class MockSESContainer:
     """
     A small container to hold all the mocks from the fixture,
@@ -21,13 +23,14 @@ class MockSESContainer:
 @pytest.fixture
 def mock_ses_client():
     """
-    Fixture that patches index.ses plus ssm, get_sender_email, get_recipient_email.
+    Fixture that patches index.ses plus ssm, get_sender_email, get_recipient_email and the contact guard.
     Returns a MockSESContainer with .ses, .ssm, .sender, .recipient references.
     """
     with patch("index.ses") as mock_ses, \
          patch('index.ssm') as mock_ssm, \
          patch("index.get_sender_email") as mock_sender, \
-         patch("index.get_recipient_email") as mock_recipient:
+         patch("index.get_recipient_email") as mock_recipient, \
+         patch("index.contact_guard", ContactGuard()):
 
         # Mock SSM to return a fake user pool ID
         mock_ssm.get_parameter.return_value = {
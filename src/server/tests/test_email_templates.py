@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from email_templates import (
+    MAX_BULK_DESTINATIONS, TEMPLATES, CompiledTemplate, EmailTemplate,
+    send_bulk_templated, send_templated, sync_templates
+)
+
+TemplateDoesNotExistException = type("TemplateDoesNotExistException", (Exception,), {})
+
+def make_ses():
+    ses = MagicMock()
+    ses.exceptions.TemplateDoesNotExistException = TemplateDoesNotExistException
+    return ses
+
+def test_compiled_template_renders_and_escapes():
+    template = CompiledTemplate("Hello {{ name }}, you owe {{amount}}. Bye {{name}}!")
+    assert template.parts == ["Hello ", ", you owe ", ". Bye ", "!"]
+    assert template.fields == ["name", "amount", "name"]
+    assert template.render({"name": "Ann", "amount": 5}) == "Hello Ann, you owe 5. Bye Ann!"
+
+    escaped = CompiledTemplate("<p>{{name}}</p>", escape=True)
+    assert escaped.render({"name": "<b>Ann</b>"}) == "<p>&lt;b&gt;Ann&lt;/b&gt;</p>"
+
+    with pytest.raises(ValueError, match="amount"):
+        template.render({"name": "Ann"})
+
+def test_contact_us_template_matches_previous_body():
+    message = TEMPLATES["contact-us"].message({"first_name": "John", "email": "john@example.com", "message": "Hi"})
+    assert message == {
+        "Subject": {"Data": "Contact Us Form Submission"},
+        "Body": {"Text": {"Data": "Name: John\nEmail: john@example.com\nMessage: Hi"}}
+    }
+
+def test_render_is_fast():
+    template = TEMPLATES["donation-receipt"]
+    data = {"first_name": "Ann", "amount": "25.00", "currency": "USD", "date": "2024-01-01", "reference": "ABC"}
+
+    start_time = time.perf_counter()
+    for _ in range(10000):
+        template.render(data)
+    per_render = (time.perf_counter() - start_time) / 10000
+
+    print(f"[test_email_templates] per-render time={per_render * 1e6:.1f}us")
+    assert per_render < 0.0005, "Rendering took too long!"
+
+def test_sync_templates_only_writes_changes():
+    ses = make_ses()
+    current = EmailTemplate("current", "Hi", "Hello {{name}}")
+    stale = EmailTemplate("stale", "Hi", "Hello {{name}}", html_part="<p>{{name}}</p>")
+    missing = EmailTemplate("missing", "Hi", "Hello")
+    stored = {
+        "env-current": current.ses_definition("env-"),
+        "env-stale": {"TemplateName": "env-stale", "SubjectPart": "Hi", "TextPart": "Hello {{name}}"}
+    }
+
+    def get_template(TemplateName):
+        if TemplateName not in stored:
+            raise TemplateDoesNotExistException(TemplateName)
+        return {"Template": stored[TemplateName]}
+
+    ses.get_template.side_effect = get_template
+
+    outcomes = sync_templates(ses, [current, stale, missing], prefix="env-")
+
+    assert outcomes == {"current": "unchanged", "stale": "updated", "missing": "created"}
+    ses.update_template.assert_called_once_with(Template=stale.ses_definition("env-"))
+    ses.create_template.assert_called_once_with(Template=missing.ses_definition("env-"))
+
+def test_send_templated_checks_data_first():
+    ses = make_ses()
+    ses.send_templated_email.return_value = {"MessageId": "message-1"}
+    template = TEMPLATES["notice"]
+
+    with pytest.raises(ValueError):
+        send_templated(ses, template, "noreply@example.com", ["a@example.com"], {"first_name": "Ann"})
+    ses.send_templated_email.assert_not_called()
+
+    data = {"first_name": "Ann", "subject": "Service times", "body": "We now meet at 10am."}
+    assert send_templated(ses, template, "noreply@example.com", ["a@example.com"], data, prefix="env-") == "message-1"
+    kwargs = ses.send_templated_email.call_args.kwargs
+    assert kwargs["Template"] == "env-notice"
+    assert json.loads(kwargs["TemplateData"]) == data
+
+def test_send_bulk_templated_uses_50_destinations_per_call():
+    ses = make_ses()
+    ses.send_bulk_templated_email.side_effect = lambda **kwargs: {
+        "Status": [{"Status": "Success", "MessageId": f"m-{i}"} for i in range(len(kwargs["Destinations"]))]
+    }
+    destinations = ((f"user{i}@example.com", {"first_name": f"User{i}"}) for i in range(120))
+
+    results = list(send_bulk_templated(
+        ses, TEMPLATES["notice"], "noreply@example.com", destinations,
+        default_data={"subject": "Service times", "body": "We now meet at 10am."}
+    ))
+
+    assert len(results) == 120
+    assert results[51] == ("user51@example.com", {"Status": "Success", "MessageId": "m-1"})
+    calls = ses.send_bulk_templated_email.call_args_list
+    assert [len(call.kwargs["Destinations"]) for call in calls] == [MAX_BULK_DESTINATIONS, MAX_BULK_DESTINATIONS, 20]
+    assert json.loads(calls[0].kwargs["DefaultTemplateData"])["subject"] == "Service times"
+    assert json.loads(calls[0].kwargs["Destinations"][1]["ReplacementTemplateData"]) == {"first_name": "User1"}
+
+def test_sync_email_templates_route():
+    with patch("index.ses", make_ses()) as mock_ses, patch("index.require_admin", return_value=None), \
+         patch.dict(os.environ, {"ENVIRONMENT": "prod"}):
+        mock_ses.get_template.side_effect = TemplateDoesNotExistException("missing")
+
+        from index import lambda_handler
+
+        response = lambda_handler({"httpMethod": "POST", "path": "/admin/email-templates/sync", "body": "{}"}, None)
+
+        assert response["statusCode"] == 200
+        assert json.loads(response["body"])["templates"] == {name: "created" for name in TEMPLATES}
+        names = [call.kwargs["Template"]["TemplateName"] for call in mock_ses.create_template.call_args_list]
+        assert names == [f"rcw-client-backend-prod-{name}" for name in TEMPLATES]
@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import json
+import subprocess
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from event_router import EventRouter, UnroutableEvent, event_kind
+from queues import LocalQueue
+
+QUEUE_ARN = "arn:aws:sqs:us-west-1:123456789012:{}"
+
+def sqs_event(queue, bodies):
+    return {"Records": [
+        {"messageId": f"msg-{i}", "receiptHandle": f"rh-{i}", "body": json.dumps(body),
+         "eventSource": "aws:sqs", "eventSourceARN": QUEUE_ARN.format(queue)}
+        for i, body in enumerate(bodies)
+    ]}
+
+def sns_event(topic, messages):
+    return {"Records": [
+        {"EventSource": "aws:sns", "Sns": {"MessageId": f"sns-{i}", "TopicArn": QUEUE_ARN.format(topic).replace(":sqs:", ":sns:"),
+                                            "Message": json.dumps(message)}}
+        for i, message in enumerate(messages)
+    ]}
+
+def schedule_event(rule):
+    return {"source": "aws.events", "detail-type": "Scheduled Event",
+            "resources": [f"arn:aws:events:us-west-1:123456789012:rule/{rule}"], "detail": {}}
+
+@pytest.mark.parametrize("event, expected", [
+    ({"httpMethod": "GET", "path": "/user"}, "http"),
+    (sqs_event("jobs", [{}]), "sqs"),
+    (sns_event("alerts", [{}]), "sns"),
+    (schedule_event("nightly"), "schedule"),
+    ({"triggerSource": "PreSignUp_SignUp", "userPoolId": "pool", "request": {}, "response": {}}, "cognito"),
+    ({"job": "bulk-import", "bucket": "imports", "key": "users.csv"}, "job"),
+    ({"hello": "world"}, None),
+])
+def test_event_kind(event, expected):
+    assert event_kind(event) == expected
+
+def test_records_are_processed_concurrently_with_partial_failures():
+    def handler(record, context):
+        time.sleep(0.2)
+        if json.loads(record["body"])["fail"]:
+            raise RuntimeError("boom")
+
+    router = EventRouter(max_workers=10)
+    router.on_queue("jobs", handler)
+
+    start_time = time.perf_counter()
+    result = router.dispatch(sqs_event("jobs", [{"fail": i % 4 == 0} for i in range(10)]), None)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"[test_event_router] 10 records of 200ms in {elapsed * 1000:.0f}ms")
+    assert result == {"batchItemFailures": [{"itemIdentifier": f"msg-{i}"} for i in (0, 4, 8)]}
+    assert elapsed < 0.6
+
+def test_fifo_queues_stop_at_the_first_failure():
+    seen = []
+
+    def handler(record, context):
+        seen.append(record["messageId"])
+        if record["messageId"] == "msg-2":
+            raise RuntimeError("boom")
+
+    router = EventRouter()
+    router.on_queue("jobs.fifo", handler)
+
+    result = router.dispatch(sqs_event("jobs.fifo", [{}] * 5), None)
+    assert seen == ["msg-0", "msg-1", "msg-2"]
+    assert result == {"batchItemFailures": [{"itemIdentifier": f"msg-{i}"} for i in (2, 3, 4)]}
+
+def test_batch_handlers_and_sns():
+    batch_handler = MagicMock(return_value={"batchItemFailures": [{"itemIdentifier": "msg-1"}]})
+    on_dispatch = MagicMock()
+    router = EventRouter(on_dispatch=on_dispatch)
+    router.on_queue("jobs", batch_handler=batch_handler)
+    router.on_topic("alerts", lambda record, context: json.loads(record["Sns"]["Message"])["ok"] or 1 / 0)
+
+    event = sqs_event("jobs", [{}, {}])
+    assert router.dispatch(event, "context") == {"batchItemFailures": [{"itemIdentifier": "msg-1"}]}
+    batch_handler.assert_called_once_with(event, "context")
+    on_dispatch.assert_called_with("sqs", 2, 1)
+
+    assert router.dispatch(sns_event("alerts", [{"ok": True}] * 3), None) == {"processed": 3}
+    # Failed SNS records fail the invocation so Lambda retries it.
+    with pytest.raises(RuntimeError):
+        router.dispatch(sns_event("alerts", [{"ok": True}, {"ok": False}]), None)
+
+def test_unroutable_events():
+    router = EventRouter()
+    router.on_queue("jobs", lambda record, context: None)
+
+    with pytest.raises(UnroutableEvent):
+        router.dispatch(sqs_event("other", [{}]), None)
+    with pytest.raises(UnroutableEvent):
+        router.dispatch({"hello": "world"}, None)
+    with pytest.raises(UnroutableEvent):
+        router.dispatch({"job": "unknown"}, None)
+    with pytest.raises(ValueError):
+        router.on_queue("both", handler=print, batch_handler=print)
+    # Cognito triggers without a handler are passed back unchanged.
+    trigger = {"triggerSource": "PostConfirmation_ConfirmSignUp", "userPoolId": "pool", "response": {}}
+    assert router.dispatch(trigger, None) is trigger
+
+def test_lambda_handler_routes_background_events():
+    queue = LocalQueue()
+    sheets = MagicMock()
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 60000
+
+    with patch("index.ses") as mock_ses, patch("index.ses_send_limiter", None), \
+         patch("index.get_sender_email", return_value="noreply@example.com"), \
+         patch("index.get_recipient_email", return_value="office@example.com"), \
+         patch("index.webhook_queue", queue), patch("index.sheets_sink", None), patch("index.sheets_client", sheets), \
+         patch.dict(os.environ, {"SES_MAX_SEND_RATE": "50", "SPREADSHEET_ID": "sheet-1"}):
+        from index import lambda_handler
+
+        messages = [{"first_name": "John", "email": f"john{i}@example.com", "message": "Hi"} for i in range(3)]
+        assert lambda_handler(sqs_event("rcw-client-backend-dev-contact", messages), context) == {"batchItemFailures": []}
+        assert mock_ses.send_email.call_count == 3
+
+        queue.send({"event": {"id": "WH-1", "event_type": "PAYMENT.SALE.COMPLETED",
+                              "resource": {"id": "SALE-1", "amount": {"total": "5.00", "currency": "USD"}}}})
+        result = lambda_handler(schedule_event("rcw-client-backend-dev-paypal-webhook-worker"), context)
+        assert result["status"] == "complete" and result["processed"] == 1
+        assert sheets.append.call_count == 1
+
+        trigger = {"triggerSource": "PreSignUp_SignUp", "userPoolId": "pool",
+                   "request": {"userAttributes": {"email": "user@example.com"}}, "response": {}}
+        assert lambda_handler(trigger, context)["response"]["autoConfirmUser"] is True
+
+def test_http_requests_skip_the_router():
+    import index
+
+    with patch.object(index.event_router, "dispatch") as mock_dispatch:
+        response = index.lambda_handler({"httpMethod": "OPTIONS", "path": "/user"}, None)
+
+    assert response["statusCode"] == 200
+    mock_dispatch.assert_not_called()
+
+def test_cold_start_skips_clients_and_pyarrow():
+    """
+    Importing the handler creates no S3, SQS or DynamoDB client and does not import pyarrow;
+    those are created on first use by the routes and workers that need them.
+    """
+    script = ("import sys, index; "
+              "print(index.s3 is None and index.sqs is None and index.dynamodb is None, 'pyarrow' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", script], cwd=os.path.join(os.path.dirname(__file__), ".."),
+                            env={**os.environ, "AWS_DEFAULT_REGION": "us-west-1"}, capture_output=True, text=True, check=True)
+
+    assert result.stdout.split() == ["True", "False"]
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import json
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from idempotency import DynamoDBIdempotencyTable, IdempotencyStore, LocalIdempotencyTable
+
+ConditionalCheckFailedException = type("ConditionalCheckFailedException", (Exception,), {})
+
+class FakeDynamoDB:
+    """
+    Implements conditional PutItem and DeleteItem the way DynamoDBIdempotencyTable uses them.
+    """
+    def __init__(self):
+        self.items = {}
+        self.put_calls = 0
+        self.exceptions = type("exceptions", (), {"ConditionalCheckFailedException": ConditionalCheckFailedException})
+
+    def put_item(self, TableName, Item, ConditionExpression, ExpressionAttributeValues):
+        self.put_calls += 1
+        existing = self.items.get(Item['pk']['S'])
+        if existing and int(existing['expires_at']['N']) >= int(ExpressionAttributeValues[':now']['N']):
+            raise ConditionalCheckFailedException("The conditional request failed")
+        self.items[Item['pk']['S']] = Item
+
+    def delete_item(self, TableName, Key):
+        self.items.pop(Key['pk']['S'], None)
+
+class CountingTable(LocalIdempotencyTable):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def put_if_absent(self, key, ttl):
+        self.calls += 1
+        return super().put_if_absent(key, ttl)
+
+def test_replays_are_rejected_from_memory():
+    table = CountingTable()
+    store = IdempotencyStore(table)
+
+    assert store.claim("WH-1") is True
+    assert [store.claim("WH-1") for _ in range(100)] == [False] * 100
+    assert table.calls == 1
+
+def test_claims_are_shared_through_the_table():
+    client = FakeDynamoDB()
+    first = IdempotencyStore(DynamoDBIdempotencyTable("events", client), prefix="paypal-webhook#")
+    second = IdempotencyStore(DynamoDBIdempotencyTable("events", client), prefix="paypal-webhook#")
+
+    assert first.claim("WH-1") is True
+    assert second.claim("WH-1") is False
+    assert second.claim("WH-1") is False
+    assert client.put_calls == 2
+    assert "paypal-webhook#WH-1" in client.items
+
+def test_expired_claims_can_be_claimed_again():
+    clock = MagicMock(return_value=1000.0)
+    client = FakeDynamoDB()
+
+    assert IdempotencyStore(DynamoDBIdempotencyTable("events", client, clock=clock), ttl=60).claim("WH-1") is True
+    clock.return_value = 1061.0
+    assert IdempotencyStore(DynamoDBIdempotencyTable("events", client, clock=clock), ttl=60).claim("WH-1") is True
+
+def test_release_allows_redelivery():
+    store = IdempotencyStore(LocalIdempotencyTable())
+
+    assert store.claim("WH-1") is True
+    store.release("WH-1")
+    assert store.claim("WH-1") is True
+
+def test_lru_is_bounded():
+    table = CountingTable()
+    store = IdempotencyStore(table, capacity=10)
+
+    for i in range(20):
+        store.claim(f"WH-{i}")
+    # The oldest ids have left the LRU, so the table answers for them.
+    assert store.claim("WH-0") is False
+    assert store.claim("WH-19") is False
+    assert table.calls == 21
+
+def test_webhook_route_skips_replays():
+    table = CountingTable()
+    body = json.dumps({"id": "WH-58D329510W468432D", "event_type": "PAYMENT.SALE.COMPLETED"}).encode("utf-8")
+
+    with patch("index.verify_webhook") as mock_verify, patch("index.get_paypal_webhook_id", return_value="WH-TEST"), \
+         patch("index.webhook_events", IdempotencyStore(table)):
+        from index import paypal_webhook_route
+
+        first = paypal_webhook_route({}, body)
+        start_time = time.perf_counter()
+        replays = [paypal_webhook_route({}, body) for _ in range(500)]
+        elapsed = time.perf_counter() - start_time
+
+        print(f"[test_idempotency] 500 replays rejected in {elapsed * 1000:.1f}ms")
+        assert json.loads(first["body"])["message"] == "Webhook received."
+        assert all(response["statusCode"] == 200 for response in replays)
+        assert json.loads(replays[0]["body"])["message"] == "Webhook already received."
+        assert table.calls == 1
+        # Replays are still verified first, so a forged event cannot claim a real id.
+        assert mock_verify.call_count == 501
+
+        assert paypal_webhook_route({}, json.dumps({"event_type": "X"}).encode("utf-8"))["statusCode"] == 400
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ledger import LEDGER_COLUMNS, CsvGzipFormat, LedgerWriter, format_for_key, ledger_row
+from object_store import LocalObjectStore
+from queues import LocalQueue
+
+NOW = 1714564800.0  # 2024-05-01T12:00:00Z
+
+def sale_event(i, day=1, event_type="PAYMENT.SALE.COMPLETED"):
+    return {"id": f"WH-{i}", "event_type": event_type, "create_time": f"2024-05-{day:02d}T12:00:01Z",
+            "resource": {"id": f"SALE-{i}", "create_time": f"2024-05-{day:02d}T12:00:00Z",
+                         "amount": {"total": "25.00", "currency": "USD"}, "custom": "tithe, monthly"}}
+
+def read_rows(store, key):
+    rows = []
+    with store.open_reader(key) as reader:
+        for batch in format_for_key(key).read_batches(reader, batch_size=100):
+            rows.extend(batch)
+    return rows
+
+def test_ledger_row():
+    assert ledger_row(sale_event(1)) == ("WH-1", "PAYMENT.SALE.COMPLETED", "SALE-1", "25.00", "USD", "tithe, monthly", "2024-05-01T12:00:00Z")
+    assert ledger_row({"id": "WH-2", "event_type": "BILLING.SUBSCRIPTION.CREATED"}) == ("WH-2", "BILLING.SUBSCRIPTION.CREATED", None, None, None, None, None)
+
+def test_events_are_written_per_date_partition(tmp_path):
+    store = LocalObjectStore(tmp_path)
+    writer = LedgerWriter(store, fmt=CsvGzipFormat(), clock=lambda: NOW)
+    events = [sale_event(i, day=1 + i % 3) for i in range(900)]
+    events.append({"id": "WH-X", "event_type": "CUSTOMER.DISPUTE.CREATED"})
+
+    keys = writer.write(events)
+
+    assert len(keys) == 3
+    assert [key.split("/")[2] for key in keys] == ["dt=2024-05-01", "dt=2024-05-02", "dt=2024-05-03"]
+    assert all(key.endswith(".csv.gz") for key in keys)
+
+    rows = read_rows(store, keys[0])
+    # The event without a create_time goes to the partition of the day it was written.
+    assert rows == [ledger_row(event) for event in events[:-1:3]] + [ledger_row(events[-1])]
+    compressed = sum(os.path.getsize(tmp_path / key) for key in keys)
+    raw = len(json.dumps(events))
+    print(f"[test_ledger] 901 events: {raw} bytes of JSON, {compressed} bytes in {len(keys)} csv.gz objects")
+    assert compressed < raw / 5
+
+def test_large_batches_are_split(tmp_path):
+    store = LocalObjectStore(tmp_path)
+    writer = LedgerWriter(store, fmt=CsvGzipFormat(), max_rows_per_file=100, clock=lambda: NOW)
+
+    keys = writer.write([sale_event(i) for i in range(250)])
+
+    assert sorted(len(read_rows(store, key)) for key in keys) == [50, 100, 100]
+    assert sorted(row[0] for key in keys for row in read_rows(store, key)) == sorted(f"WH-{i}" for i in range(250))
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    from ledger import ParquetFormat
+    from decimal import Decimal
+
+    store = LocalObjectStore(tmp_path)
+    keys = LedgerWriter(store, fmt=ParquetFormat(), clock=lambda: NOW).write([sale_event(i) for i in range(10)])
+
+    rows = read_rows(store, keys[0])
+    assert [row[0] for row in rows] == [f"WH-{i}" for i in range(10)]
+    assert rows[0][LEDGER_COLUMNS.index("amount")] == Decimal("25.00")
+
+@pytest.fixture
+def ledger_setup(tmp_path):
+    """
+    Skips signature checks and patches the webhook queue and sheets client, with the ledger in tmp_path.
+    """
+    store = LocalObjectStore(tmp_path)
+    appended = []
+    sheets = type("Sheets", (), {"append": lambda self, spreadsheet_id, range_, rows: appended.extend(rows)})()
+    with patch("index.verify_webhook"), patch("index.get_paypal_webhook_id", return_value="WH-TEST"), \
+         patch("index.webhook_events", None), patch("index.webhook_queue", LocalQueue()), \
+         patch("index.sheets_sink", None), patch("index.sheets_client", sheets), \
+         patch("index.ledger_writer", LedgerWriter(store, fmt=CsvGzipFormat())), \
+         patch.dict(os.environ, {"SPREADSHEET_ID": "sheet-1", "SHEETS_WRITES_PER_MINUTE": "60000"}):
+        yield store, appended
+
+def sqs_record(i, event):
+    return {"messageId": f"msg-{i}", "receiptHandle": f"rh-{i}", "body": json.dumps({"event": event})}
+
+def test_worker_writes_every_event_to_the_ledger(ledger_setup):
+    store, appended = ledger_setup
+    from index import paypal_webhook_worker
+
+    records = [sqs_record(i, sale_event(i)) for i in range(20)]
+    records.append(sqs_record(20, sale_event(20, event_type="PAYMENT.SALE.REFUNDED")))
+
+    assert paypal_webhook_worker({"Records": records}, None) == {"batchItemFailures": []}
+
+    keys = list(store.list("ledger/donations/"))
+    assert len(keys) == 1
+    assert [row[0] for row in read_rows(store, keys[0])] == [f"WH-{i}" for i in range(21)]
+    assert len(appended) == 20
+
+def test_ledger_failure_fails_the_batch(ledger_setup):
+    store, appended = ledger_setup
+    from index import paypal_webhook_worker
+
+    with patch.object(store, "open_writer", side_effect=OSError("S3 unavailable")):
+        response = paypal_webhook_worker({"Records": [sqs_record(i, sale_event(i)) for i in range(5)]}, None)
+
+    # Nothing reaches the sheet, so the retried batch is not appended twice.
+    assert response == {"batchItemFailures": [{"itemIdentifier": f"msg-{i}"} for i in range(5)]}
+    assert appended == []
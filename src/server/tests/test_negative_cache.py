@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from negative_cache import CountingBloomFilter, NegativeCache
+
+class FakeClock:
+    """A manual clock so TTL expiry can be tested without sleeping."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def mock_ssm_and_cognito():
+    """
+    A Pytest fixture that patches out SSM and Cognito and installs an empty negative cache.
+    """
+    clock = FakeClock()
+    cache = NegativeCache(ttl=60, memory_bytes=4096, clock=clock)
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, \
+         patch('index.unknown_users', cache):
+        # Mock SSM to return a fake user pool ID
+        mock_ssm.get_parameter.return_value = {
+            "Parameter": {"Value": "fake_user_pool_id"}
+        }
+
+        # Mock Cognito exception classes so we can raise them easily
+        for name in [
+            "UserNotFoundException", "InvalidParameterException", "TooManyRequestsException",
+            "LimitExceededException", "NotAuthorizedException", "UsernameExistsException",
+            "AliasExistsException", "InvalidPasswordException", "UserLambdaValidationException",
+            "CodeDeliveryFailureException"
+        ]:
+            setattr(mock_client.exceptions, name, type(name, (Exception,), {}))
+
+        yield (mock_client, cache, clock)
+
+def test_counting_bloom_filter_add_and_remove():
+    """
+    Keys can be added, found and removed again without disturbing other keys.
+    """
+    bloom = CountingBloomFilter(size=1024, hash_count=5)
+    bloom.add("a@example.com")
+    bloom.add("b@example.com")
+
+    assert "a@example.com" in bloom
+    assert "b@example.com" in bloom
+
+    bloom.remove("a@example.com")
+    assert "a@example.com" not in bloom
+    assert "b@example.com" in bloom
+
+def test_negative_cache_expires_after_ttl():
+    """
+    Entries live for the TTL window and are normalized by case and whitespace.
+    """
+    clock = FakeClock()
+    cache = NegativeCache(ttl=60, memory_bytes=4096, slices=4, clock=clock)
+
+    cache.add(" Bot@Example.com ")
+    assert "bot@example.com" in cache
+
+    clock.now += 40
+    assert "bot@example.com" in cache
+
+    clock.now += 30
+    assert "bot@example.com" not in cache
+
+def test_negative_cache_stays_within_memory_budget():
+    """
+    The filters never grow beyond the configured byte budget, however many keys are added.
+    """
+    cache = NegativeCache(ttl=60, memory_bytes=4096, slices=4, clock=FakeClock())
+    for i in range(10000):
+        cache.add(f"bot{i}@example.com")
+
+    assert sum(len(bloom.counters) for bloom in cache._filters) == 4096
+    assert all(len(fingerprints) <= cache.slice_capacity for fingerprints in cache._fingerprints)
+
+def test_full_slices_keep_false_positives_rare():
+    """
+    Keys beyond a slice's capacity are not cached, so unrelated keys are rarely reported missing.
+    """
+    clock = FakeClock()
+    cache = NegativeCache(ttl=60, memory_bytes=4096, slices=4, clock=clock)
+    for i in range(10000):
+        cache.add(f"bot{i}@example.com")
+        clock.now += 0.001
+
+    assert "bot0@example.com" in cache
+    assert f"bot{cache.slice_capacity + 100}@example.com" not in cache
+    false_positives = sum(f"user{i}@example.com" in cache for i in range(5000))
+    assert false_positives / 5000 < 0.03
+
+def test_discard_only_removes_added_keys():
+    """
+    Discarding a key that is only a false positive never decrements other keys' counters.
+    """
+    cache = NegativeCache(ttl=60, memory_bytes=4096, slices=4, clock=FakeClock())
+    added = [f"bot{i}@example.com" for i in range(cache.slice_capacity)]
+    for key in added:
+        cache.add(key)
+    false_positive = next(f"user{i}@example.com" for i in range(100000) if f"user{i}@example.com" in cache)
+
+    cache.discard(false_positive)
+    assert false_positive not in cache
+    # The slice was forgotten rather than corrupted: nothing reads as present by mistake.
+    assert not any(key in cache for key in added)
+
+    cache.add("a@example.com")
+    cache.add("b@example.com")
+    cache.discard("a@example.com")
+    cache.discard("a@example.com")
+    assert "a@example.com" not in cache and "b@example.com" in cache
+
+@pytest.mark.parametrize("route", ["get_user", "forgot_password"])
+def test_repeat_misses_skip_cognito(mock_ssm_and_cognito, route):
+    """
+    After one UserNotFoundException, repeat lookups for the same email answer 404 without Cognito.
+    """
+    mock_client, cache, clock = mock_ssm_and_cognito
+    cognito_operation = "admin_get_user" if route == "get_user" else "forgot_password"
+    getattr(mock_client, cognito_operation).side_effect = mock_client.exceptions.UserNotFoundException()
+
+    import index
+    handler = getattr(index, route)
+
+    first = handler("ghost@example.com")
+    second = handler("GHOST@example.com")
+
+    assert first["statusCode"] == 404
+    assert second["statusCode"] == 404
+    assert json.loads(first["body"]) == json.loads(second["body"])
+    assert getattr(mock_client, cognito_operation).call_count == 1
+
+    # Once the TTL has passed, Cognito is asked again.
+    clock.now += 61
+    handler("ghost@example.com")
+    assert getattr(mock_client, cognito_operation).call_count == 2
+
+def test_sign_up_invalidates_negative_cache(mock_ssm_and_cognito):
+    """
+    A successful sign-up removes the email from the negative cache.
+    """
+    mock_client, cache, clock = mock_ssm_and_cognito
+    mock_client.admin_get_user.side_effect = mock_client.exceptions.UserNotFoundException()
+    mock_client.sign_up.return_value = {"UserConfirmed": True, "UserSub": "abc-123"}
+
+    from index import get_user, sign_up
+
+    assert get_user("new@example.com")["statusCode"] == 404
+    assert "new@example.com" in cache
+
+    assert sign_up("Password123!", "new@example.com", "New", "User")["statusCode"] == 200
+    assert "new@example.com" not in cache
+
+    mock_client.admin_get_user.side_effect = None
+    mock_client.admin_get_user.return_value = {"UserAttributes": [{"Name": "email", "Value": "new@example.com"}]}
+    assert get_user("new@example.com")["statusCode"] == 200
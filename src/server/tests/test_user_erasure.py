@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bulk_users import Checkpoint
+from object_store import LocalObjectStore
+from user_erasure import AuditLog, erase_users, hash_email, rows_from_queue_records
+from user_index import ChangeLog, UserIndex, write_snapshot
+
+UserNotFoundException = type("UserNotFoundException", (Exception,), {})
+InternalErrorException = type("InternalErrorException", (Exception,), {})
+
+class FakeDeleteUser:
+    """
+    Stands in for the rate-limited admin_delete_user call over a set of existing users.
+    """
+    def __init__(self, existing, latency=0.0, broken=()):
+        self.users = set(existing)
+        self.latency = latency
+        self.broken = set(broken)
+        self._lock = threading.Lock()
+
+    def __call__(self, operation, **kwargs):
+        assert operation == 'admin_delete_user'
+        if self.latency:
+            time.sleep(self.latency)
+        username = kwargs['Username']
+        if username in self.broken:
+            raise InternalErrorException("Cognito is having a bad day")
+        with self._lock:
+            if username not in self.users:
+                raise UserNotFoundException("User does not exist.")
+            self.users.remove(username)
+        return {}
+
+def read_audit(store, prefix="audit/"):
+    return [json.loads(line) for key in store.list(prefix) for line in store.get(key).decode("utf-8").splitlines()]
+
+def email_rows(emails):
+    return [(row_number, {"email": email}) for row_number, email in enumerate(emails, start=1)]
+
+def test_erase_users_audits_every_erasure(tmp_path):
+    """
+    Each erased or already-missing user gets a hashed audit record; failures are reported only.
+    """
+    store = LocalObjectStore(str(tmp_path))
+    audit = AuditLog(store, "audit/", job_id="job-1")
+    cognito = FakeDeleteUser(existing=["a@example.com", "b@example.com", "broken@example.com"], broken=["broken@example.com"])
+    forgotten = []
+
+    results = list(erase_users(
+        email_rows(["a@example.com", "b@example.com", "gone@example.com", "broken@example.com"]),
+        cognito, "fake_user_pool_id", audit, on_erased=forgotten.append, max_workers=2
+    ))
+
+    statuses = {result["email"]: result["status"] for result in results}
+    assert statuses == {
+        "a@example.com": "erased", "b@example.com": "erased",
+        "gone@example.com": "not_found", "broken@example.com": "failed"
+    }
+    assert sorted(forgotten) == ["a@example.com", "b@example.com", "gone@example.com"]
+    assert cognito.users == {"broken@example.com"}
+
+    records = read_audit(store)
+    assert sorted(record["subject"] for record in records) == sorted(
+        hash_email(email) for email in ["a@example.com", "b@example.com", "gone@example.com"]
+    )
+    assert {record["job_id"] for record in records} == {"job-1"}
+    # The audit trail never holds the erased addresses themselves.
+    assert "example.com" not in json.dumps(records)
+
+def test_hash_email_is_normalized_and_keyed():
+    assert hash_email(" A@Example.com ") == hash_email("a@example.com")
+    assert hash_email("a@example.com", key="secret") != hash_email("a@example.com")
+
+def test_checkpointed_rows_are_always_audited(tmp_path):
+    """
+    The audit log is flushed before each checkpoint save, so a stopped job never has
+    checkpointed deletions without audit records.
+    """
+    store = LocalObjectStore(str(tmp_path))
+    emails = [f"user{i}@example.com" for i in range(60)]
+    cognito = FakeDeleteUser(existing=emails, latency=0.001)
+
+    results = erase_users(
+        email_rows(emails), cognito, "fake_user_pool_id", AuditLog(store, "audit/"),
+        checkpoint=Checkpoint(store, "erasure.checkpoint.json"), max_workers=4, save_every=5
+    )
+    for _ in range(23):
+        next(results)
+    results.close()
+
+    checkpoint = Checkpoint(store, "erasure.checkpoint.json")
+    done = {emails[row - 1] for row in range(1, 61) if checkpoint.is_done(row)}
+    audited = {record["subject"] for record in read_audit(store)}
+    assert len(done) >= 23
+    assert {hash_email(email) for email in done} <= audited
+
+    # Resuming erases the rest; rows deleted but not checkpointed come back as not_found.
+    rest = list(erase_users(
+        email_rows(emails), cognito, "fake_user_pool_id", AuditLog(store, "audit/"), checkpoint=checkpoint
+    ))
+    assert len(done) + len(rest) == 60
+    assert cognito.users == set()
+
+def test_rows_from_queue_records():
+    rows, sources = rows_from_queue_records([
+        {"messageId": "m1", "body": json.dumps({"email": "a@example.com"})},
+        {"messageId": "m2", "body": json.dumps({"emails": ["b@example.com", "c@example.com"]})},
+        {"messageId": "m3", "body": "not json"},
+        # A string is not split into one address per character.
+        {"messageId": "m4", "body": json.dumps({"emails": "d@example.com"})},
+        {"messageId": "m5", "body": json.dumps(["e@example.com"])},
+        {"messageId": "m6", "body": json.dumps("f@example.com")},
+        {"messageId": "m7", "body": json.dumps({"emails": ["g@example.com", 7]})},
+        {"messageId": "m8", "body": json.dumps({"email": {"address": "h@example.com"}})}
+    ])
+
+    assert [row["email"] for _, row in rows] == ["a@example.com", "b@example.com", "c@example.com"] + [None] * 6
+    assert [sources[row_number] for row_number, _ in rows] == ["m1", "m2", "m2", "m3", "m4", "m5", "m6", "m7", "m8"]
+
+@pytest.fixture
+def mock_cognito():
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client:
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+        yield mock_client
+
+def test_erasure_handler_sqs_event(tmp_path, mock_cognito):
+    """
+    Queue-driven erasure forgets users everywhere and reports only failed messages.
+    """
+    store = LocalObjectStore(str(tmp_path))
+    index_ = UserIndex()
+    index_.upsert("a@example.com", "Ann", "Archer")
+    cognito = FakeDeleteUser(existing=["a@example.com", "b@example.com", "c@example.com"], broken=["c@example.com"])
+    mock_cognito.admin_delete_user.side_effect = lambda **kwargs: cognito('admin_delete_user', **kwargs)
+    event = {"Records": [
+        {"messageId": "m1", "body": json.dumps({"email": "a@example.com"})},
+        {"messageId": "m2", "body": json.dumps({"emails": ["b@example.com", "c@example.com"]})},
+        # A malformed message fails on its own instead of failing the batch.
+        {"messageId": "m3", "body": json.dumps(["d@example.com"])}
+    ]}
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 300000
+    context.aws_request_id = "request-1"
+
+    with patch('index.S3ObjectStore', lambda bucket, s3: store), patch('index.user_search_index', index_), \
+         patch.dict(os.environ, {"USER_ERASURE_AUDIT_BUCKET": "audit-bucket"}):
+        from index import erasure_handler, unknown_users, user_profiles
+
+        user_profiles.put("a@example.com", {"email": "a@example.com"})
+        response = erasure_handler(event, context)
+
+        assert response == {"batchItemFailures": [{"itemIdentifier": "m2"}, {"itemIdentifier": "m3"}]}
+        assert mock_cognito.admin_delete_user.call_count == 3
+        assert user_profiles.get("a@example.com") is None
+        assert index_.get("a@example.com") is None
+        assert "a@example.com" in unknown_users and "b@example.com" in unknown_users
+
+    records = read_audit(store, "user-erasure/audit/")
+    assert {record["subject"] for record in records} == {hash_email("a@example.com"), hash_email("b@example.com")}
+    assert {record["job_id"] for record in records} == {"request-1"}
+
+def test_erasure_handler_file_job_stops_at_deadline(tmp_path, mock_cognito):
+    """
+    A file job out of time returns "incomplete"; re-invoking it finishes from the checkpoint.
+    """
+    store = LocalObjectStore(str(tmp_path))
+    store.put("requests/erase.csv", ("email\n" + "".join(f"user{i}@example.com\n" for i in range(40))).encode("utf-8"))
+    mock_cognito.admin_delete_user.return_value = {}
+    event = {"bucket": "requests-bucket", "key": "requests/erase.csv"}
+    context = MagicMock()
+
+    with patch('index.S3ObjectStore', lambda bucket, s3: store), patch.dict(os.environ, {}, clear=True):
+        from index import erasure_handler, lambda_handler
+
+        # Already inside the safety margin: nothing is started.
+        context.get_remaining_time_in_millis.return_value = 1000
+        result = erasure_handler(event, context)
+        assert result["status"] == "incomplete"
+        assert result["summary"] == {}
+        assert mock_cognito.admin_delete_user.call_count == 0
+
+        # The rest runs through the shared entry point.
+        context.get_remaining_time_in_millis.return_value = 300000
+        result = lambda_handler({**event, "job": "user-erasure"}, context)
+        assert result["status"] == "complete"
+        assert result["summary"] == {"erased": 40}
+        assert result["checkpoint"] == 40
+
+    assert len(read_audit(store, "user-erasure/audit/")) == 40
+
+def test_erased_users_stay_hidden_from_other_containers(tmp_path, mock_cognito):
+    """
+    Erasures are persisted as change log tombstones, one object per flush, which every
+    container loading the (older) snapshot applies.
+    """
+    store = LocalObjectStore(str(tmp_path))
+    store.put("requests/erase.csv", ("email\n" + "".join(f"user{i}@example.com\n" for i in range(30))).encode("utf-8"))
+    snapshot = str(tmp_path / "users.idx")
+    write_snapshot(snapshot, [{"email": f"user{i}@example.com"} for i in range(40)])
+    changes = ChangeLog(LocalObjectStore(str(tmp_path / "index-bucket")))
+    mock_cognito.admin_delete_user.return_value = {}
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 300000
+
+    with patch('index.S3ObjectStore', lambda bucket, s3: store), patch('index.user_index_changes', changes), \
+         patch('index.user_search_index', None), patch.dict(os.environ, {}, clear=True):
+        from index import erasure_handler
+
+        assert erasure_handler({"bucket": "requests-bucket", "key": "requests/erase.csv"}, context)["status"] == "complete"
+
+    assert len(list(changes.store.list("user-index/changes/"))) == 1
+    other_container = UserIndex(snapshot)
+    ChangeLog(changes.store).refresh(other_container)
+    assert [user["email"] for user in other_container.search("", limit=100)[0]] == sorted(f"user{i}@example.com" for i in range(30, 40))
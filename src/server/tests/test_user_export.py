@@ -0,0 +1,215 @@
+import os
+import sys
+import csv
+import io
+import json
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from object_store import LocalObjectStore, S3MultipartWriter
+from user_export import export_users, iter_users
+
+def make_user(i):
+    return {
+        "Username": f"sub-{i}",
+        "Attributes": [
+            {"Name": "email", "Value": f"user{i}@example.com"},
+            {"Name": "email_verified", "Value": "true"},
+            {"Name": "custom:firstName", "Value": f"First{i}"},
+            {"Name": "custom:lastName", "Value": f"Last{i}"}
+        ],
+        "UserCreateDate": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        "UserLastModifiedDate": datetime(2024, 1, 2, tzinfo=timezone.utc),
+        "Enabled": True,
+        "UserStatus": "CONFIRMED"
+    }
+
+class FakeListUsers:
+    """
+    Serves `total` users in pages of `page_size`, like Cognito ListUsers with PaginationToken.
+    """
+    def __init__(self, total, page_size=60):
+        self.total = total
+        self.page_size = page_size
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        start = int(kwargs.get("PaginationToken", 0))
+        end = min(start + self.page_size, self.total)
+        response = {"Users": [make_user(i) for i in range(start, end)]}
+        if end < self.total:
+            response["PaginationToken"] = str(end)
+        return response
+
+def test_iter_users_pages_lazily():
+    """
+    Pages are only requested as users are consumed.
+    """
+    list_users = FakeListUsers(total=150)
+    users = iter_users(list_users, "fake_user_pool_id", filter_expression='cognito:user_status = "CONFIRMED"')
+
+    first = next(users)
+    assert first["Username"] == "sub-0"
+    assert len(list_users.calls) == 1
+    assert list_users.calls[0]["Filter"] == 'cognito:user_status = "CONFIRMED"'
+
+    remaining = sum(1 for _ in users)
+    assert remaining == 149
+    assert [call.get("PaginationToken") for call in list_users.calls] == [None, "60", "120"]
+
+@pytest.mark.parametrize("export_format", ["ndjson", "csv"])
+def test_export_users_to_local_store(tmp_path, export_format):
+    """
+    Users stream into a local object store in the requested format.
+    """
+    store = LocalObjectStore(str(tmp_path))
+    users = iter_users(FakeListUsers(total=125), "fake_user_pool_id")
+
+    with store.open_writer(f"exports/users.{export_format}") as out:
+        count = export_users(users, out, export_format)
+
+    assert count == 125
+    data = store.get(f"exports/users.{export_format}").decode("utf-8")
+
+    if export_format == "ndjson":
+        rows = [json.loads(line) for line in data.splitlines()]
+    else:
+        rows = list(csv.DictReader(io.StringIO(data)))
+
+    assert len(rows) == 125
+    assert rows[7]["email"] == "user7@example.com"
+    assert rows[7]["first_name"] == "First7"
+    assert rows[7]["created"].startswith("2024-01-01")
+    assert list(store.list("exports/")) == [f"exports/users.{export_format}"]
+
+def test_failed_local_export_leaves_no_object(tmp_path):
+    """
+    A failure mid-stream never leaves a partial object behind.
+    """
+    store = LocalObjectStore(str(tmp_path))
+
+    def broken_users():
+        yield make_user(1)
+        raise RuntimeError("Cognito went away")
+
+    with pytest.raises(RuntimeError):
+        with store.open_writer("exports/users.ndjson") as out:
+            export_users(broken_users(), out)
+
+    assert not store.exists("exports/users.ndjson")
+    assert list(store.list()) == []
+
+def test_s3_multipart_writer_streams_parts():
+    """
+    The S3 writer uploads full parts as they fill and only keeps one part buffered.
+    """
+    s3 = MagicMock()
+    s3.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    s3.upload_part.side_effect = lambda **kwargs: {"ETag": f"etag-{kwargs['PartNumber']}"}
+
+    with S3MultipartWriter(s3, "bucket", "key", part_size=10) as out:
+        for _ in range(5):
+            out.write(b"0123456")
+            assert len(out._buffer) < 10
+
+    assert s3.upload_part.call_count == 4
+    parts = s3.complete_multipart_upload.call_args.kwargs["MultipartUpload"]["Parts"]
+    assert [part["PartNumber"] for part in parts] == [1, 2, 3, 4]
+    s3.put_object.assert_not_called()
+
+def test_s3_multipart_writer_aborts_on_error():
+    """
+    A failed export aborts the multipart upload.
+    """
+    s3 = MagicMock()
+    s3.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    s3.upload_part.return_value = {"ETag": "etag"}
+
+    with pytest.raises(RuntimeError):
+        with S3MultipartWriter(s3, "bucket", "key", part_size=4) as out:
+            out.write(b"12345678")
+            raise RuntimeError("boom")
+
+    s3.abort_multipart_upload.assert_called_once_with(Bucket="bucket", Key="key", UploadId="upload-1")
+    s3.complete_multipart_upload.assert_not_called()
+
+@pytest.fixture
+def export_setup(tmp_path):
+    """
+    Patches Cognito, S3 and the admin job queue and store, with job records in tmp_path.
+    """
+    from queues import LocalQueue
+
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, patch('index.s3') as mock_s3, \
+         patch('index.admin_job_queue', LocalQueue()), patch('index.admin_job_store', LocalObjectStore(tmp_path)):
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+        mock_client.exceptions.TooManyRequestsException = type("TooManyRequestsException", (Exception,), {})
+        mock_client.exceptions.InvalidParameterException = type("InvalidParameterException", (Exception,), {})
+        mock_client.list_users.side_effect = FakeListUsers(total=3)
+        mock_s3.generate_presigned_url.return_value = "https://example.com/download"
+        yield mock_client, mock_s3
+
+@pytest.mark.parametrize(
+    "env, export_format, expected_status",
+    [
+        # 1) Export queued => 202
+        ({"USER_EXPORT_BUCKET": "exports-bucket"}, "csv", 202),
+        # 2) Unsupported format => 400
+        ({"USER_EXPORT_BUCKET": "exports-bucket"}, "xml", 400),
+        # 3) Missing bucket configuration => 500
+        ({}, "ndjson", 500)
+    ]
+)
+def test_export_users_route(export_setup, env, export_format, expected_status):
+    """
+    Tests the /admin/users/export route end to end with mocked Cognito and S3: the route
+    queues a job, the admin job worker runs it, and the job route reports the result.
+    """
+    mock_client, mock_s3 = export_setup
+    with patch.dict(os.environ, env, clear=True):
+        from index import admin_job_worker, export_users_route, get_admin_job_route
+
+        response = export_users_route(export_format)
+        body = json.loads(response["body"])
+
+        assert response["statusCode"] == expected_status
+        if expected_status != 202:
+            return
+        # Nothing runs until the worker picks the job up.
+        mock_client.list_users.assert_not_called()
+        assert json.loads(get_admin_job_route(body["job_id"])["body"])["status"] == "queued"
+
+        assert admin_job_worker({}, None) == {"finished": 1, "retried": 0}
+
+        job = json.loads(get_admin_job_route(body["job_id"])["body"])
+        assert job["status"] == "complete"
+        assert job["result"] == {"key": f"user-exports/{body['job_id']}.csv", "count": 3,
+                                 "download_url": "https://example.com/download"}
+        uploaded = mock_s3.put_object.call_args.kwargs
+        assert uploaded["Bucket"] == "exports-bucket"
+        assert uploaded["ContentType"] == "text/csv"
+        assert uploaded["Body"].decode("utf-8").count("\n") == 4
+
+def test_export_jobs_retry_when_throttled_and_fail_on_bad_filters(export_setup):
+    mock_client, mock_s3 = export_setup
+    with patch.dict(os.environ, {"USER_EXPORT_BUCKET": "exports-bucket"}):
+        from index import admin_job_worker, export_users_route, get_admin_job_route
+
+        throttled = json.loads(export_users_route("ndjson")["body"])["job_id"]
+        mock_client.list_users.side_effect = mock_client.exceptions.TooManyRequestsException("Rate exceeded")
+        assert admin_job_worker({}, None) == {"finished": 0, "retried": 1}
+        assert json.loads(get_admin_job_route(throttled)["body"])["status"] == "queued"
+
+        invalid = json.loads(export_users_route("ndjson", "bad filter")["body"])["job_id"]
+        mock_client.list_users.side_effect = mock_client.exceptions.InvalidParameterException("Invalid filter")
+        record = {"messageId": "m-1", "receiptHandle": "rh-1", "body": json.dumps({"job_id": invalid})}
+        assert admin_job_worker({"Records": [record]}, None) == {"batchItemFailures": []}
+        job = json.loads(get_admin_job_route(invalid)["body"])
+        assert job["status"] == "failed" and "filter is invalid" in job["error"]
+
+        assert get_admin_job_route("unknown")["statusCode"] == 404
+        assert get_admin_job_route(None)["statusCode"] == 400
@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from object_store import LocalObjectStore
+from user_index import ChangeLog, UserIndex, write_snapshot
+
+FIRST_NAMES = ["Alice", "Albert", "Bob", "Beatrice", "Carlos", "Chloe", "Dmitri", "Esther"]
+LAST_NAMES = ["Anderson", "Brown", "Clark", "Davis", "Evans"]
+
+def make_records(count):
+    return [
+        {
+            "email": f"user{i:04d}@example.com",
+            "first_name": FIRST_NAMES[i % len(FIRST_NAMES)],
+            "last_name": LAST_NAMES[i % len(LAST_NAMES)]
+        }
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def user_index(tmp_path):
+    """
+    A UserIndex memory-mapped from a snapshot of 2000 synthetic users.
+    """
+    path = str(tmp_path / "users.idx")
+    write_snapshot(path, make_records(2000))
+    return UserIndex(path)
+
+def test_prefix_search_matches_field_case_insensitively(user_index):
+    users, next_cursor = user_index.search("AL", field="first_name", limit=1000)
+
+    assert len(users) == 500
+    assert {user["first_name"] for user in users} == {"Alice", "Albert"}
+    # Sorted by first name, then email.
+    assert users[0]["first_name"] == "Albert"
+    assert users[-1]["first_name"] == "Alice"
+    assert next_cursor is None
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_cursor_pagination_visits_every_match_once(user_index, descending):
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = user_index.search("user01", field="email", descending=descending, cursor=cursor, limit=30)
+        seen.extend(user["email"] for user in page)
+        if cursor is None:
+            break
+
+    expected = sorted(f"user{i:04d}@example.com" for i in range(100, 200))
+    assert seen == (list(reversed(expected)) if descending else expected)
+
+def test_search_sorted_by_another_field(user_index):
+    users, _ = user_index.search("user000", field="email", sort="last_name", limit=10)
+
+    assert [user["last_name"] for user in users] == sorted(user["last_name"] for user in users)
+    assert len(users) == 10
+
+def test_overlay_updates_are_visible_before_rebuild(user_index, tmp_path):
+    # New sign-up
+    user_index.upsert("zed@example.com", "Zed", "Zimmer")
+    # Name change on an existing user
+    user_index.upsert("user0001@example.com", first_name="Aaron")
+    # Deleted user
+    user_index.remove("user0002@example.com")
+
+    assert user_index.search("zed")[0] == [{"email": "zed@example.com", "first_name": "Zed", "last_name": "Zimmer"}]
+    assert user_index.get("user0001@example.com") == {
+        "email": "user0001@example.com", "first_name": "Aaron", "last_name": "Brown"
+    }
+    assert user_index.search("Aaron", field="first_name")[0][0]["email"] == "user0001@example.com"
+    assert user_index.search("user0002")[0] == []
+    # The old first name no longer matches the updated user.
+    bobs, _ = user_index.search("bob", field="first_name", limit=1000)
+    assert "user0001@example.com" not in {user["email"] for user in bobs}
+
+    # Rebuilding folds everything into a new snapshot and clears the overlay.
+    assert user_index.rebuild(make_records(3)) == 3
+    assert user_index.search("")[0][-1]["email"] == "user0002@example.com"
+    assert user_index.get("zed@example.com") is None
+
+def test_search_is_fast_on_a_large_snapshot(tmp_path):
+    path = str(tmp_path / "large.idx")
+    write_snapshot(path, make_records(20000))
+    index = UserIndex(path)
+
+    start_time = time.perf_counter()
+    for _ in range(100):
+        users, _ = index.search("user1234", field="email", limit=25)
+    per_query = (time.perf_counter() - start_time) / 100
+
+    print(f"[test_user_index] per-query time={per_query * 1e6:.1f}us")
+    assert users[0]["email"].startswith("user1234")
+    assert per_query < 0.005, "Prefix search took too long!"
+
+def test_search_users_route(user_index):
+    with patch('index.user_search_index', user_index):
+        from index import search_users_route
+
+        response = search_users_route({"q": "user000", "limit": "5"})
+        body = json.loads(response["body"])
+        assert response["statusCode"] == 200
+        assert [user["email"] for user in body["users"]] == [f"user000{i}@example.com" for i in range(5)]
+        assert body["next_cursor"]
+
+        response = search_users_route({"q": "user000", "cursor": body["next_cursor"]})
+        assert json.loads(response["body"])["users"][0]["email"] == "user0005@example.com"
+
+        assert search_users_route({"field": "phone"})["statusCode"] == 400
+        assert search_users_route({"cursor": "not-a-cursor"})["statusCode"] == 400
+        assert search_users_route({"limit": "0"})["statusCode"] == 400
+
+def test_sign_up_update_and_delete_feed_the_index(user_index):
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, \
+         patch('index.user_search_index', user_index):
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+        for name in ["UserNotFoundException", "NotAuthorizedException", "InvalidParameterException", "InvalidPasswordException"]:
+            setattr(mock_client.exceptions, name, type(name, (Exception,), {}))
+        mock_client.sign_up.return_value = {"UserConfirmed": True}
+
+        from index import delete_user, sign_up, update_user
+
+        sign_up("Password123!", "new@example.com", "Nina", "North")
+        assert user_index.get("new@example.com")["first_name"] == "Nina"
+
+        update_user("new@example.com", {"custom:lastName": "Nash"})
+        assert user_index.get("new@example.com")["last_name"] == "Nash"
+
+        delete_user("new@example.com")
+        assert user_index.get("new@example.com") is None
+
+def test_rebuild_runs_as_an_admin_job(user_index, tmp_path):
+    from queues import LocalQueue
+
+    users = [{"Username": f"sub-{i}", "Attributes": [{"Name": "email", "Value": f"new{i}@example.com"}]} for i in range(3)]
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, \
+         patch('index.user_search_index', user_index), patch('index.admin_job_queue', LocalQueue()), \
+         patch('index.admin_job_store', LocalObjectStore(tmp_path / "jobs")):
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+        mock_client.list_users.return_value = {"Users": users}
+
+        from index import admin_job_worker, get_admin_job_route, rebuild_user_index_route
+
+        response = rebuild_user_index_route()
+        assert response["statusCode"] == 202
+        mock_client.list_users.assert_not_called()
+
+        assert admin_job_worker({}, None) == {"finished": 1, "retried": 0}
+        job = json.loads(get_admin_job_route(json.loads(response["body"])["job_id"])["body"])
+        assert (job["status"], job["result"]) == ("complete", {"count": 3})
+        assert [user["email"] for user in user_index.search("")[0]] == [f"new{i}@example.com" for i in range(3)]
+
+def test_change_log_is_shared_between_containers(user_index, tmp_path):
+    store = LocalObjectStore(tmp_path / "bucket")
+    now = [0.0]
+    writer = ChangeLog(store)
+    other_index = UserIndex(user_index.snapshot_path)
+    reader = ChangeLog(store, refresh_interval=60, clock=lambda: now[0])
+
+    writer.record([{"email": "zed@example.com", "first_name": "Zed", "last_name": "Zimmer"}])
+    writer.record([{"email": "user0001@example.com", "removed": True}])
+    assert reader.refresh(other_index) == 2
+    assert other_index.get("zed@example.com")["first_name"] == "Zed"
+    assert other_index.get("user0001@example.com") is None
+
+    # An email change keeps the indexed names under the new address.
+    writer.record([{"email": "renamed@example.com", "previous_email": "user0002@example.com"}])
+    assert reader.refresh(other_index) == 0
+    now[0] = 61
+    assert reader.refresh(other_index) == 1
+    assert other_index.get("user0002@example.com") is None
+    assert other_index.get("renamed@example.com") == {
+        "email": "renamed@example.com", "first_name": "Bob", "last_name": "Clark"
+    }
+
+    # Buffered changes are written as one object.
+    for i in range(50):
+        writer.add({"email": f"bulk{i}@example.com"})
+    writer.flush()
+    assert len(list(store.list("user-index/changes/"))) == 4
+
+def test_rebuild_trims_only_changes_every_snapshot_holds(tmp_path):
+    store = LocalObjectStore(tmp_path)
+    changes = ChangeLog(store)
+    store.put("user-index/changes/20240101T000000-old.ndjson", b'{"email": "old@example.com"}\n')
+    store.put("user-index/changes/20240501T115900-recent.ndjson", b'{"email": "recent@example.com"}\n')
+
+    rebuilt_at = 1714564800.0  # 2024-05-01T12:00:00Z
+    assert changes.trim(rebuilt_at) == 1
+
+    # A container loading the rebuilt snapshot applies only changes from around the rebuild on.
+    store.put("user-index/changes/20240501T120100-new.ndjson", b'{"email": "new@example.com"}\n')
+    index = UserIndex()
+    changes.reset(since=rebuilt_at)
+    assert changes.refresh(index) == 2
+    assert index.get("new@example.com") and index.get("recent@example.com")
+
+def test_changes_reach_an_index_loaded_later(tmp_path):
+    changes = ChangeLog(LocalObjectStore(tmp_path / "bucket"))
+    path = str(tmp_path / "users.idx")
+    write_snapshot(path, make_records(10))
+
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, \
+         patch('index.user_search_index', None), patch('index.user_index_changes', changes), \
+         patch.dict(os.environ, {"USER_INDEX_PATH": path}):
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+        mock_client.sign_up.return_value = {"UserConfirmed": True}
+        mock_client.admin_get_user.return_value = {"UserAttributes": [{"Name": "email", "Value": "user0003@example.com"}]}
+
+        from index import delete_user, get_user_search_index, sign_up, update_user
+
+        # This container has not loaded the index, but the changes are persisted.
+        sign_up("Password123!", "new@example.com", "Nina", "North")
+        update_user("user0003@example.com", {"email": "moved@example.com"})
+        delete_user("user0004@example.com")
+
+        index = get_user_search_index()
+        assert index.get("new@example.com")["last_name"] == "North"
+        assert index.get("moved@example.com")["first_name"] == "Beatrice"
+        assert index.get("user0003@example.com") is None and index.get("user0004@example.com") is None
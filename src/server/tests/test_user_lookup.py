@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import threading
+import time
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from negative_cache import NegativeCache
+from profile_cache import ProfileCache
+from single_flight import SingleFlight
+
+def run_concurrently(count, fn):
+    """
+    Start `count` threads running fn at the same moment and return their results.
+    """
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_single_flight_shares_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.05)
+        return {"value": 42}
+
+    results = run_concurrently(10, lambda: flight.do("key", slow))
+
+    assert len(calls) == 1
+    assert [result for result, _ in results] == [{"value": 42}] * 10
+    assert sum(shared for _, shared in results) == 9
+    assert (flight.executions, flight.shared) == (1, 9)
+
+    # Nothing is cached after the call finishes.
+    flight.do("key", slow)
+    assert len(calls) == 2
+
+def test_single_flight_shares_exceptions():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.05)
+        raise RuntimeError("boom")
+
+    results = run_concurrently(5, lambda: flight.do("key", failing))
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.executions == 1
+
+@pytest.fixture
+def mock_cognito():
+    """
+    Mocks SSM and Cognito and gives each test empty profile and negative caches.
+    """
+    with patch('index.ssm') as mock_ssm, patch('index.client') as mock_client, \
+         patch('index.user_profiles', ProfileCache(ttl=60)), patch('index.unknown_users', NegativeCache()):
+        mock_ssm.get_parameter.return_value = {"Parameter": {"Value": "fake_user_pool_id"}}
+        for name in ["UserNotFoundException", "TooManyRequestsException"]:
+            setattr(mock_client.exceptions, name, type(name, (Exception,), {}))
+        yield mock_client
+
+def fake_admin_get_user(mock_client, latency=0.05):
+    def admin_get_user(UserPoolId, Username):
+        time.sleep(latency)
+        if Username.startswith("missing"):
+            raise mock_client.exceptions.UserNotFoundException("User does not exist.")
+        if Username.startswith("busy"):
+            raise mock_client.exceptions.TooManyRequestsException("Rate exceeded")
+        return {"UserAttributes": [
+            {"Name": "email", "Value": Username},
+            {"Name": "email_verified", "Value": "true"}
+        ]}
+    return admin_get_user
+
+def test_lookup_users_route_statuses(mock_cognito):
+    mock_cognito.admin_get_user.side_effect = fake_admin_get_user(mock_cognito)
+
+    from index import lookup_users_route, unknown_users, user_profiles
+
+    user_profiles.put("cached@example.com", {"email": "cached@example.com", "email_verified": "false"})
+    unknown_users.add("known-missing@example.com")
+
+    emails = ["a@example.com", "cached@example.com", "missing@example.com",
+              "known-missing@example.com", "busy@example.com", "a@example.com"]
+    response = lookup_users_route(emails)
+    results = json.loads(response["body"])["results"]
+
+    assert response["statusCode"] == 200
+    assert [(result["email"], result["status"]) for result in results] == [
+        ("a@example.com", "found"),
+        ("cached@example.com", "found"),
+        ("missing@example.com", "not_found"),
+        ("known-missing@example.com", "not_found"),
+        ("busy@example.com", "throttled")
+    ]
+    assert results[0]["source"] == "cognito" and results[0]["email_verified"] is True
+    assert results[1]["source"] == "cache" and results[1]["email_verified"] is False
+    # Only the three uncached, not-known-missing emails went to Cognito.
+    assert mock_cognito.admin_get_user.call_count == 3
+    assert "missing@example.com" in unknown_users
+    assert user_profiles.get("a@example.com")["email"] == "a@example.com"
+
+    # The fetched profile is now served from the cache.
+    results = json.loads(lookup_users_route(["a@example.com"])["body"])["results"]
+    assert results[0]["source"] == "cache"
+    assert mock_cognito.admin_get_user.call_count == 3
+
+def test_lookup_users_route_fetches_misses_in_parallel(mock_cognito):
+    mock_cognito.admin_get_user.side_effect = fake_admin_get_user(mock_cognito, latency=0.05)
+
+    from index import lookup_users_route
+
+    start_time = time.perf_counter()
+    response = lookup_users_route([f"user{i}@example.com" for i in range(16)])
+    elapsed = time.perf_counter() - start_time
+
+    print(f"[test_user_lookup] 16 misses in {elapsed:.3f}s")
+    assert response["statusCode"] == 200
+    assert {result["status"] for result in json.loads(response["body"])["results"]} == {"found"}
+    # 16 lookups of 50ms each on 8 workers take about 100ms, not 800ms.
+    assert elapsed < 0.5, "Bulk lookup took too long!"
+
+def test_concurrent_lookups_share_cognito_calls(mock_cognito):
+    mock_cognito.admin_get_user.side_effect = fake_admin_get_user(mock_cognito, latency=0.1)
+
+    from index import lookup_users_route
+
+    responses = run_concurrently(5, lambda: lookup_users_route(["shared@example.com", "other@example.com"]))
+
+    assert all(response["statusCode"] == 200 for response in responses)
+    assert mock_cognito.admin_get_user.call_count == 2
+
+@pytest.mark.parametrize(
+    "emails",
+    [None, [], "a@example.com", ["a@example.com", ""], [f"user{i}@example.com" for i in range(101)]]
+)
+def test_lookup_users_route_rejects_bad_input(mock_cognito, emails):
+    from index import lookup_users_route
+
+    assert lookup_users_route(emails)["statusCode"] == 400
+    mock_cognito.admin_get_user.assert_not_called()
+
+def test_lookup_route_is_wired(mock_cognito):
+    mock_cognito.admin_get_user.side_effect = fake_admin_get_user(mock_cognito, latency=0)
+
+    from index import lambda_handler
+
+    event = {"httpMethod": "POST", "path": "/admin/users/lookup", "body": json.dumps({"emails": ["a@example.com"]})}
+    with patch("index.require_admin", return_value=None):
+        response = lambda_handler(event, None)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["results"][0]["status"] == "found"
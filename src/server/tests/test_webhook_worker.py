@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from queues import LocalQueue
+from sheets_sink import SheetsRetryableError
+
+class FakeSheets:
+    """
+    Stands in for GoogleSheetsClient: records appended rows, with optional latency and failing calls.
+    """
+    def __init__(self, latency=0.0, fail_calls=()):
+        self.latency = latency
+        self.fail_calls = set(fail_calls)
+        self.rows = []
+        self.calls = 0
+
+    def append(self, spreadsheet_id, range_, rows):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.calls in self.fail_calls:
+            raise SheetsRetryableError(503, retry_after=0)
+        self.rows.extend(rows)
+
+def sale_event(i, event_type="PAYMENT.SALE.COMPLETED"):
+    return {"id": f"WH-{i}", "event_type": event_type,
+            "resource": {"id": f"SALE-{i}", "create_time": "2024-05-01T12:00:00Z", "amount": {"total": "5.00", "currency": "USD"}}}
+
+def sqs_record(i, body):
+    return {"messageId": f"msg-{i}", "receiptHandle": f"rh-{i}", "body": body if isinstance(body, str) else json.dumps(body)}
+
+@pytest.fixture
+def webhook_setup():
+    """
+    Skips signature checks and patches the idempotency store, webhook queue, sheets sink and sheets client.
+    """
+    queue = LocalQueue()
+    sheets = FakeSheets()
+    with patch("index.verify_webhook"), patch("index.get_paypal_webhook_id", return_value="WH-TEST"), \
+         patch("index.webhook_events", None), patch("index.webhook_queue", queue), \
+         patch("index.sheets_sink", None), patch("index.sheets_client", sheets), \
+         patch.dict(os.environ, {"SPREADSHEET_ID": "sheet-1", "SHEETS_WRITES_PER_MINUTE": "60000"}):
+        yield queue, sheets
+
+def test_route_acknowledges_without_waiting_for_sheets(webhook_setup):
+    queue, sheets = webhook_setup
+    sheets.latency = 0.5
+    from index import paypal_webhook_route
+
+    latencies = []
+    for i in range(50):
+        start_time = time.perf_counter()
+        response = paypal_webhook_route({}, json.dumps(sale_event(i)).encode("utf-8"))
+        latencies.append(time.perf_counter() - start_time)
+        assert response["statusCode"] == 200
+
+    latencies.sort()
+    print(f"[test_webhook_worker] webhook p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms with 500ms Sheets latency")
+    assert latencies[-1] < 0.1
+    assert sheets.calls == 0
+    assert len(queue) == 50
+
+def test_sqs_batch_is_written_with_one_call(webhook_setup):
+    _, sheets = webhook_setup
+    from index import paypal_webhook_worker
+
+    records = [sqs_record(i, {"event": sale_event(i)}) for i in range(30)]
+    records.append(sqs_record(30, {"event": sale_event(30, "PAYMENT.SALE.REFUNDED")}))
+    records.append(sqs_record(31, "not json"))
+
+    assert paypal_webhook_worker({"Records": records}, None) == {"batchItemFailures": []}
+    assert sheets.calls == 1
+    assert [row[1] for row in sheets.rows] == [f"SALE-{i}" for i in range(30)]
+
+def test_sqs_batch_reports_unwritten_messages(webhook_setup):
+    _, sheets = webhook_setup
+    sheets.fail_calls = set(range(2, 20))
+    from index import paypal_webhook_worker
+
+    with patch.dict(os.environ, {"SHEETS_MAX_BATCH_ROWS": "10"}), patch("index.sheets_sink", None):
+        response = paypal_webhook_worker({"Records": [sqs_record(i, {"event": sale_event(i)}) for i in range(25)]}, None)
+
+    # The first 10 rows were written; the failed call and everything after it are retried.
+    assert [row[1] for row in sheets.rows] == [f"SALE-{i}" for i in range(10)]
+    assert response == {"batchItemFailures": [{"itemIdentifier": f"msg-{i}"} for i in range(10, 25)]}
+
+def test_scheduled_run_drains_the_queue(webhook_setup):
+    queue, sheets = webhook_setup
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 60000
+    from index import paypal_webhook_route, paypal_webhook_worker
+
+    for i in range(30):
+        paypal_webhook_route({}, json.dumps(sale_event(i)).encode("utf-8"))
+    paypal_webhook_route({}, json.dumps(sale_event(30, "BILLING.SUBSCRIPTION.CREATED")).encode("utf-8"))
+
+    assert paypal_webhook_worker({}, context) == {"status": "complete", "processed": 31, "calls": 1}
+    assert [row[1] for row in sheets.rows] == [f"SALE-{i}" for i in range(30)]
+    assert len(queue) == 0
+
+def test_enqueue_failure_releases_the_claim(webhook_setup):
+    queue, _ = webhook_setup
+    from index import paypal_webhook_route
+
+    body = json.dumps(sale_event(1)).encode("utf-8")
+    with patch.object(queue, "send", side_effect=RuntimeError("SQS unavailable")):
+        assert paypal_webhook_route({}, body)["statusCode"] == 500
+
+    # PayPal's redelivery is accepted rather than treated as a replay.
+    response = paypal_webhook_route({}, body)
+    assert json.loads(response["body"])["message"] == "Webhook received."
+    assert len(queue) == 1
+
+def test_missing_configuration_fails_in_lambda(webhook_setup):
+    """
+    A deployed function without WEBHOOK_QUEUE_URL or WEBHOOK_EVENTS_TABLE answers 500, so PayPal redelivers.
+    """
+    from index import paypal_webhook_route
+
+    body = json.dumps(sale_event(1)).encode("utf-8")
+    for variable, patched in (("WEBHOOK_QUEUE_URL", "index.webhook_queue"), ("WEBHOOK_EVENTS_TABLE", "index.webhook_events")):
+        with patch(patched, None), patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "rcw-client-backend-dev"}):
+            os.environ.pop(variable, None)
+            assert paypal_webhook_route({}, body)["statusCode"] == 500
+
+    # Nothing was claimed, so the redelivery is accepted.
+    assert json.loads(paypal_webhook_route({}, body)["body"])["message"] == "Webhook received."
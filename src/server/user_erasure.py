@@ -0,0 +1,174 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from bulk_users import call_with_backoff, process_rows
+
+
+def hash_email(email, key=None):
+    """
+    Return a stable, non-reversible identifier for an email address.
+
+    Audit records use this instead of the address itself, so the audit trail does not
+    keep the personal data it records the erasure of. With a key the hash is an HMAC,
+    which stops anyone without the key from confirming a guessed address.
+    """
+    normalized = email.strip().lower().encode('utf-8')
+    if key:
+        return hmac.new(key.encode('utf-8'), normalized, hashlib.sha256).hexdigest()
+    return hashlib.sha256(normalized).hexdigest()
+
+
+class AuditLog:
+    """
+    Collects one audit record per erased user and writes them to an object store in chunks.
+
+    Each flush writes a new JSON Lines object under prefix, in the dt=YYYY-MM-DD partition
+    of the day, so records are never rewritten and a crash can only lose records that were
+    not flushed yet. Pass flush as a Checkpoint's on_save hook to guarantee every
+    checkpointed deletion is audited.
+    """
+
+    def __init__(self, store, prefix, hash_key=None, job_id=None):
+        self.store = store
+        self.prefix = prefix.rstrip("/")
+        self.hash_key = hash_key
+        self.job_id = job_id
+        self.written = 0
+        self._records = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def record(self, email, outcome):
+        entry = {
+            "subject": hash_email(email, self.hash_key),
+            "outcome": outcome,
+            "erased_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if self.job_id:
+            entry["job_id"] = self.job_id
+        with self._lock:
+            self._records.append(entry)
+
+    def flush(self):
+        with self._lock:
+            records, self._records = self._records, []
+            self._sequence += 1
+            sequence = self._sequence
+        if not records:
+            return None
+
+        now = time.gmtime()
+        key = f"{self.prefix}/dt={time.strftime('%Y-%m-%d', now)}/{time.strftime('%Y-%m-%dT%H-%M-%SZ', now)}-{sequence:05d}.ndjson"
+        data = "".join(json.dumps(record) + "\n" for record in records).encode('utf-8')
+        try:
+            self.store.put(key, data, content_type="application/x-ndjson")
+        except Exception:
+            # Keep the records so the next flush retries them.
+            with self._lock:
+                self._records = records + self._records
+            raise
+        self.written += len(records)
+        return key
+
+
+def erase_row(call, user_pool_id, row, max_retries=5):
+    """
+    Delete the user described by one row.
+
+    A user that no longer exists counts as erased ("not_found"), so replaying a request
+    is harmless.
+
+    :return: "erased" or "not_found".
+    """
+    email = (row.get('email') or "").strip()
+    if not email:
+        raise ValueError("Row has no email.")
+    try:
+        call_with_backoff(call, 'admin_delete_user', max_retries, UserPoolId=user_pool_id, Username=email)
+        return "erased"
+    except Exception as e:
+        if type(e).__name__ != "UserNotFoundException":
+            raise
+        return "not_found"
+
+
+def erase_users(rows, call, user_pool_id, audit, on_erased=None, on_flush=None, checkpoint=None, **options):
+    """
+    Erase users concurrently and yield one result per row as it finishes.
+
+    Runs on the bulk pipeline (bounded workers, Cognito rate limiter, checkpoints, deadline),
+    records an audit entry for every erased user and calls on_erased so caches and indexes
+    can forget the user. The audit log is flushed, then on_flush is run, whenever the
+    checkpoint is saved and when the generator finishes.
+
+    :param rows: An iterable of (row number, {"email": ...}) pairs.
+    :param call: A callable (operation, **kwargs) that performs a rate-limited Cognito call.
+    :param user_pool_id: The Cognito User Pool ID.
+    :param audit: The AuditLog to record erasures in.
+    :param on_erased: An optional callback (email) run after each erasure.
+    :param on_flush: An optional callback run with every audit flush, e.g. to persist what
+        on_erased buffered before rows are checkpointed as done.
+    :param checkpoint: An optional bulk_users.Checkpoint; its on_save hook is set to flush both.
+    :param options: Passed on to bulk_users.process_rows (max_workers, deadline, save_every).
+    """
+    def flush():
+        audit.flush()
+        if on_flush:
+            on_flush()
+
+    if checkpoint is not None:
+        checkpoint.on_save = flush
+
+    def on_success(row, outcome):
+        email = row['email'].strip()
+        audit.record(email, outcome)
+        if on_erased:
+            on_erased(email)
+
+    try:
+        yield from process_rows(
+            rows, call, user_pool_id,
+            checkpoint=checkpoint,
+            on_success=on_success,
+            apply=erase_row,
+            **options
+        )
+    finally:
+        flush()
+
+
+def _message_emails(body):
+    """The emails an erasure message asks for, or [None] if the body is malformed."""
+    if not isinstance(body, dict):
+        return [None]
+    emails = body.get('emails') or [body.get('email')]
+    if not isinstance(emails, list) or not all(isinstance(email, str) for email in emails):
+        return [None]
+    return emails
+
+
+def rows_from_queue_records(records):
+    """
+    Build (row number, row) pairs for SQS erasure messages, remembering each row's message.
+
+    A message body is either {"email": ...} or {"emails": [...]}. A malformed body (not JSON,
+    not an object, or with an email that is not a string) becomes a single row without an
+    email, which fails and leaves that message to the queue's redrive policy.
+
+    :return: A tuple of (list of rows, dict of row number -> message id).
+    """
+    rows, sources = [], {}
+    for record in records:
+        try:
+            body = json.loads(record['body'])
+        except ValueError:
+            body = None
+        for email in _message_emails(body):
+            row_number = len(rows) + 1
+            rows.append((row_number, {"email": email}))
+            sources[row_number] = record['messageId']
+    return rows, sources
@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+
+# Columns written for each user, in order.
+EXPORT_FIELDS = [
+    "username", "email", "email_verified", "first_name", "last_name",
+    "status", "enabled", "created", "modified"
+]
+
+EXPORT_FORMATS = {
+    "ndjson": ("ndjson", "application/x-ndjson"),
+    "csv": ("csv", "text/csv"),
+}
+
+
+def iter_user_pages(list_users, user_pool_id, page_size=60, filter_expression=None, pagination_token=None):
+    """
+    Yield every ListUsers page as a (pagination token, users) pair.
+
+    The token is the one the page was requested with (None for the first page), so a
+    caller can record it and later resume from the same page.
+
+    :param list_users: A callable taking ListUsers keyword arguments (e.g. a rate-limited Cognito call).
+    :param user_pool_id: The Cognito User Pool ID.
+    :param page_size: Users per ListUsers page (Cognito allows at most 60).
+    :param filter_expression: An optional ListUsers filter, e.g. 'cognito:user_status = "CONFIRMED"'.
+    :param pagination_token: The token of the page to start from.
+    """
+    kwargs = {"UserPoolId": user_pool_id, "Limit": page_size}
+    if filter_expression:
+        kwargs["Filter"] = filter_expression
+
+    while True:
+        if pagination_token:
+            kwargs["PaginationToken"] = pagination_token
+        response = list_users(**kwargs)
+        yield pagination_token, response.get('Users', [])
+        pagination_token = response.get('PaginationToken')
+        if not pagination_token:
+            return
+
+
+def iter_users(list_users, user_pool_id, page_size=60, filter_expression=None):
+    """
+    Yield every user in the pool, one ListUsers page at a time.
+
+    Pages are requested lazily as the caller consumes users, so memory stays constant
+    regardless of the pool size.
+
+    :param list_users: A callable taking ListUsers keyword arguments (e.g. a rate-limited Cognito call).
+    :param user_pool_id: The Cognito User Pool ID.
+    :param page_size: Users per ListUsers page (Cognito allows at most 60).
+    :param filter_expression: An optional ListUsers filter, e.g. 'cognito:user_status = "CONFIRMED"'.
+    """
+    for _, users in iter_user_pages(list_users, user_pool_id, page_size, filter_expression):
+        yield from users
+
+
+def _format_timestamp(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def flatten_user(user):
+    """Turn a ListUsers user record into a flat dict keyed by EXPORT_FIELDS."""
+    attributes = {attr['Name']: attr['Value'] for attr in user.get('Attributes', [])}
+    return {
+        "username": user.get('Username'),
+        "email": attributes.get('email'),
+        "email_verified": attributes.get('email_verified', 'false').lower() == 'true',
+        "first_name": attributes.get('custom:firstName'),
+        "last_name": attributes.get('custom:lastName'),
+        "status": user.get('UserStatus'),
+        "enabled": user.get('Enabled'),
+        "created": _format_timestamp(user.get('UserCreateDate')),
+        "modified": _format_timestamp(user.get('UserLastModifiedDate')),
+    }
+
+
+def iter_ndjson(users):
+    """Yield one encoded JSON line per user."""
+    for user in users:
+        yield (json.dumps(flatten_user(user)) + "\n").encode('utf-8')
+
+
+def iter_csv(users):
+    """Yield the encoded CSV header followed by one encoded row per user."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+
+    writer.writeheader()
+    yield buffer.getvalue().encode('utf-8')
+    for user in users:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(flatten_user(user))
+        yield buffer.getvalue().encode('utf-8')
+
+
+def export_users(users, out, export_format="ndjson"):
+    """
+    Stream users to a writable binary file-like object.
+
+    :param users: An iterable of ListUsers user records, typically from iter_users.
+    :param out: Anything with a write(bytes) method, e.g. an object store writer.
+    :param export_format: "ndjson" or "csv".
+    :return: The number of users written.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    count = 0
+
+    def counted(items):
+        nonlocal count
+        for item in items:
+            count += 1
+            yield item
+
+    lines = iter_ndjson(counted(users)) if export_format == "ndjson" else iter_csv(counted(users))
+    for line in lines:
+        out.write(line)
+    return count
@@ -0,0 +1,420 @@
+import base64
+import calendar
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+# Fields that can be searched by prefix or used for sorting, in snapshot column order.
+SEARCH_FIELDS = ("email", "first_name", "last_name")
+
+_MAGIC = b"RCWUIDX1"
+_HEADER = struct.Struct("<8sII")  # magic, record count, field count
+_SEPARATOR = "\x1f"
+_MAX_CHAR = "\U0010ffff"
+
+# Change log keys start with their UTC creation time in this format.
+CHANGE_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+# Refreshes re-list changes this many seconds older than the newest one applied, so a
+# change written late (clock skew, slow writer) is still picked up.
+CHANGE_OVERLAP_SECONDS = 300
+
+# Changes are kept this long after a rebuild that holds them: containers still serving an
+# older snapshot apply them on their next refresh, and no container lives this long.
+CHANGE_RETENTION_SECONDS = 24 * 3600
+
+
+def _normalize(value):
+    return (value or "").casefold()
+
+
+def _to_row(record):
+    return (record.get('email') or "", record.get('first_name') or "", record.get('last_name') or "")
+
+
+def write_snapshot(path, records):
+    """
+    Write a searchable snapshot of user records to path.
+
+    The file holds the records as one string blob plus, for every field in SEARCH_FIELDS,
+    the record ids sorted by (field, email). It is written to a temporary file and renamed
+    into place, so readers never see a partial snapshot.
+
+    :param path: Where to write the snapshot.
+    :param records: An iterable of dicts with email, first_name and last_name (e.g. flattened
+        user export rows). Later records win when an email appears twice.
+    :return: The number of records written.
+    """
+    rows_by_email = {}
+    for record in records:
+        row = _to_row(record)
+        if row[0]:
+            rows_by_email[_normalize(row[0])] = row
+    rows = list(rows_by_email.values())
+
+    blobs = [_SEPARATOR.join(row).encode('utf-8') for row in rows]
+    offsets = array('I', [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    data = b"".join(blobs)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, len(rows), len(SEARCH_FIELDS)))
+        f.write(offsets.tobytes())
+        # Pad the blob so the sorted id arrays stay 4-byte aligned for memoryview casts.
+        f.write(data + b"\0" * (-len(data) % 4))
+        for column in range(len(SEARCH_FIELDS)):
+            order = sorted(range(len(rows)), key=lambda i: (_normalize(rows[i][column]), _normalize(rows[i][0])))
+            f.write(array('I', order).tobytes())
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+class _Snapshot:
+    """A read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, field_count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or field_count != len(SEARCH_FIELDS):
+            raise ValueError(f"Not a user index snapshot: {path}")
+
+        view = memoryview(self._mmap)
+        position = _HEADER.size
+        self.count = count
+        self.offsets = view[position:position + 4 * (count + 1)].cast('I')
+        position += 4 * (count + 1)
+        blob_size = self.offsets[count]
+        self.blob = view[position:position + blob_size]
+        position += blob_size + (-blob_size % 4)
+        self.orders = []
+        for _ in SEARCH_FIELDS:
+            self.orders.append(view[position:position + 4 * count].cast('I'))
+            position += 4 * count
+
+    def row(self, record_id):
+        start, end = self.offsets[record_id], self.offsets[record_id + 1]
+        return tuple(bytes(self.blob[start:end]).decode('utf-8').split(_SEPARATOR))
+
+    def sort_key(self, column):
+        def key(record_id):
+            row = self.row(record_id)
+            return (_normalize(row[column]), _normalize(row[0]))
+        return key
+
+
+def encode_cursor(sort_key):
+    return base64.urlsafe_b64encode(json.dumps(list(sort_key)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        key, email = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (str(key), str(email))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+
+class UserIndex:
+    """
+    Prefix search over users' email, first name and last name.
+
+    Reads come from a memory-mapped snapshot plus a small in-memory overlay of changes made
+    since the snapshot was written (sign-ups, updates, deletions). rebuild() writes a fresh
+    snapshot and clears the overlay.
+    """
+
+    def __init__(self, snapshot_path=None):
+        self.snapshot_path = snapshot_path
+        self._snapshot = _Snapshot(snapshot_path) if snapshot_path and os.path.exists(snapshot_path) else None
+        self._upserts = {}
+        self._deleted = set()
+        self._lock = threading.Lock()
+
+    def _snapshot_get(self, email_key):
+        if self._snapshot is None or not self._snapshot.count:
+            return None
+        order = self._snapshot.orders[0]
+        position = bisect_left(order, (email_key, email_key), key=self._snapshot.sort_key(0))
+        if position < len(order):
+            row = self._snapshot.row(order[position])
+            if _normalize(row[0]) == email_key:
+                return row
+        return None
+
+    def get(self, email):
+        """Return the indexed record for email as a dict, or None."""
+        email_key = _normalize(email)
+        with self._lock:
+            if email_key in self._upserts:
+                return dict(zip(SEARCH_FIELDS, self._upserts[email_key]))
+            if email_key in self._deleted:
+                return None
+        row = self._snapshot_get(email_key)
+        return dict(zip(SEARCH_FIELDS, row)) if row else None
+
+    def upsert(self, email, first_name=None, last_name=None):
+        """Add or update a user; fields passed as None keep their indexed value."""
+        existing = self.get(email) or {}
+        row = (
+            email,
+            first_name if first_name is not None else existing.get('first_name', ""),
+            last_name if last_name is not None else existing.get('last_name', "")
+        )
+        with self._lock:
+            self._upserts[_normalize(email)] = row
+            self._deleted.discard(_normalize(email))
+
+    def remove(self, email):
+        with self._lock:
+            self._upserts.pop(_normalize(email), None)
+            self._deleted.add(_normalize(email))
+
+    def apply(self, change):
+        """
+        Apply one change log entry (see ChangeLog.record).
+
+        :param change: {"email", "first_name", "last_name"} to upsert, with "removed": True to
+            remove instead, or "previous_email" when the user's email changed.
+        """
+        if change.get('removed'):
+            self.remove(change['email'])
+            return
+        first_name, last_name = change.get('first_name'), change.get('last_name')
+        if change.get('previous_email'):
+            previous = self.get(change['previous_email']) or {}
+            first_name = first_name if first_name is not None else previous.get('first_name')
+            last_name = last_name if last_name is not None else previous.get('last_name')
+            self.remove(change['previous_email'])
+        self.upsert(change['email'], first_name, last_name)
+
+    def rebuild(self, records, snapshot_path=None):
+        """Write a new snapshot from records and switch to it, dropping the overlay."""
+        snapshot_path = snapshot_path or self.snapshot_path
+        count = write_snapshot(snapshot_path, records)
+        snapshot = _Snapshot(snapshot_path)
+        with self._lock:
+            self.snapshot_path = snapshot_path
+            self._snapshot = snapshot
+            self._upserts = {}
+            self._deleted = set()
+        return count
+
+    def _snapshot_matches(self, column, prefix, bounds, descending, hidden):
+        """Yield (sort key, row) for snapshot rows whose column starts with prefix, in sort order."""
+        snapshot = self._snapshot
+        if snapshot is None or not snapshot.count:
+            return
+        order = snapshot.orders[column]
+        key = snapshot.sort_key(column)
+        low = bisect_left(order, (prefix, ""), key=key)
+        high = bisect_left(order, (prefix + _MAX_CHAR, ""), key=key)
+        if bounds is not None:
+            if descending:
+                high = min(high, bisect_left(order, bounds, key=key))
+            else:
+                low = max(low, bisect_right(order, bounds, key=key))
+
+        positions = range(high - 1, low - 1, -1) if descending else range(low, high)
+        for position in positions:
+            row = snapshot.row(order[position])
+            if _normalize(row[0]) in hidden:
+                continue
+            yield (_normalize(row[column]), _normalize(row[0])), row
+
+    def search(self, prefix="", field="email", sort=None, descending=False, cursor=None, limit=25):
+        """
+        Find users whose field starts with prefix (case-insensitively).
+
+        :param prefix: The prefix to match; an empty prefix matches every user.
+        :param field: The field to match against: email, first_name or last_name.
+        :param sort: The field to sort by; defaults to field.
+        :param descending: Sort in descending order.
+        :param cursor: The next_cursor from a previous page.
+        :param limit: The page size.
+        :return: A tuple of (list of record dicts, next_cursor or None).
+        """
+        sort = sort or field
+        if field not in SEARCH_FIELDS or sort not in SEARCH_FIELDS:
+            raise ValueError(f"Fields must be one of: {', '.join(SEARCH_FIELDS)}.")
+        column, sort_column = SEARCH_FIELDS.index(field), SEARCH_FIELDS.index(sort)
+        prefix = _normalize(prefix)
+        bounds = decode_cursor(cursor) if cursor else None
+
+        with self._lock:
+            overlay = list(self._upserts.values())
+            hidden = set(self._upserts) | set(self._deleted)
+
+        def sort_key(row):
+            return (_normalize(row[sort_column]), _normalize(row[0]))
+
+        def after_cursor(key):
+            return bounds is None or (key < bounds if descending else key > bounds)
+
+        overlay_matches = sorted(
+            ((sort_key(row), row) for row in overlay if _normalize(row[column]).startswith(prefix)),
+            key=lambda item: item[0],
+            reverse=descending
+        )
+
+        if sort_column == column:
+            # The field's own sorted order serves the page directly: only limit + 1 rows are read.
+            snapshot_matches = self._snapshot_matches(column, prefix, bounds, descending, hidden)
+            overlay_matches = [item for item in overlay_matches if after_cursor(item[0])]
+            merged = heapq.merge(snapshot_matches, overlay_matches, key=lambda item: item[0], reverse=descending)
+        else:
+            # Sorting by another field needs every match first.
+            snapshot_matches = (
+                (sort_key(row), row) for _, row in self._snapshot_matches(column, prefix, None, False, hidden)
+            )
+            merged = sorted(
+                (item for item in list(snapshot_matches) + overlay_matches if after_cursor(item[0])),
+                key=lambda item: item[0],
+                reverse=descending
+            )
+
+        page = []
+        for item in merged:
+            page.append(item)
+            if len(page) > limit:
+                break
+
+        next_cursor = encode_cursor(page[limit - 1][0]) if len(page) > limit else None
+        return [dict(zip(SEARCH_FIELDS, row)) for _, row in page[:limit]], next_cursor
+
+
+class ChangeLog:
+    """
+    Index changes (sign-ups, updates, deletions, erasures) persisted in an object store.
+
+    Snapshots are only rebuilt now and then, so changes made in between are recorded here
+    as small JSON Lines objects under prefix, named so they sort by write time. Every
+    container applies them when it loads the index and on each refresh, at most once per
+    refresh_interval, listing only objects from shortly before the newest one applied.
+    Removals thus act as tombstones: an erased user stays hidden from every container until
+    a rebuilt snapshot no longer holds them, after which trim() drops the entries.
+
+    :param store: An object store (S3ObjectStore or LocalObjectStore).
+    :param prefix: The key prefix of the change objects.
+    :param refresh_interval: Seconds between incremental refreshes.
+    :param clock: A time source for refresh_interval, replaceable in tests.
+    """
+
+    def __init__(self, store, prefix="user-index/changes/", refresh_interval=60.0, clock=time.monotonic):
+        self.store = store
+        self.prefix = prefix
+        self.refresh_interval = refresh_interval
+        self._clock = clock
+        self._applied_keys = set()
+        self._newest = None
+        self._refreshed_at = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, change):
+        """Buffer a change until flush(), so a bulk job writes one object per batch."""
+        with self._lock:
+            self._pending.append(change)
+
+    def flush(self):
+        """Persist the buffered changes as one object."""
+        with self._lock:
+            changes, self._pending = self._pending, []
+        try:
+            return self.record(changes)
+        except Exception:
+            with self._lock:
+                self._pending[:0] = changes
+            raise
+
+    def record(self, changes):
+        """
+        Persist changes as one object.
+
+        :param changes: A list of UserIndex.apply() entries.
+        :return: The object key, or None if there was nothing to write.
+        """
+        if not changes:
+            return None
+        key = f"{self.prefix}{time.strftime(CHANGE_TIME_FORMAT, time.gmtime())}-{uuid.uuid4().hex}.ndjson"
+        data = "".join(json.dumps(change) + "\n" for change in changes).encode('utf-8')
+        self.store.put(key, data, content_type="application/x-ndjson")
+        with self._lock:
+            self._mark_applied(key)
+        return key
+
+    def _mark_applied(self, key):
+        self._applied_keys.add(key)
+        try:
+            written = calendar.timegm(time.strptime(key[len(self.prefix):].split("-")[0], CHANGE_TIME_FORMAT))
+        except ValueError:
+            return
+        self._newest = max(self._newest or written, written)
+
+    def refresh(self, index, force=False):
+        """
+        Apply changes recorded since the last refresh to index, in write order.
+
+        :return: The number of changes applied.
+        """
+        with self._lock:
+            now = self._clock()
+            if not force and self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+                return 0
+            self._refreshed_at = now
+
+            start_after = None
+            if self._newest is not None:
+                start_after = self.prefix + time.strftime(CHANGE_TIME_FORMAT, time.gmtime(self._newest - CHANGE_OVERLAP_SECONDS))
+            applied = 0
+            for key in sorted(self.store.list(self.prefix, start_after=start_after)):
+                if key in self._applied_keys:
+                    continue
+                try:
+                    data = self.store.get(key)
+                except Exception:
+                    # Trimmed since it was listed: the snapshot it was trimmed for holds it.
+                    if self.store.exists(key):
+                        raise
+                    continue
+                for line in data.decode('utf-8').splitlines():
+                    if line.strip():
+                        index.apply(json.loads(line))
+                        applied += 1
+                self._mark_applied(key)
+            return applied
+
+    def reset(self, since=None):
+        """
+        Forget which changes were applied, e.g. for an index loaded from a new snapshot.
+
+        :param since: When that snapshot's rebuild started (seconds since the epoch); the next
+            refresh applies changes from shortly before then on. None applies every change.
+        """
+        with self._lock:
+            self._applied_keys = set()
+            self._newest = since
+            self._refreshed_at = None
+
+    def trim(self, rebuilt_at):
+        """
+        Delete changes a rebuilt snapshot holds once no container can still need them.
+
+        :param rebuilt_at: When the rebuild started listing users (seconds since the epoch).
+        :return: The number of change objects deleted.
+        """
+        cutoff = self.prefix + time.strftime(CHANGE_TIME_FORMAT, time.gmtime(rebuilt_at - CHANGE_RETENTION_SECONDS))
+        stale = [key for key in self.store.list(self.prefix) if key < cutoff]
+        for key in stale:
+            self.store.delete(key)
+        return len(stale)